@@ -0,0 +1,228 @@
+# backend/ann_index.py
+
+import os
+import json
+import math
+import time
+from typing import Optional
+
+import numpy as np
+
+
+# --- Configuration ---
+# Approximate index over the rows of the flat vector store (flat_index.py), built with faiss
+# (faiss-cpu) when VECTOR_INDEX_MODE (vector_backends.py) is not "exact":
+#   "hnsw"   - HNSW graph: lowest latency; keeps a float32 copy of every vector in memory
+#   "ivfpq"  - inverted file + product quantization: PQ_CODE_BYTES per vector in memory
+#   "binary" - one bit per dimension (above/below the dimension's median), scanned by Hamming
+#              distance: dim / 8 bytes per vector in memory (32x less than float32)
+#   "int8"   - 8-bit scalar quantization, scanned by dot product: dim bytes per vector (4x less)
+# The index only proposes candidates: the top k * ANN_RERANK_FACTOR (at least QUANTIZED_CANDIDATES
+# for the binary and int8 scans) are re-scored exactly against the stored vectors. Compact indexes
+# (ivfpq, binary, int8) read only the candidates' rows from the vector file, so the float32 matrix
+# never has to be in memory. Quantization error costs recall only when a true neighbour is not
+# proposed at all.
+# Pick the settings with benchmarks/bench_ann.py (recall@k vs latency against exact search).
+HNSW_M = int(os.getenv("HNSW_M", 32)) # Graph degree: memory and build time vs recall
+HNSW_EF_CONSTRUCTION = int(os.getenv("HNSW_EF_CONSTRUCTION", 200))
+HNSW_EF_SEARCH = int(os.getenv("HNSW_EF_SEARCH", 64)) # Search breadth: latency vs recall (at least the candidates asked for)
+IVF_NLIST = int(os.getenv("IVF_NLIST", 0)) # Inverted lists; 0 = about 4 * sqrt(rows) when the index is trained
+IVF_NPROBE = int(os.getenv("IVF_NPROBE", 16)) # Lists scanned per query: latency vs recall
+PQ_CODE_BYTES = int(os.getenv("PQ_CODE_BYTES", 64)) # One byte per sub-quantizer; must divide the dimension
+ANN_RERANK_FACTOR = int(os.getenv("ANN_RERANK_FACTOR", 4))
+QUANTIZED_CANDIDATES = int(os.getenv("QUANTIZED_CANDIDATES", 200)) # Coarse binary/int8 candidates re-scored per query
+# Below this many rows (or rows left by a category filter) an exact scan is fast enough; the index is
+# built once the store reaches it
+ANN_MIN_ROWS = int(os.getenv("ANN_MIN_ROWS", 20000))
+# The writer adds new rows to its in-memory index as they are upserted, but only saves it every this
+# many rows (and at the end of every ingestion run). Rows the saved index doesn't cover yet are
+# scanned exactly by the readers.
+ANN_SAVE_EVERY_ROWS = int(os.getenv("ANN_SAVE_EVERY_ROWS", 20000))
+# Vectors sampled to train the IVF centroids and PQ codebooks, the int8 ranges and the binary thresholds
+IVF_TRAIN_SAMPLE = int(os.getenv("IVF_TRAIN_SAMPLE", 100000))
+
+VECTOR_INDEX_MODES = ("exact", "hnsw", "ivfpq", "binary", "int8")
+_QUANTIZED_MODES = ("binary", "int8")
+
+# Rows converted to float32 and added per faiss call
+_ADD_BLOCK_ROWS = 16384
+
+
+class AnnIndex:
+    """
+    faiss index over the rows of a FlatIndexCollection, keyed by row number. It covers rows [0, rows):
+    rows appended later are added with `add`, and until then the collection scans them exactly.
+    Deleted rows stay in the index and are excluded at search time by the collection's live mask.
+    Build parameters are saved with the index; efSearch, nprobe and the re-rank factor are read at
+    every search, so they can be tuned on a loaded index.
+    """
+
+    def __init__(self, mode: str, dim: int, hnsw_m: int = HNSW_M, ef_construction: int = HNSW_EF_CONSTRUCTION,
+                 ef_search: int = HNSW_EF_SEARCH, nlist: int = IVF_NLIST, nprobe: int = IVF_NPROBE,
+                 pq_code_bytes: int = PQ_CODE_BYTES, rerank_factor: int = ANN_RERANK_FACTOR,
+                 coarse_candidates: int = QUANTIZED_CANDIDATES):
+        if mode not in VECTOR_INDEX_MODES[1:]:
+            raise ValueError(f"Unknown ANN index mode '{mode}'. Expected one of: {', '.join(VECTOR_INDEX_MODES[1:])}")
+        import faiss # Imported lazily: the exact flat index and the Chroma backend run without it
+        self._faiss = faiss
+        self.mode = mode
+        self.dim = dim
+        self.ef_search = ef_search
+        self.nprobe = nprobe
+        self.rerank_factor = rerank_factor # Candidates proposed per result, re-scored by the collection
+        self.coarse_candidates = coarse_candidates if mode in _QUANTIZED_MODES else 0
+        self.compact = mode != "hnsw" # Holds codes only: candidates are re-scored from the vector file
+        self.params = {"hnsw": {"hnsw_m": hnsw_m, "ef_construction": ef_construction},
+                       "ivfpq": {"nlist": nlist, "pq_code_bytes": pq_code_bytes}}.get(mode, {})
+        self.thresholds = None # Binary mode: per-dimension medians the bits are taken against
+        self.index = None
+        self.rows = 0 # Rows covered
+        self.saved_rows = 0 # Rows covered by the saved file
+        self.dirty = False # Rows added since the last save
+
+    @property
+    def ready(self) -> bool:
+        return self.index is not None
+
+    def candidate_count(self, k: int) -> int:
+        """Candidates to propose for a top-k search."""
+        return max(k * self.rerank_factor, self.coarse_candidates)
+
+    # --- Building ---
+    def build(self, vectors: np.ndarray, live: np.ndarray):
+        """
+        Creates the index (trained on a sample of the live rows for IVF-PQ, int8 and binary) and adds
+        every live row.
+        """
+        faiss = self._faiss
+        live_rows = np.flatnonzero(np.asarray(live, dtype=bool))
+        sample = live_rows
+        if len(sample) > IVF_TRAIN_SAMPLE:
+            sample = np.sort(np.random.default_rng(0).choice(live_rows, IVF_TRAIN_SAMPLE, replace=False))
+        start = time.perf_counter()
+        if self.mode == "hnsw":
+            graph = faiss.IndexHNSWFlat(self.dim, self.params["hnsw_m"], faiss.METRIC_INNER_PRODUCT)
+            graph.hnsw.efConstruction = self.params["ef_construction"]
+            index = faiss.IndexIDMap(graph)
+        elif self.mode == "ivfpq":
+            code_bytes = self.params["pq_code_bytes"]
+            if self.dim % code_bytes:
+                raise ValueError(f"PQ_CODE_BYTES={code_bytes} must divide the embedding dimension ({self.dim})")
+            # About 4 * sqrt(n) lists, but at least 39 training vectors per centroid
+            nlist = self.params["nlist"] or int(min(max(16, 4 * math.sqrt(len(live_rows))), max(1, len(live_rows) // 39)))
+            self.params["nlist"] = nlist
+            index = faiss.IndexIVFPQ(faiss.IndexFlatIP(self.dim), self.dim, nlist, code_bytes, 8, faiss.METRIC_INNER_PRODUCT)
+            index.train(np.ascontiguousarray(vectors[sample], dtype=np.float32))
+        elif self.mode == "int8":
+            # Per-dimension ranges learned from the sample; values outside are clipped
+            index = faiss.IndexIDMap(faiss.IndexScalarQuantizer(self.dim, faiss.ScalarQuantizer.QT_8bit, faiss.METRIC_INNER_PRODUCT))
+            index.train(np.ascontiguousarray(vectors[sample], dtype=np.float32))
+        else:
+            if self.dim % 8:
+                raise ValueError(f"Binary codes need a dimension divisible by 8 (got {self.dim})")
+            # Median thresholds give balanced bits even when a dimension is mostly positive or negative
+            self.thresholds = np.median(np.asarray(vectors[sample], dtype=np.float32), axis=0).astype(np.float32)
+            index = faiss.IndexBinaryIDMap(faiss.IndexBinaryFlat(self.dim))
+        self.index, self.rows = index, 0
+        self.add(vectors, live)
+        print(f"ANN index ({self.mode}, {self.params}): built over {len(live_rows)} rows in {time.perf_counter() - start:.1f}s.")
+
+    def add(self, vectors: np.ndarray, live: np.ndarray, rewritten_rows=()):
+        """
+        Adds the live rows appended since the last call, and re-adds rewritten_rows (covered rows
+        whose vector was overwritten; the stale entry may still be proposed, but re-scoring uses the
+        stored vector).
+        """
+        live = np.asarray(live, dtype=bool)
+        for start in range(self.rows, len(vectors), _ADD_BLOCK_ROWS):
+            rows = np.arange(start, min(start + _ADD_BLOCK_ROWS, len(vectors)))
+            self._add_rows(vectors, rows[live[rows]])
+        rewritten = np.asarray([row for row in rewritten_rows if row < self.rows], dtype=np.int64)
+        self._add_rows(vectors, rewritten)
+        self.rows = max(self.rows, len(vectors))
+
+    def _add_rows(self, vectors: np.ndarray, rows: np.ndarray):
+        if len(rows):
+            self.index.add_with_ids(self._encode(vectors[rows]), rows.astype(np.int64))
+            self.dirty = True
+
+    def _encode(self, vectors: np.ndarray) -> np.ndarray:
+        """What the faiss index takes: float32 rows, or packed bits for the binary index."""
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        return np.packbits(vectors > self.thresholds, axis=1) if self.mode == "binary" else vectors
+
+    # --- Search ---
+    def search(self, queries: np.ndarray, k: int, allowed: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Row numbers of the (approximate) top k for each unit query vector, (queries x k), -1 padded.
+        allowed: optional boolean mask over the covered rows; other rows are skipped inside the search.
+        """
+        faiss = self._faiss
+        if self.mode == "hnsw":
+            params = faiss.SearchParametersHNSW(efSearch=max(self.ef_search, k))
+        elif self.mode == "ivfpq":
+            params = faiss.SearchParametersIVF(nprobe=self.nprobe)
+        else:
+            params = faiss.SearchParameters()
+        if allowed is not None:
+            # The bitmap and the selector must stay referenced until the search returns
+            bitmap = np.packbits(allowed, bitorder="little")
+            selector = faiss.IDSelectorBitmap(len(bitmap), faiss.swig_ptr(bitmap))
+            params.sel = selector
+        _, labels = self.index.search(self._encode(queries), k, params=params)
+        return labels
+
+    # --- Persistence ---
+    def save(self, index_path: str, info_path: str):
+        """Writes the index, then the sidecar with the rows it covers (each replaced atomically)."""
+        write_index = self._faiss.write_index_binary if self.mode == "binary" else self._faiss.write_index
+        for path, write in ((index_path, lambda tmp: write_index(self.index, tmp)),
+                            (info_path, lambda tmp: self._write_info(tmp))):
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            write(tmp_path)
+            os.replace(tmp_path, path)
+        self.saved_rows, self.dirty = self.rows, False
+
+    def _write_info(self, path: str):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"mode": self.mode, "dim": self.dim, "rows": self.rows, "params": self.params,
+                       "vectors": int(self.index.ntotal), "saved_at": time.time(),
+                       "thresholds": self.thresholds.tolist() if self.thresholds is not None else None}, f)
+
+    def load(self, index_path: str, info_path: str) -> bool:
+        """
+        Loads a saved index; False if there is none or it was built with other parameters (it is
+        then rebuilt by the next write or flush).
+        """
+        try:
+            with open(info_path, encoding="utf-8") as f:
+                info = json.load(f)
+            # The sidecar is read first: an index saved again in between covers more rows, which the
+            # collection ignores
+            index = (self._faiss.read_index_binary if self.mode == "binary" else self._faiss.read_index)(index_path)
+        except (FileNotFoundError, ValueError, RuntimeError):
+            return False
+        configured = {key: value for key, value in self.params.items() if not (key == "nlist" and value == 0)}
+        if info.get("dim") != self.dim or any(info["params"].get(key) != value for key, value in configured.items()):
+            print(f"ANN index at {index_path} was built with {info.get('params')}; it will be rebuilt with {self.params}.")
+            return False
+        self.index, self.params = index, info["params"]
+        self.rows = self.saved_rows = info["rows"]
+        if info.get("thresholds") is not None:
+            self.thresholds = np.asarray(info["thresholds"], dtype=np.float32)
+        return True
+
+    def stats(self) -> dict:
+        search_params = {"hnsw": {"ef_search": self.ef_search}, "ivfpq": {"nprobe": self.nprobe}}.get(
+            self.mode, {"coarse_candidates": self.coarse_candidates})
+        return {"mode": self.mode, "rows": self.rows, "vectors": int(self.index.ntotal) if self.index is not None else 0,
+                **self.params, **search_params, "rerank_factor": self.rerank_factor,
+                "index_mb": round(self._code_size() * int(self.index.ntotal) / 1e6, 1) if self.index is not None else 0}
+
+    def _code_size(self) -> int:
+        """Approximate bytes held in memory per indexed vector."""
+        if self.mode == "hnsw":
+            return 4 * self.dim + 8 * self.params["hnsw_m"] + 8 # Float32 vector, graph links, ID
+        if self.mode == "ivfpq":
+            return self.params["pq_code_bytes"] + 8 # PQ code, ID
+        return (self.dim // 8 if self.mode == "binary" else self.dim) + 8
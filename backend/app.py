@@ -1,11 +1,14 @@
 # backend/app.py
 
 import os
-from flask import Flask, request, jsonify
+import json
+import time
+from flask import Flask, request, jsonify, g, Response, stream_with_context
 from flask_cors import CORS
 from dotenv import load_dotenv
 # Import the RAG service function from the new rag_service.py file
-from rag_service import get_rag_response, initialize_rag_components # Also import the init function
+from rag_service import get_rag_answer, stream_rag_answer, initialize_rag_components # Also import the init function
+from service_metrics import REGISTRY, HTTP_REQUESTS, HTTP_REQUEST_SECONDS, HTTP_IN_FLIGHT, format_timing_header, should_sample_timing
 
 
 # Load environment variables from .env file
@@ -16,7 +19,7 @@ load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), '.env'))
 app = Flask(__name__)
 # Enable CORS for all origins during development.
 # IMPORTANT: For production, configure CORS more strictly!
-CORS(app)
+CORS(app, expose_headers=["X-Timing"]) # Let the frontend read the sampled stage breakdown
 
 # --- Initialize RAG components when the Flask app starts ---
 # This ensures the embedding model, vector store, and LLM are loaded/initialized
@@ -25,11 +28,59 @@ CORS(app)
 initialize_rag_components()
 
 
+# --- Request metrics (served on /metrics) ---
+def _endpoint_label() -> str:
+    # The route pattern, not the raw path, so unknown URLs can't create unbounded label values
+    return request.url_rule.rule if request.url_rule else "unmatched"
+
+@app.before_request
+def start_request_metrics():
+    g.request_started = time.perf_counter()
+    g.endpoint_label = _endpoint_label()
+    HTTP_IN_FLIGHT.inc(endpoint=g.endpoint_label)
+
+@app.after_request
+def record_request_metrics(response):
+    HTTP_REQUESTS.inc(endpoint=g.endpoint_label, status=response.status_code)
+    HTTP_REQUEST_SECONDS.observe(time.perf_counter() - g.request_started, endpoint=g.endpoint_label)
+    # Stage breakdown of sampled chat requests, e.g. "embed_query;dur=11.8, search;dur=4.2, llm;dur=1630.5, total;dur=1650.1"
+    timings = g.get("rag_timings")
+    if timings and should_sample_timing():
+        response.headers["X-Timing"] = format_timing_header(timings)
+    return response
+
+@app.teardown_request
+def end_request_metrics(exc):
+    if "endpoint_label" in g:
+        HTTP_IN_FLIGHT.dec(endpoint=g.endpoint_label)
+
+
+@app.route('/metrics')
+def metrics():
+    """Prometheus-style metrics: per-stage RAG latency histograms, request/answer counters, in-flight gauges, cache stats."""
+    return Response(REGISTRY.render(), mimetype="text/plain; version=0.0.4")
+
 @app.route('/')
 def home():
     """Basic route to confirm the backend is running."""
     return "Mezan Backend is running!"
 
+def _read_chat_request():
+    """(message, category, None) from the chat request's JSON body, or (None, None, 400 response) if invalid."""
+    # Get message and category from the frontend's JSON request
+    data = request.get_json()
+    user_message = data.get('message')
+    category = data.get('category')
+
+    # Basic Input Validation
+    if not user_message or not category:
+        print('Validation failed: Missing message or category')
+        return None, None, (jsonify({"error": "Bad Request: 'message' and 'category' are required."}), 400)
+    if not isinstance(user_message, str) or not isinstance(category, str):
+        print('Validation failed: Invalid data types')
+        return None, None, (jsonify({"error": "Bad Request: 'message' and 'category' must be strings."}), 400)
+    return user_message, category, None
+
 @app.route('/api/chat', methods=['POST'])
 def chat_endpoint():
     """Handles incoming chat requests from the frontend."""
@@ -42,18 +93,9 @@ def chat_endpoint():
 
 
     try:
-        # Get message and category from the frontend's JSON request
-        data = request.get_json()
-        user_message = data.get('message')
-        category = data.get('category')
-
-        # Basic Input Validation
-        if not user_message or not category:
-            print('Validation failed: Missing message or category')
-            return jsonify({"error": "Bad Request: 'message' and 'category' are required."}), 400
-        if not isinstance(user_message, str) or not isinstance(category, str):
-            print('Validation failed: Invalid data types')
-            return jsonify({"error": "Bad Request: 'message' and 'category' must be strings."}), 400
+        user_message, category, error_response = _read_chat_request()
+        if error_response:
+            return error_response
 
 
         print(f"Processing chat for category: '{category}', message: '{user_message}' (Using RAG)")
@@ -61,12 +103,13 @@ def chat_endpoint():
         # --- Call the RAG service function ---
         # This function now handles retrieval, prompting, and calling the LLM
         print("Calling RAG service for AI response...")
-        ai_reply = get_rag_response(user_message, category) # Call the RAG function
-        print(f"RAG service returned: {ai_reply[:100]}...") # Log a snippet of the reply
+        answer = get_rag_answer(user_message, category) # Call the RAG function
+        g.rag_timings = answer["timings"]
+        print(f"RAG service returned{' (cached)' if answer['cached'] else ''}: {answer['reply'][:100]}...") # Log a snippet of the reply
 
-        # Send the AI's reply back to the frontend as JSON
-        # If get_rag_response returned an error message string, jsonify handles it.
-        return jsonify({"reply": ai_reply})
+        # Send the AI's reply back to the frontend as JSON, flagging answers served from the response cache
+        # If get_rag_answer returned an error message string, jsonify handles it.
+        return jsonify({"reply": answer["reply"], "cached": answer["cached"]})
 
     except Exception as e:
         # Handle any unexpected errors during request processing in this endpoint
@@ -76,6 +119,34 @@ def chat_endpoint():
         # Return a generic error to the frontend
         return jsonify({"error": "Internal Server Error processing request."}), 500
 
+@app.route('/api/chat/stream', methods=['POST'])
+def chat_stream_endpoint():
+    """
+    /api/chat with the answer streamed as Server-Sent Events (see stream_rag_answer for the events):
+    the retrieved sources arrive before the LLM call, then the answer text as Gemini generates it.
+    Headers are sent before the answer exists, so the stage breakdown comes in the final "done"
+    event instead of an X-Timing header, and mezan_http_request_seconds only covers the time to
+    the first byte (mezan_rag_stage_seconds{stage="total"} covers the whole answer).
+    """
+    print('Received request on /api/chat/stream')
+    try:
+        user_message, category, error_response = _read_chat_request()
+        if error_response:
+            return error_response
+    except Exception as e:
+        print(f"Error in /api/chat/stream endpoint: {e}")
+        return jsonify({"error": "Internal Server Error processing request."}), 500
+
+    print(f"Streaming chat for category: '{category}', message: '{user_message}' (Using RAG)")
+
+    def events():
+        for event, data in stream_rag_answer(user_message, category):
+            yield f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+    return Response(stream_with_context(events()), mimetype="text/event-stream",
+                    # No caching, and no proxy buffering (nginx) holding the tokens back
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
 # This block allows running the app directly using `python app.py`
 # when FLASK_APP and FLASK_DEBUG are not set as environment variables.
 # Using `flask run` is generally preferred when .env is configured.
@@ -0,0 +1,138 @@
+# backend/asgi_app.py
+#
+# Asyncio serving mode: the same endpoints as app.py (/api/chat, /api/chat/stream, /metrics) as an
+# ASGI app. app.py's threads each wait out a whole Gemini round-trip, so a sync server holds at most
+# workers x threads chats at once; here a chat waiting on Gemini is a suspended coroutine, and the
+# blocking retrieval stages share RAG_EXECUTOR_WORKERS threads (see rag_service's async variants).
+# Compare the two under load with benchmarks/bench_serving.py.
+#
+# Run from backend/ (one worker: the metrics registry and caches are per process):
+#   uvicorn asgi_app:app --host 0.0.0.0 --port 5000
+
+import os
+import json
+import time
+from fastapi import FastAPI, Request
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from starlette.routing import Match
+from dotenv import load_dotenv
+
+# Before rag_service is imported: it initializes Gemini from GEMINI_API_KEY at import time
+load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), '.env'))
+
+from rag_service import get_rag_answer_async, stream_rag_answer_async # Retrieval on the bounded executor, Gemini awaited
+from service_metrics import REGISTRY, HTTP_REQUESTS, HTTP_REQUEST_SECONDS, HTTP_IN_FLIGHT, format_timing_header, should_sample_timing
+
+
+app = FastAPI(title="Mezan Backend", docs_url=None, redoc_url=None, openapi_url=None)
+
+
+# --- Request metrics (served on /metrics) ---
+class RequestMetricsMiddleware:
+    """
+    The request counters of app.py's hooks. As plain ASGI middleware it sees the end of streamed
+    bodies, so here mezan_http_request_seconds covers a whole /api/chat/stream answer.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        # The route pattern, not the raw path, so unknown URLs can't create unbounded label values
+        endpoint = next((route.path for route in app.router.routes if route.matches(scope)[0] != Match.NONE), "unmatched")
+        started, status = time.perf_counter(), {"code": 500}
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc(endpoint=endpoint)
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            HTTP_IN_FLIGHT.dec(endpoint=endpoint)
+            HTTP_REQUESTS.inc(endpoint=endpoint, status=status["code"])
+            HTTP_REQUEST_SECONDS.observe(time.perf_counter() - started, endpoint=endpoint)
+
+
+# IMPORTANT: For production, configure CORS more strictly!
+app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"], expose_headers=["X-Timing"])
+# Added last so it runs outermost, around CORS preflights too
+app.add_middleware(RequestMetricsMiddleware)
+
+
+async def _read_chat_request(request: Request):
+    """(message, category, None) from the chat request's JSON body, or (None, None, 400 response) if invalid."""
+    data = await request.json()
+    user_message = data.get('message')
+    category = data.get('category')
+
+    if not user_message or not category:
+        print('Validation failed: Missing message or category')
+        return None, None, JSONResponse({"error": "Bad Request: 'message' and 'category' are required."}, status_code=400)
+    if not isinstance(user_message, str) or not isinstance(category, str):
+        print('Validation failed: Invalid data types')
+        return None, None, JSONResponse({"error": "Bad Request: 'message' and 'category' must be strings."}, status_code=400)
+    return user_message, category, None
+
+
+@app.get('/metrics')
+async def metrics():
+    """Prometheus-style metrics, as on app.py's /metrics."""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+@app.get('/')
+async def home():
+    """Basic route to confirm the backend is running."""
+    return PlainTextResponse("Mezan Backend is running! (async)")
+
+@app.post('/api/chat')
+async def chat_endpoint(request: Request):
+    """Same request and response as app.py's /api/chat."""
+    try:
+        user_message, category, error_response = await _read_chat_request(request)
+        if error_response:
+            return error_response
+
+        answer = await get_rag_answer_async(user_message, category)
+        print(f"RAG service returned{' (cached)' if answer['cached'] else ''}: {answer['reply'][:100]}...")
+        # Stage breakdown of sampled chat requests, as app.py's after_request hook adds it
+        headers = {"X-Timing": format_timing_header(answer["timings"])} if should_sample_timing() else None
+        return JSONResponse({"reply": answer["reply"], "cached": answer["cached"]}, headers=headers)
+
+    except Exception as e:
+        print(f"Error in /api/chat endpoint: {e}")
+        import traceback
+        traceback.print_exc()
+        return JSONResponse({"error": "Internal Server Error processing request."}, status_code=500)
+
+@app.post('/api/chat/stream')
+async def chat_stream_endpoint(request: Request):
+    """Same Server-Sent Events as app.py's /api/chat/stream."""
+    try:
+        user_message, category, error_response = await _read_chat_request(request)
+        if error_response:
+            return error_response
+    except Exception as e:
+        print(f"Error in /api/chat/stream endpoint: {e}")
+        return JSONResponse({"error": "Internal Server Error processing request."}, status_code=500)
+
+    async def events():
+        async for event, data in stream_rag_answer_async(user_message, category):
+            yield f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+# `python asgi_app.py` runs it like `python app.py` runs the Flask server
+if __name__ == '__main__':
+    import uvicorn
+    host = os.getenv('FLASK_RUN_HOST', '0.0.0.0')
+    port = int(os.getenv('FLASK_RUN_PORT', 5000))
+    print(f"Attempting to run async app with host={host}, port={port}")
+    uvicorn.run(app, host=host, port=port)
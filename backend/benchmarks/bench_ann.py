@@ -0,0 +1,185 @@
+# backend/benchmarks/bench_ann.py
+#
+# Recall@k vs latency report for the approximate index modes of the flat vector store
+# (VECTOR_INDEX_MODE=hnsw|ivfpq|binary|int8, see ann_index.py), against exact search over the same rows.
+# Builds a flat store of synthetic embedding-like vectors (benchmarks/bench_vector_store.py), then for
+# every build setting (HNSW M, IVF-PQ code size) builds the faiss index and sweeps the search settings
+# (efSearch, nprobe, the number of binary/int8 candidates re-scored) and the re-rank factor,
+# measuring per setting:
+#   - recall@k of the final (re-scored) results, without and with a category filter; the recall
+#     loss is 1 - recall, since exact search is the reference
+#   - p50/p95 ms of single-query searches and the per-query cost of batched searches
+#   - build seconds and index size (the faiss file; about what the index holds in memory), and how
+#     many times smaller it is than the float32 vectors an exact scan keeps in memory
+# The ANN path is forced for every search here (ANN_MIN_ROWS=0); in production, searches over fewer
+# than ANN_MIN_ROWS rows (small collections, narrow category filters) stay exact.
+# Ends with the fastest setting of each mode reaching --target-recall.
+#
+# Usage:
+#   python backend/benchmarks/bench_ann.py [--count 50000] [--dim 768] [--queries 200] [--k 10] [--batch 32]
+#       [--hnsw-m 16,32] [--ef-search 16,32,64,128,256] [--pq-code-bytes 32,64,96] [--nprobe 1,4,16,64]
+#       [--coarse-candidates 50,100,200,400] [--rerank 1,4] [--modes hnsw,ivfpq,binary,int8]
+#       [--target-recall 0.95] [--output report.json]
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+
+import numpy as np
+
+os.environ["ANN_MIN_ROWS"] = "0" # Before flat_index imports it: measure the ANN path at any size
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))) # backend/
+
+from flat_index import FlatVectorStore
+from bench_vector_store import CATEGORIES, WRITE_BATCH, synthetic_vectors, synthetic_metadata, percentile, recall_at_k
+
+
+def int_list(value: str) -> list:
+    return [int(item) for item in value.split(",") if item]
+
+
+def build_store(directory: str, vectors: np.ndarray, metadatas: list) -> float:
+    collection = FlatVectorStore(directory, "bench_vectors")._collection
+    start = time.perf_counter()
+    for offset in range(0, len(vectors), WRITE_BATCH):
+        end = min(offset + WRITE_BATCH, len(vectors))
+        collection.upsert(ids=[f"chunk:{i}" for i in range(offset, end)], embeddings=vectors[offset:end],
+                          documents=[f"Synthetic chunk {i}" for i in range(offset, end)], metadatas=metadatas[offset:end])
+    return time.perf_counter() - start
+
+
+def measure(collection, queries: np.ndarray, k: int, batch: int, where: dict) -> dict:
+    """Latency of single and batched queries, and the result IDs (unfiltered and filtered) for recall."""
+    collection.query(query_embeddings=queries[:1], n_results=k, include=[]) # Warm-up
+    single, results = [], []
+    for query in queries:
+        t = time.perf_counter()
+        result = collection.query(query_embeddings=query[None, :], n_results=k, include=[])
+        single.append(time.perf_counter() - t)
+        results.append(result["ids"][0])
+    batched = []
+    for offset in range(0, len(queries), batch):
+        t = time.perf_counter()
+        collection.query(query_embeddings=queries[offset:offset + batch], n_results=k, include=[])
+        batched.append((time.perf_counter() - t) / len(queries[offset:offset + batch]))
+    filtered = collection.query(query_embeddings=queries, n_results=k, where=where, include=[])["ids"]
+    return {"query_p50_ms": percentile(single, 50), "query_p95_ms": percentile(single, 95),
+            "batched_query_mean_ms": round(float(np.mean(batched)) * 1000, 3), "ids": results, "filtered_ids": filtered}
+
+
+def score(row: dict, exact: dict) -> dict:
+    ids, filtered_ids = row.pop("ids"), row.pop("filtered_ids")
+    row["recall_at_k"] = recall_at_k(ids, exact["ids"])
+    row["filtered_recall_at_k"] = recall_at_k(filtered_ids, exact["filtered_ids"])
+    return row
+
+
+def sweep(directory: str, mode: str, build_settings: list, search_key: str, search_values: list, reranks: list,
+          args, queries: np.ndarray, where: dict, exact: dict) -> list:
+    rows = []
+    for build_options in build_settings:
+        store = FlatVectorStore(directory, "bench_vectors", index_mode=mode, ann_options=build_options)
+        collection = store._collection
+        start = time.perf_counter()
+        store.flush() # Builds and saves the index (a saved one with the same build settings is reused)
+        build_seconds = time.perf_counter() - start
+        ann = collection._ann
+        index_mb = round(os.path.getsize(collection._ann_path("faiss")) / 1e6, 1)
+        for value in search_values:
+            for rerank in reranks:
+                setattr(ann, search_key, value)
+                ann.rerank_factor = rerank
+                row = {"mode": mode, **ann.params, search_key: value, "rerank_factor": rerank,
+                       "build_seconds": round(build_seconds, 2), "index_mb": index_mb,
+                       "times_smaller": round(exact["vector_mb"] / max(index_mb, 0.1), 1)}
+                row.update(score(measure(collection, queries, args.k, args.batch, where), exact))
+                rows.append(row)
+                print(json.dumps(row))
+        collection.close()
+    return rows
+
+
+def best_settings(rows: list, target: float) -> dict:
+    """Per mode, the setting with the lowest p50 among those reaching the target recall."""
+    best = {}
+    for row in rows:
+        if row["recall_at_k"] >= target and (row["mode"] not in best or row["query_p50_ms"] < best[row["mode"]]["query_p50_ms"]):
+            best[row["mode"]] = row
+    return best
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recall@k vs latency of the ANN index modes against exact search")
+    parser.add_argument("--count", type=int, default=50000, help="Vectors in the collection")
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--batch", type=int, default=32, help="Queries per call in the batched run")
+    parser.add_argument("--seed", type=int, default=2024)
+    parser.add_argument("--modes", default="hnsw,ivfpq,binary,int8")
+    parser.add_argument("--hnsw-m", type=int_list, default=[16, 32])
+    parser.add_argument("--ef-search", type=int_list, default=[16, 32, 64, 128, 256])
+    parser.add_argument("--pq-code-bytes", type=int_list, default=[32, 64, 96], help="Must divide --dim")
+    parser.add_argument("--nprobe", type=int_list, default=[1, 4, 16, 64])
+    parser.add_argument("--coarse-candidates", type=int_list, default=[50, 100, 200, 400],
+                        help="Candidates the binary/int8 scans keep for re-scoring")
+    parser.add_argument("--rerank", type=int_list, default=[1, 4], help="Candidates re-scored per result (HNSW, IVF-PQ)")
+    parser.add_argument("--target-recall", type=float, default=0.95)
+    parser.add_argument("--output", default=None, help="Write the JSON report here")
+    args = parser.parse_args()
+
+    vectors = synthetic_vectors(args.count + args.queries, args.dim, args.seed)
+    vectors, queries = vectors[:args.count], vectors[args.count:]
+    where = {f"cat_{CATEGORIES[0]}": True}
+    print(f"{args.count} vectors x {args.dim} dims, {args.queries} queries, k={args.k}, filter {where}")
+
+    work_dir = tempfile.mkdtemp(prefix="mezan_ann_bench_")
+    report = {"count": args.count, "dim": args.dim, "queries": args.queries, "k": args.k, "batch": args.batch,
+              "target_recall": args.target_recall, "results": []}
+    try:
+        directory = os.path.join(work_dir, "flat")
+        print(f"Built the flat store in {build_store(directory, vectors, synthetic_metadata(args.count, args.seed)):.1f}s")
+        exact_collection = FlatVectorStore(directory, "bench_vectors")._collection
+        exact = measure(exact_collection, queries, args.k, args.batch, where)
+        exact["vector_mb"] = exact_collection.stats()["vector_mb"]
+        report["exact"] = {key: value for key, value in exact.items() if not key.endswith("ids")}
+        print(f"exact: {json.dumps(report['exact'])}")
+
+        modes = args.modes.split(",")
+        if "hnsw" in modes:
+            report["results"] += sweep(directory, "hnsw", [{"hnsw_m": m} for m in args.hnsw_m], "ef_search",
+                                       args.ef_search, args.rerank, args, queries, where, exact)
+        if "ivfpq" in modes:
+            report["results"] += sweep(directory, "ivfpq", [{"pq_code_bytes": size} for size in args.pq_code_bytes
+                                                            if args.dim % size == 0],
+                                       "nprobe", args.nprobe, args.rerank, args, queries, where, exact)
+        for mode in ("binary", "int8"):
+            if mode in modes: # Candidates are set directly, so the re-rank factor stays 1
+                report["results"] += sweep(directory, mode, [{}], "coarse_candidates", args.coarse_candidates, [1],
+                                           args, queries, where, exact)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    report["best"] = best_settings(report["results"], args.target_recall)
+    print(f"\n{'mode':<6} {'build':<22} {'search':<16} {'rerank':>6} {'recall':>7} {'filtered':>8} {'p50 ms':>8} "
+          f"{'p95 ms':>8} {'batch ms':>8} {'index MB':>8} {'smaller':>7}")
+    print(f"{'exact':<6} {'':<22} {'':<16} {'':>6} {1.0:>7} {1.0:>8} {report['exact']['query_p50_ms']:>8} "
+          f"{report['exact']['query_p95_ms']:>8} {report['exact']['batched_query_mean_ms']:>8} {report['exact']['vector_mb']:>8} {1:>7}")
+    for row in report["results"]:
+        build = {"hnsw": lambda: f"M={row['hnsw_m']}", "ivfpq": lambda: f"pq={row['pq_code_bytes']}B nlist={row['nlist']}"}.get(
+            row["mode"], lambda: "")()
+        search = {"hnsw": lambda: f"efSearch={row['ef_search']}", "ivfpq": lambda: f"nprobe={row['nprobe']}"}.get(
+            row["mode"], lambda: f"candidates={row['coarse_candidates']}")()
+        print(f"{row['mode']:<6} {build:<22} {search:<16} {row['rerank_factor']:>6} {row['recall_at_k']:>7} "
+              f"{row['filtered_recall_at_k']:>8} {row['query_p50_ms']:>8} {row['query_p95_ms']:>8} "
+              f"{row['batched_query_mean_ms']:>8} {row['index_mb']:>8} {row['times_smaller']:>7}")
+    for mode, row in report["best"].items():
+        print(f"Fastest {mode} setting with recall@{args.k} >= {args.target_recall}: "
+              f"{ {key: row[key] for key in row if key in ('hnsw_m', 'ef_search', 'pq_code_bytes', 'nprobe', 'coarse_candidates', 'rerank_factor')} }")
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
@@ -0,0 +1,108 @@
+# backend/benchmarks/bench_embeddings.py
+#
+# Compares embedding backends (PyTorch vs. int8 ONNX Runtime) on CPU:
+#   - parity: cosine agreement of the candidate backend against PyTorch
+#   - per-query latency (single-sentence embed_query, p50/p95)
+#   - ingestion throughput (embed_documents in batches, chunks/sec)
+#
+# Usage:
+#   python backend/benchmarks/bench_embeddings.py [--pdf-dir data/raw_pdfs] [--queries 200] [--output report.json]
+
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))) # backend/
+
+from embedding_backends import create_base_embedding_model
+from onnx_embeddings import check_parity
+
+SAMPLE_QUERIES = [
+    "Quelles sont les conditions d'acquisition de la nationalité algérienne ?",
+    "ما هي شروط الحصول على الجنسية الجزائرية؟",
+    "Quelle est la durée légale du préavis en cas de licenciement ?",
+    "ما هي مدة الإشعار المسبق في حالة التسريح من العمل؟",
+    "Comment créer une société à responsabilité limitée (SARL) ?",
+    "ما هي إجراءات الطلاق في قانون الأسرة الجزائري؟",
+    "Quelles sont les peines prévues pour le vol qualifié ?",
+    "قانون رقم 84-11 المتضمن قانون الأسرة",
+]
+
+SAMPLE_CHUNK = (
+    "Art. 1er. — La présente loi a pour objet de fixer les règles générales applicables aux relations de travail. "
+    "المادة الأولى: يهدف هذا القانون إلى تحديد القواعد العامة المطبقة على علاقات العمل. "
+) * 6
+
+
+def load_chunks(pdf_dir: str, limit: int):
+    """Chunks from real PDFs when a directory is given, otherwise a synthetic bilingual chunk."""
+    if not pdf_dir:
+        return [f"{i} {SAMPLE_CHUNK}" for i in range(limit)]
+    from ingestion import iter_pdf_chunks
+    import glob
+    chunks = []
+    for pdf_path in sorted(glob.glob(os.path.join(pdf_dir, "*.pdf"))):
+        for record in iter_pdf_chunks(pdf_path):
+            chunks.append(record["text"])
+            if len(chunks) >= limit:
+                return chunks
+    return chunks
+
+
+def bench_backend(embeddings, queries, chunks, batch_size: int) -> dict:
+    embeddings.embed_query(queries[0]) # Warm-up (lazy init, allocator)
+
+    latencies = []
+    for i in range(len(queries)):
+        start = time.perf_counter()
+        embeddings.embed_query(queries[i])
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    for i in range(0, len(chunks), batch_size):
+        embeddings.embed_documents(chunks[i:i + batch_size])
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "query_latency_ms_p50": statistics.median(latencies),
+        "query_latency_ms_p95": latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))],
+        "ingestion_chunks_per_sec": len(chunks) / elapsed,
+    }
+
+
+if __name__ == "__main__":
+    from ingestion import EMBEDDING_MODEL_NAME
+
+    parser = argparse.ArgumentParser(description="Benchmark embedding backends")
+    parser.add_argument("--model", default=EMBEDDING_MODEL_NAME)
+    parser.add_argument("--backends", default="torch,onnx-int8")
+    parser.add_argument("--pdf-dir", default=None, help="Take chunks from these PDFs instead of synthetic text")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--chunks", type=int, default=512)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--output", default=None, help="Write the JSON report here")
+    args = parser.parse_args()
+
+    queries = [SAMPLE_QUERIES[i % len(SAMPLE_QUERIES)] + f" ({i})" for i in range(args.queries)]
+    chunks = load_chunks(args.pdf_dir, args.chunks)
+    backends = {name: create_base_embedding_model(args.model, name) for name in args.backends.split(",")}
+
+    report = {"model": args.model, "queries": len(queries), "chunks": len(chunks), "backends": {}}
+    for name, embeddings in backends.items():
+        print(f"Benchmarking backend '{name}'...")
+        report["backends"][name] = bench_backend(embeddings, queries, chunks, args.batch_size)
+
+    if "torch" in backends:
+        sample = SAMPLE_QUERIES + chunks[:64]
+        for name, embeddings in backends.items():
+            if name != "torch":
+                report["backends"][name]["parity_vs_torch"] = check_parity(backends["torch"], embeddings, sample)
+
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
@@ -0,0 +1,142 @@
+# backend/benchmarks/bench_extractors.py
+#
+# Compares PDF text extraction engines (pypdf2, pypdfium2, pdfminer) on:
+#   - speed: pages/sec over the whole sample (best of --repeat runs)
+#   - agreement: word-sequence similarity of each engine's page text to the reference engine's
+#   - Arabic: share of Arabic letters in the output, and presentation-form glyphs that had to be folded
+#
+# Default sample: the category guides in frontend/assets/documents plus up to --sample Journals
+# from data/raw_pdfs (a fixed random subset, so runs are comparable).
+#
+# Usage:
+#   python backend/benchmarks/bench_extractors.py [--engines pypdf2,pypdfium2,pdfminer] [--reference pypdfium2]
+#       [--journals data/raw_pdfs] [--sample 20] [--repeat 3] [--output report.json]
+
+import os
+import sys
+import glob
+import json
+import time
+import random
+import difflib
+import argparse
+import statistics
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))) # backend/
+
+from pdf_extractors import get_pdf_extractor, fold_arabic_presentation_forms, PDF_EXTRACTORS, ARABIC_PRESENTATION_FORMS_RE
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+GUIDES_GLOB = os.path.join(PROJECT_ROOT, 'frontend', 'assets', 'documents', '*.pdf')
+JOURNALS_DIR = os.path.join(PROJECT_ROOT, 'data', 'raw_pdfs')
+
+
+def is_arabic_letter(char: str) -> bool:
+    return "؀" <= char <= "ۿ" or "ݐ" <= char <= "ݿ"
+
+
+def collect_pdfs(journals_dir: str, sample: int, seed: int = 13):
+    guides = sorted(glob.glob(GUIDES_GLOB))
+    journals = sorted(glob.glob(os.path.join(journals_dir, "*.pdf")))
+    random.Random(seed).shuffle(journals)
+    return guides + sorted(journals[:sample])
+
+
+def extract_all(engine: str, pdf_paths):
+    """Returns ({pdf_path: [raw page texts]}, {pdf_path: error}, seconds)."""
+    extractor = get_pdf_extractor(engine)
+    texts, errors = {}, {}
+    start = time.perf_counter()
+    for pdf_path in pdf_paths:
+        try:
+            texts[pdf_path] = [text or "" for text in extractor.iter_raw_page_texts(pdf_path)]
+        except Exception as e:
+            errors[os.path.basename(pdf_path)] = f"{type(e).__name__}: {e}"
+    return texts, errors, time.perf_counter() - start
+
+
+def word_agreement(reference: str, candidate: str) -> float:
+    """Similarity of the two texts' word sequences (1.0 = same words in the same order)."""
+    reference_words, candidate_words = reference.split(), candidate.split()
+    if not reference_words and not candidate_words:
+        return 1.0
+    return difflib.SequenceMatcher(None, reference_words, candidate_words, autojunk=False).ratio()
+
+
+def summarize(texts: dict, errors: dict, seconds: float) -> dict:
+    pages = sum(len(page_texts) for page_texts in texts.values())
+    raw = "".join(text for page_texts in texts.values() for text in page_texts)
+    folded = fold_arabic_presentation_forms(raw)
+    letters = sum(1 for char in folded if char.isalpha())
+    return {
+        "files": len(texts),
+        "failed_files": errors,
+        "pages": pages,
+        "seconds": round(seconds, 4),
+        "pages_per_sec": round(pages / seconds, 2) if seconds and pages else 0.0,
+        "chars": len(folded),
+        "arabic_letter_share": round(sum(1 for char in folded if is_arabic_letter(char)) / letters, 4) if letters else 0.0,
+        "presentation_form_chars_folded": sum(len(m.group()) for m in ARABIC_PRESENTATION_FORMS_RE.finditer(raw)),
+    }
+
+
+def agreement(reference_texts: dict, candidate_texts: dict) -> dict:
+    """Per-page word agreement with the reference engine, over files both engines could read."""
+    scores = []
+    for pdf_path, reference_pages in reference_texts.items():
+        candidate_pages = candidate_texts.get(pdf_path)
+        if candidate_pages is None or len(candidate_pages) != len(reference_pages):
+            continue
+        scores.extend(word_agreement(fold_arabic_presentation_forms(ref), fold_arabic_presentation_forms(cand))
+                      for ref, cand in zip(reference_pages, candidate_pages))
+    if not scores:
+        return {"pages_compared": 0}
+    scores.sort()
+    return {
+        "pages_compared": len(scores),
+        "mean": round(statistics.mean(scores), 4),
+        "p05": round(scores[int(len(scores) * 0.05)], 4),
+        "min": round(scores[0], 4),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark PDF text extraction engines")
+    parser.add_argument("--engines", default=",".join(PDF_EXTRACTORS))
+    parser.add_argument("--reference", default="pypdfium2", help="Engine the others are compared against")
+    parser.add_argument("--journals", default=JOURNALS_DIR, help="Directory of Official Journal PDFs to sample")
+    parser.add_argument("--sample", type=int, default=20, help="Number of Journals to include")
+    parser.add_argument("--pdf", action="append", default=[], help="Extra PDF to include (repeatable)")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per engine; the fastest is reported")
+    parser.add_argument("--output", default=None, help="Write the JSON report here")
+    args = parser.parse_args()
+
+    pdf_paths = collect_pdfs(args.journals, args.sample) + args.pdf
+    if not pdf_paths:
+        print("No PDFs found to benchmark.")
+        sys.exit(1)
+    print(f"Benchmarking {len(pdf_paths)} PDFs...")
+
+    engines = [name for name in args.engines.split(",") if name]
+    results = {}
+    report = {"pdfs": [os.path.basename(path) for path in pdf_paths], "reference": args.reference, "engines": {}}
+    for engine in engines:
+        print(f"Extracting with '{engine}'...")
+        try:
+            best = min((extract_all(engine, pdf_paths) for _ in range(max(1, args.repeat))), key=lambda run: run[2])
+        except ImportError as e:
+            print(f"Skipping '{engine}': {e}")
+            report["engines"][engine] = {"error": f"not installed: {e}"}
+            continue
+        results[engine] = best[0]
+        report["engines"][engine] = summarize(*best)
+
+    if args.reference in results:
+        for engine, texts in results.items():
+            if engine != args.reference:
+                report["engines"][engine]["agreement_vs_reference"] = agreement(results[args.reference], texts)
+
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
@@ -0,0 +1,181 @@
+# backend/benchmarks/bench_ingestion.py
+#
+# End-to-end ingestion benchmark on a synthetic bilingual Journal corpus (see synthetic_corpus.py):
+# extraction -> cleaning -> chunking -> (dedup) -> embedding -> Chroma writes -> BM25 index, through the same
+# run_ingestion_pipeline the real ingestion uses, into a throwaway vector store (Chroma or the flat index).
+#
+# Each run appends one JSON line (throughput, per-stage seconds, peak RSS, config, corpus spec) to
+# the results file. With --baseline, key metrics are compared against a saved run and the script
+# exits with status 1 if any regressed by more than --tolerance, so it can gate changes offline.
+# The embedding cache is bypassed so every run pays for real forward passes.
+#
+# Usage:
+#   python backend/benchmarks/bench_ingestion.py [--count 20] [--pages 16] [--workers 1] [--batch-size 64]
+#       [--extractor pypdf2] [--embedding-backend torch] [--vector-store chroma] [--no-dedup]
+#       [--save-baseline baseline.json | --baseline baseline.json [--tolerance 0.10]]
+
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import resource
+import argparse
+import tempfile
+import subprocess
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))) # backend/
+
+from synthetic_corpus import generate_corpus
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+DEFAULT_CORPUS_DIR = os.path.join(PROJECT_ROOT, 'data', 'benchmarks', 'synthetic_corpus')
+DEFAULT_RESULTS_PATH = os.path.join(PROJECT_ROOT, 'data', 'benchmarks', 'ingestion_results.jsonl')
+
+# Metrics compared against the baseline, and whether higher values are better
+COMPARED_METRICS = {
+    "pages_per_sec": True,
+    "chunks_per_sec": True,
+    "chunks_written_per_sec": True,
+    "elapsed_seconds": False,
+    "peak_rss_mb": False,
+}
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process plus its (finished) worker processes."""
+    # ru_maxrss is in KiB on Linux and in bytes on macOS
+    per_mb = 1024 * 1024 if sys.platform == "darwin" else 1024
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return round((own + children) / per_mb, 1)
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=PROJECT_ROOT, capture_output=True,
+                              text=True, timeout=5).stdout.strip() or None
+    except Exception:
+        return None
+
+
+def run_benchmark(args) -> dict:
+    import ingestion
+    from embedding_backends import create_base_embedding_model
+    from vector_backends import open_vector_store
+
+    corpus = generate_corpus(args.corpus_dir, args.count, args.pages, args.chars_per_page, args.seed, args.font)
+    print(f"Corpus: {len(corpus['files'])} PDFs x {args.pages} pages, {corpus['total_bytes'] / 1e6:.1f} MB, "
+          f"Arabic: {corpus['spec']['arabic']}")
+
+    start = time.perf_counter()
+    embeddings = create_base_embedding_model(args.model, args.embedding_backend)
+    model_load_seconds = time.perf_counter() - start
+    rss_after_model_load = peak_rss_mb()
+
+    work_dir = tempfile.mkdtemp(prefix="mezan_bench_")
+    try:
+        store = open_vector_store(embeddings, "bench_documents", os.path.join(work_dir, args.vector_store),
+                                  backend=args.vector_store)
+        report = ingestion.run_ingestion_pipeline(
+            args.corpus_dir, store, embeddings, num_workers=args.workers,
+            manifest_path=os.path.join(work_dir, "manifest.sqlite3"), batch_size=args.batch_size,
+            dedup=not args.no_dedup, report_path=None, progress_interval=args.progress_interval,
+            generation_path=None, extractor=args.extractor,
+            lexical_index_path=os.path.join(work_dir, "lexical_index.npz"),
+        )
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    throughput = report["throughput"]
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "git_revision": git_revision(),
+        "host": {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count()},
+        "corpus": corpus["spec"],
+        "config": {"model": args.model, "embedding_backend": args.embedding_backend, "vector_store": args.vector_store,
+                   **report["config"]},
+        "metrics": {
+            "elapsed_seconds": report["elapsed_seconds"],
+            "pages_per_sec": throughput["pages_per_sec"],
+            "chunks_per_sec": throughput["chunks_per_sec"],
+            "chunks_written_per_sec": throughput["chunks_written_per_sec"],
+            "mb_read_per_sec": throughput["mb_read_per_sec"],
+            "model_load_seconds": round(model_load_seconds, 3),
+            "rss_after_model_load_mb": rss_after_model_load,
+            "peak_rss_mb": peak_rss_mb(),
+        },
+        "stages": report["stages"],
+        "lexical_index": report.get("lexical_index"),
+        "counters": report["counters"],
+    }
+
+
+def compare_to_baseline(result: dict, baseline: dict, tolerance: float) -> list:
+    """Prints a metric-by-metric comparison and returns the regressions beyond tolerance."""
+    if baseline.get("corpus") != result["corpus"] or baseline.get("config") != result["config"]:
+        print("Warning: baseline was recorded with a different corpus or configuration; comparison is indicative only.")
+
+    regressions = []
+    print(f"\n{'metric':<26}{'baseline':>12}{'current':>12}{'change':>10}")
+    for metric, higher_is_better in COMPARED_METRICS.items():
+        before, after = baseline["metrics"].get(metric), result["metrics"].get(metric)
+        if not before or after is None:
+            continue
+        change = (after - before) / before
+        worse = -change if higher_is_better else change
+        flag = "  REGRESSION" if worse > tolerance else ""
+        print(f"{metric:<26}{before:>12.2f}{after:>12.2f}{change:>+10.1%}{flag}")
+        if flag:
+            regressions.append({"metric": metric, "baseline": before, "current": after, "change": round(change, 4)})
+    return regressions
+
+
+if __name__ == "__main__":
+    from ingestion import EMBEDDING_MODEL_NAME, EMBED_BATCH_SIZE
+    from pdf_extractors import PDF_EXTRACTOR, PDF_EXTRACTORS
+    from embedding_backends import EMBEDDING_BACKEND, EMBEDDING_BACKENDS
+    from vector_backends import VECTOR_STORE_BACKEND, VECTOR_STORE_BACKENDS
+
+    parser = argparse.ArgumentParser(description="Benchmark ingestion on a synthetic Journal corpus")
+    parser.add_argument("--corpus-dir", default=DEFAULT_CORPUS_DIR)
+    parser.add_argument("--count", type=int, default=20, help="Number of synthetic PDFs")
+    parser.add_argument("--pages", type=int, default=16, help="Pages per PDF")
+    parser.add_argument("--chars-per-page", type=int, default=3000)
+    parser.add_argument("--seed", type=int, default=2024)
+    parser.add_argument("--font", default=None, help="TTF font with Arabic glyphs (French-only corpus without one)")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--batch-size", type=int, default=EMBED_BATCH_SIZE)
+    parser.add_argument("--extractor", choices=sorted(PDF_EXTRACTORS), default=PDF_EXTRACTOR)
+    parser.add_argument("--model", default=EMBEDDING_MODEL_NAME)
+    parser.add_argument("--embedding-backend", choices=EMBEDDING_BACKENDS, default=EMBEDDING_BACKEND)
+    parser.add_argument("--vector-store", choices=VECTOR_STORE_BACKENDS, default=VECTOR_STORE_BACKEND)
+    parser.add_argument("--no-dedup", action="store_true")
+    parser.add_argument("--progress-interval", type=float, default=0)
+    parser.add_argument("--results", default=DEFAULT_RESULTS_PATH, help="JSONL file each run is appended to")
+    parser.add_argument("--baseline", default=None, help="Compare against this saved run")
+    parser.add_argument("--save-baseline", default=None, help="Save this run as a baseline")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="Allowed relative slowdown before failing")
+    args = parser.parse_args()
+
+    result = run_benchmark(args)
+    print(json.dumps(result["metrics"], indent=2))
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.results)), exist_ok=True)
+    with open(args.results, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(result, ensure_ascii=False) + "\n")
+    print(f"Result appended to {args.results}")
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w', encoding='utf-8') as f:
+            json.dump(result, f, indent=2, ensure_ascii=False)
+        print(f"Baseline saved to {args.save_baseline}")
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            regressions = compare_to_baseline(result, json.load(f), args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} metric(s) regressed by more than {args.tolerance:.0%}.")
+            sys.exit(1)
+        print("\nNo regressions against the baseline.")
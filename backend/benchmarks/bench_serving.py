@@ -0,0 +1,293 @@
+# backend/benchmarks/bench_serving.py
+#
+# Load test of the sync server (app.py under gunicorn, gthread workers) against the asyncio server
+# (asgi_app.py under uvicorn). Each server is started in a child process over the real RAG stack
+# (embedding model, vector store, BM25 index: run ingestion first), then for each number of
+# concurrent users every user sends chat requests back to back for --duration seconds. Per server
+# and concurrency:
+#   - throughput: answers per second, and errors
+#   - latency: p50/p95 ms of whole answers (and of the first answer text with --endpoint stream)
+#   - memory: PSS of the server's process tree (all gunicorn workers) before the load and at its
+#     peak, and the peak per concurrent user
+# Questions are made distinct (a suffix per request) and the response cache is disabled, so every
+# request embeds its query and reaches the LLM.
+# By default Gemini is replaced in the servers by a simulated model that waits --llm-seconds (time.sleep
+# in the sync server, asyncio.sleep in the async one) and streams --llm-chunks pieces: the load test
+# measures how each server holds waiting chats without spending API quota. --llm gemini uses the real
+# API (GEMINI_API_KEY), quota permitting.
+# --server-env sets server configuration, e.g. QUERY_BATCH_MAX_SIZE=1 to measure without the query
+# batcher (query_batcher.py) or QUERY_BATCH_WINDOW_MS=2 to try another window.
+# The load generator runs on the same machine; on a small box it competes with the servers for CPU.
+#
+# Usage:
+#   python backend/benchmarks/bench_serving.py [--servers sync,async] [--users 8,32,128,256] [--duration 30]
+#       [--endpoint chat|stream] [--llm simulated|gemini] [--llm-seconds 1.5] [--llm-chunks 20]
+#       [--sync-workers 2] [--sync-threads 8] [--server-env KEY=VALUE ...] [--output report.json]
+
+import os
+import sys
+import json
+import time
+import socket
+import asyncio
+import argparse
+import subprocess
+from types import SimpleNamespace
+
+import numpy as np
+import httpx
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, BACKEND_DIR) # backend/
+
+QUESTIONS = [
+    ("Quelles sont les conditions d'acquisition de la nationalité algérienne ?", "family"),
+    ("ما هي شروط الحصول على الجنسية الجزائرية؟", "family"),
+    ("Quelle est la durée légale du préavis en cas de licenciement ?", "business"),
+    ("ما هي إجراءات الطلاق في قانون الأسرة الجزائري؟", "family"),
+    ("Quelles sont les peines prévues pour le vol qualifié ?", "penal"),
+    ("ما هي عقوبة السياقة في حالة سكر؟", "accident"),
+    ("Comment enregistrer un acte de vente immobilière ?", "property"),
+    ("ما هي آجال الطعن بالنقض في المادة الجزائية؟", "criminal"),
+]
+
+
+# --- Simulated Gemini (server side) ---
+class SimulatedGemini:
+    """Stands in for GenerativeModel: answers any prompt after `seconds`, in `chunks` pieces when streamed."""
+
+    def __init__(self, seconds: float, chunks: int):
+        self.seconds = seconds
+        self.pieces = [f"Simulated answer part {i}. " for i in range(max(1, chunks))]
+
+    @staticmethod
+    def _chunk(text: str):
+        return SimpleNamespace(candidates=[SimpleNamespace(content=SimpleNamespace(parts=[SimpleNamespace(text=text)]))])
+
+    def _whole(self):
+        reply = "".join(self.pieces)
+        return SimpleNamespace(text=reply, parts=[SimpleNamespace(text=reply)], prompt_feedback=None)
+
+    def _stream(self):
+        for piece in self.pieces:
+            time.sleep(self.seconds / len(self.pieces))
+            yield self._chunk(piece)
+
+    async def _stream_async(self):
+        for piece in self.pieces:
+            await asyncio.sleep(self.seconds / len(self.pieces))
+            yield self._chunk(piece)
+
+    def generate_content(self, prompt: str, stream: bool = False):
+        if stream:
+            return self._stream()
+        time.sleep(self.seconds)
+        return self._whole()
+
+    async def generate_content_async(self, prompt: str, stream: bool = False):
+        if stream:
+            return self._stream_async()
+        await asyncio.sleep(self.seconds)
+        return self._whole()
+
+
+def install_simulated_llm(args):
+    if args.llm == "simulated":
+        import rag_service
+        rag_service.llm_model_instance = SimulatedGemini(args.llm_seconds, args.llm_chunks)
+
+
+def serve(args):
+    """Runs one server in this (child) process until it is terminated."""
+    if args.serve == "async":
+        import uvicorn
+        import asgi_app
+        install_simulated_llm(args)
+        uvicorn.run(asgi_app.app, host="127.0.0.1", port=args.port, log_level="warning", backlog=4096)
+        return
+
+    from gunicorn.app.base import BaseApplication
+
+    class SyncServer(BaseApplication):
+        def load_config(self):
+            for key, value in {"bind": f"127.0.0.1:{args.port}", "workers": args.sync_workers, "threads": args.sync_threads,
+                               "worker_class": "gthread", "timeout": 300, "backlog": 4096, "loglevel": "warning"}.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            # In each worker (no preload): every worker loads its own models, as in production
+            import app as flask_app
+            install_simulated_llm(args)
+            return flask_app.app
+
+    SyncServer().run()
+
+
+# --- Load generator ---
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _children(pid: int) -> list:
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            return [int(child) for child in f.read().split()]
+    except OSError:
+        return []
+
+
+def process_tree_mb(pid: int) -> float:
+    """Proportional set size of pid and its descendants (RSS where smaps_rollup is unavailable), MB."""
+    total, pending = 0, [pid]
+    while pending:
+        current = pending.pop()
+        pending += _children(current)
+        try:
+            with open(f"/proc/{current}/smaps_rollup") as f:
+                total += next(int(line.split()[1]) * 1024 for line in f if line.startswith("Pss:"))
+        except (OSError, StopIteration):
+            try:
+                with open(f"/proc/{current}/statm") as f:
+                    total += int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+            except OSError:
+                pass
+    return round(total / 1e6, 1)
+
+
+def percentile(values: list, q: float) -> float:
+    return round(float(np.percentile(values, q)) * 1000, 1) if values else None
+
+
+async def ask(client: httpx.AsyncClient, url: str, stream: bool, body: dict) -> tuple:
+    """(ok, seconds, seconds to the first answer text or None) of one chat request."""
+    start = time.perf_counter()
+    if not stream:
+        response = await client.post(url, json=body)
+        return response.status_code == 200 and "reply" in response.json(), time.perf_counter() - start, None
+    first, done = None, False
+    async with client.stream("POST", url, json=body) as response:
+        async for line in response.aiter_lines():
+            if first is None and line in ("event: token", "event: reply"):
+                first = time.perf_counter() - start
+            done = done or line == "event: done"
+    return response.status_code == 200 and done, time.perf_counter() - start, first
+
+
+async def run_load(base_url: str, endpoint: str, users: int, duration: float, pid: int) -> dict:
+    url = base_url + ("/api/chat/stream" if endpoint == "stream" else "/api/chat")
+    latencies, first_texts, errors, peak_mb = [], [], [], [process_tree_mb(pid)]
+    deadline = time.perf_counter() + duration
+
+    async def user(user_id: int):
+        n = 0
+        while time.perf_counter() < deadline:
+            question, category = QUESTIONS[(user_id + n) % len(QUESTIONS)]
+            try:
+                ok, seconds, first = await ask(client, url, endpoint == "stream",
+                                               {"message": f"{question} ({user_id}-{n})", "category": category})
+            except httpx.HTTPError as e:
+                ok, seconds, first = False, None, None
+                errors.append(type(e).__name__)
+            if ok:
+                latencies.append(seconds)
+                if first is not None:
+                    first_texts.append(first)
+            elif seconds is not None:
+                errors.append("bad response")
+            n += 1
+
+    async def sample_memory():
+        while time.perf_counter() < deadline:
+            peak_mb[0] = max(peak_mb[0], process_tree_mb(pid))
+            await asyncio.sleep(0.5)
+
+    limits = httpx.Limits(max_connections=users, max_keepalive_connections=users)
+    async with httpx.AsyncClient(limits=limits, timeout=httpx.Timeout(600.0)) as client:
+        start = time.perf_counter()
+        await asyncio.gather(sample_memory(), *(user(i) for i in range(users)))
+        elapsed = time.perf_counter() - start
+
+    return {"users": users, "answers": len(latencies), "errors": len(errors),
+            "answers_per_second": round(len(latencies) / elapsed, 2),
+            "p50_ms": percentile(latencies, 50), "p95_ms": percentile(latencies, 95),
+            "first_text_p50_ms": percentile(first_texts, 50), "first_text_p95_ms": percentile(first_texts, 95),
+            "peak_mb": peak_mb[0], "peak_mb_per_user": round(peak_mb[0] / users, 2)}
+
+
+def start_server(name: str, args) -> tuple:
+    port = free_port()
+    command = [sys.executable, os.path.abspath(__file__), "--serve", name, "--port", str(port), "--llm", args.llm,
+               "--llm-seconds", str(args.llm_seconds), "--llm-chunks", str(args.llm_chunks),
+               "--sync-workers", str(args.sync_workers), "--sync-threads", str(args.sync_threads)]
+    env = dict(os.environ, RESPONSE_CACHE_SIZE="0", TIMING_HEADER_SAMPLE_RATE="0",
+               **dict(setting.split("=", 1) for setting in args.server_env))
+    # The servers log every request; only their errors are kept
+    process = subprocess.Popen(command, cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    base_url = f"http://127.0.0.1:{port}"
+    started = time.perf_counter()
+    while time.perf_counter() - started < args.startup_timeout:
+        if process.poll() is not None:
+            raise RuntimeError(f"{name} server exited:\n{process.stderr.read()}")
+        try:
+            if httpx.get(base_url + "/", timeout=2).status_code == 200:
+                return process, base_url, time.perf_counter() - started
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.5)
+    process.terminate()
+    raise RuntimeError(f"{name} server did not answer within {args.startup_timeout}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Throughput and memory per concurrent user of the sync and async servers")
+    parser.add_argument("--servers", default="sync,async")
+    parser.add_argument("--users", default="8,32,128,256", help="Concurrent users, one load run each")
+    parser.add_argument("--duration", type=float, default=30, help="Seconds of load per run")
+    parser.add_argument("--endpoint", choices=("chat", "stream"), default="chat")
+    parser.add_argument("--llm", choices=("simulated", "gemini"), default="simulated")
+    parser.add_argument("--llm-seconds", type=float, default=1.5, help="Simulated Gemini answer time")
+    parser.add_argument("--llm-chunks", type=int, default=20, help="Pieces a simulated streamed answer comes in")
+    parser.add_argument("--sync-workers", type=int, default=2, help="gunicorn workers of the sync server")
+    parser.add_argument("--sync-threads", type=int, default=8, help="Threads per gunicorn worker")
+    parser.add_argument("--server-env", action="append", default=[], help="KEY=VALUE set in the servers' environment (repeatable)")
+    parser.add_argument("--startup-timeout", type=float, default=600)
+    parser.add_argument("--output", default=None, help="Write the JSON report here")
+    # Internal: run as the server child process
+    parser.add_argument("--serve", choices=("sync", "async"), help=argparse.SUPPRESS)
+    parser.add_argument("--port", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args)
+        sys.exit(0)
+
+    report = {"endpoint": args.endpoint, "llm": args.llm, "llm_seconds": args.llm_seconds, "duration": args.duration,
+              "sync_workers": args.sync_workers, "sync_threads": args.sync_threads, "server_env": args.server_env, "servers": {}}
+    for name in args.servers.split(","):
+        process, base_url, startup_seconds = start_server(name, args)
+        try:
+            httpx.post(base_url + "/api/chat", json={"message": QUESTIONS[0][0], "category": QUESTIONS[0][1]}, timeout=600) # Warm-up
+            idle_mb = process_tree_mb(process.pid)
+            runs = []
+            for users in (int(value) for value in args.users.split(",") if value):
+                run = asyncio.run(run_load(base_url, args.endpoint, users, args.duration, process.pid))
+                run["added_mb_per_user"] = round((run["peak_mb"] - idle_mb) / users, 2)
+                runs.append(run)
+                print(f"{name}: {json.dumps(run)}")
+            report["servers"][name] = {"startup_seconds": round(startup_seconds, 1), "idle_mb": idle_mb, "runs": runs}
+        finally:
+            process.terminate()
+            process.wait(timeout=60)
+
+    print(f"\n{'server':<6} {'users':>5} {'answers/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'1st p50':>8} {'errors':>6} "
+          f"{'idle MB':>8} {'peak MB':>8} {'MB/user':>8} {'+MB/user':>8}")
+    for name, server in report["servers"].items():
+        for run in server["runs"]:
+            print(f"{name:<6} {run['users']:>5} {run['answers_per_second']:>9} {run['p50_ms']!s:>8} {run['p95_ms']!s:>8} "
+                  f"{run['first_text_p50_ms']!s:>8} {run['errors']:>6} {server['idle_mb']:>8} {run['peak_mb']:>8} "
+                  f"{run['peak_mb_per_user']:>8} {run['added_mb_per_user']:>8}")
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
@@ -0,0 +1,144 @@
+# backend/benchmarks/bench_text_pipeline.py
+#
+# Compares the original clean_text + RecursiveCharacterTextSplitter pair with legal_text's
+# single-pass normalizer and article-aware splitter on large Journals:
+#   - speed: seconds spent cleaning and splitting (page text is extracted once, up front, untimed).
+#     The original clean_text is nearly free because its str.replace calls never match, so compare
+#     split_seconds for the chunkers and read clean_seconds as the cost of real normalization
+#   - output: characters kept, chunks produced, mean chunk length, chunks starting at an article
+#
+# Default input: data/raw_pdfs, else a generated synthetic corpus (see synthetic_corpus.py).
+#
+# Usage:
+#   python backend/benchmarks/bench_text_pipeline.py [--pdf-dir data/raw_pdfs] [--limit 20] [--extractor pypdfium2]
+#       [--chunk-size 1000] [--chunk-overlap 150] [--repeat 3] [--output report.json]
+
+import os
+import re
+import sys
+import glob
+import json
+import time
+import argparse
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))) # backend/
+
+from legal_text import normalize_text, get_text_splitter
+from pdf_extractors import get_pdf_extractor, PDF_EXTRACTORS
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+JOURNALS_DIR = os.path.join(PROJECT_ROOT, 'data', 'raw_pdfs')
+SYNTHETIC_DIR = os.path.join(PROJECT_ROOT, 'data', 'benchmarks', 'synthetic_corpus')
+
+ARTICLE_START_RE = re.compile(r"(?:Art(?:icle)?\.?\s*(?:\d|1er|premier)|المادة\s*(?:\d|[٠-٩]|ال[اأ]ول))")
+
+
+# --- The pair being replaced, as it was ---
+def legacy_clean_text(text: str) -> str:
+    text = text.replace('\n\n+', '\n') # Replace multiple newlines
+    text = text.replace('  +', ' ')   # Replace multiple spaces
+    text = "\n".join([line.strip() for line in text.split('\n')]).strip() # Remove leading/trailing whitespace from lines
+    return text
+
+
+def legacy_split(text: str, chunk_size: int, chunk_overlap: int):
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+    text_splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap,
+                                                   length_function=len, add_start_index=False)
+    return text_splitter.split_text(text)
+
+
+def new_split(text: str, chunk_size: int, chunk_overlap: int):
+    return get_text_splitter(chunk_size, chunk_overlap).split_text(text)
+
+
+PIPELINES = {
+    "legacy": (legacy_clean_text, legacy_split),
+    "legal_text": (normalize_text, new_split),
+}
+
+
+def load_documents(pdf_dir: str, limit: int, extractor: str):
+    """[[page texts]] for the largest `limit` PDFs (extraction is not part of the comparison)."""
+    pdf_paths = sorted(glob.glob(os.path.join(pdf_dir, "*.pdf")), key=os.path.getsize, reverse=True)[:limit]
+    engine = get_pdf_extractor(extractor)
+    documents = []
+    for pdf_path in pdf_paths:
+        try:
+            documents.append(list(engine.iter_page_texts(pdf_path)))
+        except Exception as e:
+            print(f"Skipping {os.path.basename(pdf_path)}: {e}")
+    return documents
+
+
+def run_pipeline(name: str, documents, chunk_size: int, chunk_overlap: int):
+    """Cleans each page and splits each document; returns (chunks, cleaned_chars, clean_seconds, split_seconds)."""
+    clean, split = PIPELINES[name]
+    chunks, cleaned_chars, clean_seconds, split_seconds = [], 0, 0.0, 0.0
+    for pages in documents:
+        start = time.perf_counter()
+        text = "\n".join(clean(page) for page in pages)
+        clean_seconds += time.perf_counter() - start
+        cleaned_chars += len(text)
+        start = time.perf_counter()
+        chunks.extend(split(text, chunk_size, chunk_overlap))
+        split_seconds += time.perf_counter() - start
+    return chunks, cleaned_chars, clean_seconds, split_seconds
+
+
+def summarize(chunks, cleaned_chars: int, clean_seconds: float, split_seconds: float, raw_chars: int) -> dict:
+    seconds = clean_seconds + split_seconds
+    return {
+        "seconds": round(seconds, 4),
+        "clean_seconds": round(clean_seconds, 4),
+        "split_seconds": round(split_seconds, 4),
+        "mb_per_sec": round(raw_chars / 1e6 / seconds, 2) if seconds else 0.0,
+        "chars_kept": cleaned_chars,
+        "chars_kept_share": round(cleaned_chars / raw_chars, 4) if raw_chars else 0.0,
+        "chunks": len(chunks),
+        "mean_chunk_chars": round(sum(map(len, chunks)) / len(chunks), 1) if chunks else 0.0,
+        "chunks_starting_at_article": round(sum(1 for chunk in chunks if ARTICLE_START_RE.match(chunk)) / len(chunks), 4)
+        if chunks else 0.0,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark text cleaning and chunking")
+    parser.add_argument("--pdf-dir", default=None, help="Directory of PDFs (default: data/raw_pdfs, else a synthetic corpus)")
+    parser.add_argument("--limit", type=int, default=20, help="Number of (largest) PDFs to use")
+    parser.add_argument("--extractor", choices=sorted(PDF_EXTRACTORS), default="pypdfium2")
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--chunk-overlap", type=int, default=150)
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per pipeline; the fastest is reported")
+    parser.add_argument("--output", default=None, help="Write the JSON report here")
+    args = parser.parse_args()
+
+    pdf_dir = args.pdf_dir
+    if pdf_dir is None:
+        pdf_dir = JOURNALS_DIR if glob.glob(os.path.join(JOURNALS_DIR, "*.pdf")) else SYNTHETIC_DIR
+        if pdf_dir == SYNTHETIC_DIR:
+            from synthetic_corpus import generate_corpus
+            generate_corpus(SYNTHETIC_DIR, count=args.limit, pages=48)
+
+    documents = load_documents(pdf_dir, args.limit, args.extractor)
+    if not documents:
+        print(f"No readable PDFs in {pdf_dir}.")
+        sys.exit(1)
+    raw_chars = sum(len(page) for pages in documents for page in pages)
+    print(f"{len(documents)} documents, {sum(map(len, documents))} pages, {raw_chars / 1e6:.1f}M characters from {pdf_dir}")
+
+    report = {"pdf_dir": pdf_dir, "documents": len(documents), "raw_chars": raw_chars,
+              "chunk_size": args.chunk_size, "chunk_overlap": args.chunk_overlap, "pipelines": {}}
+    for name in PIPELINES:
+        best = min((run_pipeline(name, documents, args.chunk_size, args.chunk_overlap)
+                    for _ in range(max(1, args.repeat))), key=lambda run: run[2] + run[3])
+        report["pipelines"][name] = summarize(*best, raw_chars)
+
+    legacy, new = report["pipelines"]["legacy"], report["pipelines"]["legal_text"]
+    report["speedup"] = round(legacy["seconds"] / new["seconds"], 2) if new["seconds"] else None
+    report["chunk_reduction"] = round(1 - new["chunks"] / legacy["chunks"], 4) if legacy["chunks"] else None
+
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
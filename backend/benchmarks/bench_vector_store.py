@@ -0,0 +1,214 @@
+# backend/benchmarks/bench_vector_store.py
+#
+# Compares the vector store backends (see vector_backends.py) on a synthetic collection of
+# embedding-like vectors (clustered, unit-normalized, 768 dimensions like all-mpnet-base-v2):
+#   - build: seconds to upsert every vector in ingestion-sized batches
+#   - startup: seconds for a fresh process to import the backend and open the store
+#   - latency: p50/p95 ms of single-query searches, with and without a category filter, and the
+#     per-query cost of batched searches (--batch queries in one call)
+#   - memory: RSS of the serving process after opening the store, after the unfiltered single
+#     queries and after all the queries
+#   - recall@k against exact cosine search (the flat index is exact; Chroma's HNSW is approximate)
+# Each backend is opened and queried in a separate child process, so startup and RSS are not
+# polluted by the build. Chroma is skipped if chromadb is not installed.
+# A flat backend name can end with an index mode (ann_index.py), e.g. flat-float32-binary: RSS then
+# shows the compact codes plus the vector pages read to re-score candidates.
+#
+# Usage:
+#   python backend/benchmarks/bench_vector_store.py [--count 50000] [--dim 768] [--queries 200] [--k 10]
+#       [--batch 32] [--backends flat-float16,flat-float32,flat-float32-binary,chroma] [--output report.json]
+
+import os
+import sys
+import json
+import time
+import shutil
+import resource
+import argparse
+import tempfile
+import subprocess
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))) # backend/
+
+CATEGORIES = ("accident", "penal", "criminal", "family", "property", "business")
+WRITE_BATCH = 256
+
+
+def rss_mb() -> float:
+    """Current resident set size (Linux), else the peak."""
+    try:
+        with open("/proc/self/statm") as f:
+            return round(int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1e6, 1)
+    except OSError:
+        per_mb = 1024 * 1024 if sys.platform == "darwin" else 1024
+        return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / per_mb, 1)
+
+
+def synthetic_vectors(count: int, dim: int, seed: int, clusters: int = 200) -> np.ndarray:
+    """Unit vectors scattered around random centroids, like embeddings of topically grouped chunks."""
+    rng = np.random.default_rng(seed)
+    centroids = rng.normal(size=(clusters, dim)).astype(np.float32)
+    vectors = centroids[rng.integers(0, clusters, size=count)] + 0.6 * rng.normal(size=(count, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def synthetic_metadata(count: int, seed: int) -> list:
+    rng = np.random.default_rng(seed + 1)
+    tagged = rng.random(size=(count, len(CATEGORIES))) < 0.15
+    return [{"source": f"synthetic_{i // 400:04d}.pdf", "chunk_num": i % 400, "page": 1 + (i % 400) // 8,
+             **{f"cat_{category}": bool(flag) for category, flag in zip(CATEGORIES, row)}}
+            for i, row in enumerate(tagged)]
+
+
+def parse_backend(name: str):
+    """'flat-float16' -> ('flat', 'float16', 'exact'); 'flat-float32-hnsw' -> ('flat', 'float32', 'hnsw'); 'chroma' -> ('chroma', None, None)."""
+    backend, _, rest = name.partition("-")
+    dtype, _, index_mode = rest.partition("-")
+    return backend, dtype or None, index_mode or ("exact" if backend == "flat" else None)
+
+
+def open_store(backend: str, dtype: str, directory: str, index_mode: str = None):
+    if backend == "flat":
+        from flat_index import FlatVectorStore
+        return FlatVectorStore(directory, "bench_vectors", dtype=dtype or "float32", index_mode=index_mode or "exact")
+    from vector_backends import open_vector_store
+    return open_vector_store(None, "bench_vectors", directory, backend=backend)
+
+
+def build(backend: str, dtype: str, index_mode: str, directory: str, vectors: np.ndarray, metadatas: list) -> float:
+    store = open_store(backend, dtype, directory, index_mode)
+    collection = store._collection
+    start = time.perf_counter()
+    for offset in range(0, len(vectors), WRITE_BATCH):
+        end = offset + WRITE_BATCH
+        collection.upsert(ids=[f"chunk:{i}" for i in range(offset, min(end, len(vectors)))],
+                          embeddings=vectors[offset:end].tolist(),
+                          documents=[f"Synthetic chunk {i}" for i in range(offset, min(end, len(vectors)))],
+                          metadatas=metadatas[offset:end])
+    if hasattr(store, "flush"):
+        store.flush() # Saves the flat backend's index with every row
+    return time.perf_counter() - start
+
+
+def percentile(values: list, q: float) -> float:
+    return round(float(np.percentile(values, q)) * 1000, 3) if values else None
+
+
+def run_child(args):
+    """Opens the store in this fresh process, runs the queries and prints one JSON line."""
+    start = time.perf_counter()
+    backend, dtype, index_mode = parse_backend(args.backend)
+    collection = open_store(backend, dtype, args.dir, index_mode)._collection
+    count = collection.count()
+    startup_seconds = time.perf_counter() - start
+    rss_after_open = rss_mb()
+
+    queries = np.load(args.queries_path)
+    include = ["metadatas", "documents"]
+    collection.query(query_embeddings=queries[:1].tolist(), n_results=args.k, include=include) # Warm-up
+
+    single, filtered, results = [], [], []
+    for query in queries:
+        t = time.perf_counter()
+        result = collection.query(query_embeddings=[query.tolist()], n_results=args.k, include=include)
+        single.append(time.perf_counter() - t)
+        results.append(result["ids"][0])
+    rss_after_single = rss_mb() # Before the filtered searches, which also load every chunk's metadata
+    for i, query in enumerate(queries):
+        t = time.perf_counter()
+        collection.query(query_embeddings=[query.tolist()], n_results=args.k, include=include,
+                         where={f"cat_{CATEGORIES[i % len(CATEGORIES)]}": True})
+        filtered.append(time.perf_counter() - t)
+
+    batched = []
+    for offset in range(0, len(queries), args.batch):
+        batch = queries[offset:offset + args.batch]
+        t = time.perf_counter()
+        collection.query(query_embeddings=batch.tolist(), n_results=args.k, include=include)
+        batched.append((time.perf_counter() - t) / len(batch))
+
+    print(json.dumps({
+        "count": count,
+        "startup_seconds": round(startup_seconds, 4),
+        "rss_after_open_mb": rss_after_open,
+        "rss_after_single_queries_mb": rss_after_single,
+        "rss_after_queries_mb": rss_mb(),
+        "query_p50_ms": percentile(single, 50),
+        "query_p95_ms": percentile(single, 95),
+        "filtered_query_p50_ms": percentile(filtered, 50),
+        "filtered_query_p95_ms": percentile(filtered, 95),
+        "batched_query_mean_ms": round(float(np.mean(batched)) * 1000, 3),
+        "result_ids": results,
+    }))
+
+
+def recall_at_k(result_ids: list, exact_ids: list) -> float:
+    hits = sum(len(set(found) & set(expected)) for found, expected in zip(result_ids, exact_ids))
+    return round(hits / sum(len(expected) for expected in exact_ids), 4)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark vector store backends")
+    parser.add_argument("--count", type=int, default=50000, help="Vectors in the collection")
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--batch", type=int, default=32, help="Queries per call in the batched run")
+    parser.add_argument("--seed", type=int, default=2024)
+    parser.add_argument("--backends", default="flat-float16,flat-float32,chroma")
+    parser.add_argument("--output", default=None, help="Write the JSON report here")
+    # Internal: run as the measuring child process
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--backend", help=argparse.SUPPRESS)
+    parser.add_argument("--dir", help=argparse.SUPPRESS)
+    parser.add_argument("--queries-path", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args)
+        sys.exit(0)
+
+    vectors = synthetic_vectors(args.count + args.queries, args.dim, args.seed)
+    vectors, queries = vectors[:args.count], vectors[args.count:]
+    metadatas = synthetic_metadata(args.count, args.seed)
+    # Exact top-k by cosine similarity, the reference for recall
+    exact_ids = [[f"chunk:{i}" for i in np.argsort(-scores)[:args.k]] for scores in queries @ vectors.T]
+    print(f"{args.count} vectors x {args.dim} dims, {args.queries} queries, k={args.k}")
+
+    work_dir = tempfile.mkdtemp(prefix="mezan_vector_bench_")
+    report = {"count": args.count, "dim": args.dim, "queries": args.queries, "k": args.k, "batch": args.batch, "backends": {}}
+    try:
+        queries_path = os.path.join(work_dir, "queries.npy")
+        np.save(queries_path, queries)
+        for name in args.backends.split(","):
+            backend, dtype, index_mode = parse_backend(name)
+            if backend == "chroma":
+                try:
+                    import chromadb # noqa: F401
+                except ImportError:
+                    print(f"Skipping {name}: chromadb is not installed.")
+                    continue
+            directory = os.path.join(work_dir, name)
+            build_seconds = build(backend, dtype, index_mode, directory, vectors, metadatas)
+            child = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", "--backend", name, "--dir", directory,
+                                    "--queries-path", queries_path, "--k", str(args.k), "--batch", str(args.batch)],
+                                   capture_output=True, text=True)
+            if child.returncode != 0:
+                print(f"{name} failed:\n{child.stderr}")
+                continue
+            result = json.loads(child.stdout.strip().splitlines()[-1])
+            result["recall_at_k"] = recall_at_k(result.pop("result_ids"), exact_ids)
+            result["build_seconds"] = round(build_seconds, 3)
+            result["disk_mb"] = round(sum(os.path.getsize(os.path.join(root, f)) for root, _, files in os.walk(directory)
+                                          for f in files) / 1e6, 1)
+            report["backends"][name] = result
+            print(f"{name}: {json.dumps(result)}")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
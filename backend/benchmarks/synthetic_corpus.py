@@ -0,0 +1,152 @@
+# backend/benchmarks/synthetic_corpus.py
+#
+# Generates a reproducible corpus of synthetic bilingual (French/Arabic) Official-Journal-like PDFs:
+# a masthead on every page, numbered decrees and articles ("Art. N" / "المادة N"), legal boilerplate
+# and random law numbers, so extraction, cleaning, chunking, dedup and embedding see realistic text.
+# The same (count, pages, seed, font) always produces the same files.
+#
+# Arabic needs a TrueType font with Arabic glyphs (--font, or one of FONT_CANDIDATES); without one
+# the corpus is French-only and the run's metadata says so.
+#
+# Usage:
+#   python backend/benchmarks/synthetic_corpus.py --output /tmp/joradp_synth --count 50 --pages 24 [--font Amiri-Regular.ttf]
+
+import os
+import json
+import random
+import argparse
+
+# Fonts commonly available on Linux/macOS/Windows that cover Arabic
+FONT_CANDIDATES = [
+    "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",
+    "/usr/share/fonts/dejavu/DejaVuSans.ttf",
+    "/usr/share/fonts/truetype/noto/NotoNaskhArabic-Regular.ttf",
+    "/usr/share/fonts/opentype/fonts-hosny-amiri/Amiri-Regular.ttf",
+    "/Library/Fonts/Arial Unicode.ttf",
+    "C:\\Windows\\Fonts\\arial.ttf",
+]
+
+MASTHEAD_FR = "JOURNAL OFFICIEL DE LA REPUBLIQUE ALGERIENNE DEMOCRATIQUE ET POPULAIRE N° {issue} {date}"
+MASTHEAD_AR = "الجريدة الرسمية للجمهورية الجزائرية الديمقراطية الشعبية العدد {issue}"
+
+FR_SUBJECTS = ["Le ministre de la justice", "Le wali", "Le président de l'assemblée populaire communale",
+               "L'administration fiscale", "Le tribunal compétent", "L'employeur", "Le conseil d'administration"]
+FR_VERBS = ["est chargé de", "fixe les modalités de", "veille à", "procède à", "peut ordonner", "est tenu de notifier"]
+FR_OBJECTS = ["l'application du présent décret", "la publication des actes au Journal officiel",
+              "la gestion des biens de la commune", "la déclaration des revenus", "la conclusion du contrat de travail",
+              "l'exécution des décisions de justice", "la protection des données à caractère personnel"]
+FR_CLAUSES = ["conformément aux dispositions de la loi n° {law}", "dans un délai de {days} jours",
+              "sous peine des sanctions prévues par le code pénal", "après avis du conseil de l'État",
+              "selon des modalités fixées par voie réglementaire"]
+
+AR_SUBJECTS = ["وزير العدل", "الوالي", "رئيس المجلس الشعبي البلدي", "إدارة الضرائب", "المحكمة المختصة", "المستخدم"]
+AR_VERBS = ["يكلف ب", "يحدد كيفيات", "يسهر على", "يقوم ب", "يمكن أن يأمر ب"]
+AR_OBJECTS = ["تطبيق هذا المرسوم", "نشر العقود في الجريدة الرسمية", "تسيير أملاك البلدية", "التصريح بالمداخيل",
+              "إبرام عقد العمل", "تنفيذ الأحكام القضائية"]
+AR_CLAUSES = ["طبقا لأحكام القانون رقم {law}", "في أجل {days} يوما", "تحت طائلة العقوبات المنصوص عليها في قانون العقوبات",
+              "بعد رأي مجلس الدولة"]
+
+
+def find_arabic_font(font_path: str = None):
+    if font_path:
+        return font_path
+    return next((path for path in FONT_CANDIDATES if os.path.exists(path)), None)
+
+
+def _law_number(rng: random.Random) -> str:
+    return f"{rng.randint(84, 99)}-{rng.randint(1, 30):02d}"
+
+
+def _sentence(rng: random.Random, subjects, verbs, objects, clauses) -> str:
+    clause = rng.choice(clauses).format(law=_law_number(rng), days=rng.choice([8, 15, 30, 60, 90]))
+    return f"{rng.choice(subjects)} {rng.choice(verbs)} {rng.choice(objects)}, {clause}."
+
+
+def generate_page(rng: random.Random, issue: int, date: str, article_start: int, arabic: bool, target_chars: int):
+    """Returns (lines, next_article_number) for one page of roughly target_chars characters."""
+    lines = [MASTHEAD_FR.format(issue=issue, date=date)]
+    if arabic:
+        lines.append(MASTHEAD_AR.format(issue=issue))
+    size = sum(len(line) for line in lines)
+    article = article_start
+    while size < target_chars:
+        if rng.random() < 0.25:
+            heading = f"Décret exécutif n° {_law_number(rng)} du {rng.randint(1, 28)} mars 2024 fixant les conditions d'application."
+            lines.append(heading)
+            size += len(heading)
+        french = f"Art. {article}. — " + " ".join(_sentence(rng, FR_SUBJECTS, FR_VERBS, FR_OBJECTS, FR_CLAUSES)
+                                                  for _ in range(rng.randint(1, 4)))
+        lines.append(french)
+        size += len(french)
+        if arabic:
+            arabic_text = f"المادة {article}: " + " ".join(_sentence(rng, AR_SUBJECTS, AR_VERBS, AR_OBJECTS, AR_CLAUSES)
+                                                         for _ in range(rng.randint(1, 3)))
+            lines.append(arabic_text)
+            size += len(arabic_text)
+        article += 1
+    return lines, article
+
+
+def generate_corpus(output_dir: str, count: int = 20, pages: int = 16, chars_per_page: int = 3000,
+                    seed: int = 2024, font_path: str = None) -> dict:
+    """
+    Writes `count` PDFs of `pages` pages to output_dir (skipped if an identical corpus is already there)
+    and returns its description: file list, sizes, and whether Arabic text is included.
+    """
+    from fpdf import FPDF # Benchmark-only dependency (fpdf2)
+
+    font_path = find_arabic_font(font_path)
+    spec = {"count": count, "pages": pages, "chars_per_page": chars_per_page, "seed": seed,
+            "arabic": font_path is not None, "font": os.path.basename(font_path) if font_path else None}
+    spec_path = os.path.join(output_dir, "corpus.json")
+    if os.path.exists(spec_path):
+        with open(spec_path, encoding='utf-8') as f:
+            existing = json.load(f)
+        if existing.get("spec") == spec:
+            return existing
+
+    os.makedirs(output_dir, exist_ok=True)
+    if not font_path:
+        print("No Arabic-capable font found (pass --font); generating a French-only corpus.")
+    files = []
+    for n in range(count):
+        rng = random.Random(seed * 100_003 + n)
+        pdf = FPDF()
+        pdf.set_auto_page_break(auto=True, margin=12)
+        if font_path:
+            pdf.add_font("corpus", "", font_path)
+            pdf.set_font("corpus", size=9)
+        else:
+            pdf.set_font("Helvetica", size=9)
+        article = 1
+        date = f"{rng.randint(1, 28)} janvier 2024"
+        for _ in range(pages):
+            lines, article = generate_page(rng, issue=n + 1, date=date, article_start=article,
+                                           arabic=font_path is not None, target_chars=chars_per_page)
+            pdf.add_page()
+            for line in lines:
+                if not font_path:
+                    line = line.encode("latin-1", "replace").decode("latin-1") # Core fonts are Latin-1 only
+                pdf.multi_cell(0, 4, line, new_x="LMARGIN", new_y="NEXT")
+        filename = f"synthetic_joradp_{n + 1:04d}.pdf"
+        pdf.output(os.path.join(output_dir, filename))
+        files.append({"filename": filename, "size": os.path.getsize(os.path.join(output_dir, filename))})
+
+    description = {"spec": spec, "files": files, "total_bytes": sum(f["size"] for f in files)}
+    with open(spec_path, 'w', encoding='utf-8') as f:
+        json.dump(description, f, indent=2)
+    return description
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic bilingual Official Journal PDF corpus")
+    parser.add_argument("--output", required=True)
+    parser.add_argument("--count", type=int, default=20)
+    parser.add_argument("--pages", type=int, default=16)
+    parser.add_argument("--chars-per-page", type=int, default=3000)
+    parser.add_argument("--seed", type=int, default=2024)
+    parser.add_argument("--font", default=None, help="TTF font with Arabic glyphs")
+    args = parser.parse_args()
+    corpus = generate_corpus(args.output, args.count, args.pages, args.chars_per_page, args.seed, args.font)
+    print(f"Corpus ready in {args.output}: {len(corpus['files'])} PDFs, {corpus['total_bytes'] / 1e6:.1f} MB, "
+          f"Arabic: {corpus['spec']['arabic']}")
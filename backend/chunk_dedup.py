@@ -0,0 +1,248 @@
+# backend/chunk_dedup.py
+
+import re
+import sqlite3
+import hashlib
+import threading
+import unicodedata
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+
+# MinHash / LSH parameters: 64 permutations split into 8 bands of 8 rows. A pair becomes an LSH
+# candidate with ~50% probability around Jaccard 0.77, and candidates are then confirmed against
+# the full signature with the configured threshold.
+NUM_PERM = 64
+NUM_BANDS = 8
+ROWS_PER_BAND = NUM_PERM // NUM_BANDS
+SHINGLE_SIZE = 5 # words
+DEFAULT_THRESHOLD = 0.85
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+# Fixed seed: signatures are persisted, so the permutations must be identical across runs
+_rng = np.random.RandomState(20250615)
+_PERM_A = _rng.randint(1, 1 << 32, size=NUM_PERM, dtype=np.uint64)
+_PERM_B = _rng.randint(0, 1 << 32, size=NUM_PERM, dtype=np.uint64)
+
+_NON_WORD_RE = re.compile(r"[^\w]+", re.UNICODE)
+
+
+def normalize_for_dedup(text: str) -> str:
+    """Lowercase, NFKC and punctuation/whitespace folding, so layout noise doesn't defeat matching."""
+    return _NON_WORD_RE.sub(" ", unicodedata.normalize("NFKC", text).lower()).strip()
+
+
+def minhash_signature(normalized_text: str) -> np.ndarray:
+    """64-value MinHash signature over word 5-shingles (the whole text if it is shorter than one shingle)."""
+    words = normalized_text.split()
+    if len(words) <= SHINGLE_SIZE:
+        shingles = {" ".join(words)}
+    else:
+        shingles = {" ".join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)}
+
+    # 32-bit shingle hashes keep a*x+b inside uint64 before the modulo
+    hashes = np.fromiter(
+        (int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=4).digest(), "little") for s in shingles),
+        dtype=np.uint64, count=len(shingles),
+    )
+    permuted = (hashes[:, None] * _PERM_A[None, :] + _PERM_B[None, :]) % _MERSENNE_PRIME
+    return permuted.min(axis=0)
+
+
+def _band_hashes(signature: np.ndarray) -> List[str]:
+    return [hashlib.blake2b(signature[b * ROWS_PER_BAND:(b + 1) * ROWS_PER_BAND].tobytes(), digest_size=8).hexdigest()
+            for b in range(NUM_BANDS)]
+
+
+class ChunkDeduplicator:
+    """
+    Near-duplicate chunk index (exact hash + MinHash/LSH) persisted in SQLite.
+
+    Every chunk is registered as a reference. The first occurrence of a text becomes the cluster's
+    canonical chunk and is the only one embedded and stored; later exact or near duplicates (Journal
+    mastheads, tables of contents, decree preambles, signature blocks...) only add a reference row,
+    so the reference list of each cluster points back to every source file it appeared in.
+    The tables live in the manifest's SQLite file, next to the rest of the ingestion bookkeeping.
+    """
+
+    def __init__(self, db_path: str, threshold: float = DEFAULT_THRESHOLD):
+        self.threshold = threshold
+        self.chunks_seen = 0
+        self.exact_duplicates = 0
+        self.near_duplicates = 0
+        # Own connection: the embed stage registers chunks while the write stage commits files. Both
+        # stages share it, so transactions are serialized by the lock
+        self._lock = threading.RLock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS dedup_clusters (
+                canonical_id TEXT PRIMARY KEY,
+                exact_hash   TEXT NOT NULL,
+                signature    BLOB NOT NULL,
+                owner_source TEXT NOT NULL,
+                owner_hash   TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS dedup_clusters_exact ON dedup_clusters(exact_hash);
+            CREATE INDEX IF NOT EXISTS dedup_clusters_owner ON dedup_clusters(owner_source, owner_hash);
+            CREATE TABLE IF NOT EXISTS dedup_bands (
+                band         INTEGER NOT NULL,
+                band_hash    TEXT NOT NULL,
+                canonical_id TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS dedup_bands_lookup ON dedup_bands(band, band_hash);
+            CREATE INDEX IF NOT EXISTS dedup_bands_cluster ON dedup_bands(canonical_id);
+            CREATE TABLE IF NOT EXISTS dedup_refs (
+                canonical_id TEXT NOT NULL,
+                source       TEXT NOT NULL,
+                file_hash    TEXT NOT NULL,
+                chunk_num    INTEGER NOT NULL,
+                page         INTEGER
+            );
+            CREATE INDEX IF NOT EXISTS dedup_refs_file ON dedup_refs(source, file_hash);
+            CREATE INDEX IF NOT EXISTS dedup_refs_cluster ON dedup_refs(canonical_id);
+        """)
+        self.conn.commit()
+
+    def register_many(self, chunks: List[tuple]) -> List[Optional[str]]:
+        """
+        Records chunk occurrences given as (chunk_id, text, source, file_hash, chunk_num, page) tuples.
+        For each one returns None if it starts a new cluster (store it), or the canonical chunk ID it
+        duplicates (skip it). One transaction per call keeps lookups and inserts atomic with respect
+        to release_file, and duplicates within the same call are detected too.
+        """
+        prepared = []
+        for chunk_id, text, source, file_hash, chunk_num, page in chunks:
+            normalized = normalize_for_dedup(text)
+            signature = minhash_signature(normalized)
+            prepared.append((chunk_id, source, file_hash, chunk_num, page,
+                             hashlib.sha1(normalized.encode("utf-8")).hexdigest(), signature, _band_hashes(signature)))
+
+        results = []
+        with self._lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                for chunk_id, source, file_hash, chunk_num, page, exact_hash, signature, bands in prepared:
+                    self.chunks_seen += 1
+                    row = self.conn.execute("SELECT canonical_id FROM dedup_clusters WHERE exact_hash = ? LIMIT 1", (exact_hash,)).fetchone()
+                    if row:
+                        canonical_id = row[0]
+                        self.exact_duplicates += 1
+                    else:
+                        canonical_id = self._find_near_duplicate(signature, bands)
+                        if canonical_id:
+                            self.near_duplicates += 1
+
+                    if canonical_id is None:
+                        self.conn.execute(
+                            "INSERT OR REPLACE INTO dedup_clusters (canonical_id, exact_hash, signature, owner_source, owner_hash) VALUES (?, ?, ?, ?, ?)",
+                            (chunk_id, exact_hash, signature.tobytes(), source, file_hash))
+                        self.conn.execute("DELETE FROM dedup_bands WHERE canonical_id = ?", (chunk_id,))
+                        self.conn.executemany("INSERT INTO dedup_bands (band, band_hash, canonical_id) VALUES (?, ?, ?)",
+                                              [(b, band_hash, chunk_id) for b, band_hash in enumerate(bands)])
+
+                    self.conn.execute("INSERT INTO dedup_refs (canonical_id, source, file_hash, chunk_num, page) VALUES (?, ?, ?, ?, ?)",
+                                      (canonical_id or chunk_id, source, file_hash, chunk_num, page))
+                    results.append(canonical_id)
+                self.conn.commit()
+                return results
+            except Exception:
+                self.conn.rollback()
+                raise
+
+    def _find_near_duplicate(self, signature: np.ndarray, bands: List[str]) -> Optional[str]:
+        clauses = " OR ".join("(band = ? AND band_hash = ?)" for _ in bands)
+        params = [value for b, band_hash in enumerate(bands) for value in (b, band_hash)]
+        candidates = {row[0] for row in self.conn.execute(f"SELECT canonical_id FROM dedup_bands WHERE {clauses}", params)}
+
+        best_id, best_similarity = None, self.threshold
+        for candidate_id in candidates:
+            row = self.conn.execute("SELECT signature FROM dedup_clusters WHERE canonical_id = ?", (candidate_id,)).fetchone()
+            if not row:
+                continue
+            # Fraction of agreeing MinHash values estimates the Jaccard similarity of the shingle sets
+            similarity = float(np.mean(np.frombuffer(row[0], dtype=np.uint64) == signature))
+            if similarity >= best_similarity:
+                best_id, best_similarity = candidate_id, similarity
+        return best_id
+
+    def references(self, canonical_id: str) -> List[dict]:
+        """Every (source, chunk_num) occurrence folded into this cluster, canonical included."""
+        with self._lock:
+            rows = self.conn.execute("SELECT source, file_hash, chunk_num, page FROM dedup_refs WHERE canonical_id = ? ORDER BY source, chunk_num",
+                                     (canonical_id,)).fetchall()
+        return [{"source": source, "file_hash": file_hash, "chunk_num": chunk_num, "page": page}
+                for source, file_hash, chunk_num, page in rows]
+
+    def release_file(self, source: str, file_hash: str) -> Tuple[Dict[str, dict], List[str]]:
+        """
+        Drops all references of one file version. Clusters it owned that are still referenced by
+        other files are handed to one of them and their vector is kept; the others are dropped.
+        Returns (retained, dropped): the retained canonical chunk IDs mapped to the new owner's
+        {"source", "chunk_num", "page"} so the stored vector's metadata can be pointed at it, and the
+        dropped canonical chunk IDs, whose vectors must be deleted. A cluster this file inherited from
+        another one keeps that file's chunk ID, so the dropped IDs aren't all among this file's own.
+        """
+        with self._lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                self.conn.execute("DELETE FROM dedup_refs WHERE source = ? AND file_hash = ?", (source, file_hash))
+                owned = [row[0] for row in self.conn.execute(
+                    "SELECT canonical_id FROM dedup_clusters WHERE owner_source = ? AND owner_hash = ?", (source, file_hash))]
+
+                retained, dropped = {}, []
+                for canonical_id in owned:
+                    heir = self.conn.execute("SELECT source, file_hash, chunk_num, page FROM dedup_refs WHERE canonical_id = ? LIMIT 1",
+                                             (canonical_id,)).fetchone()
+                    if heir:
+                        self.conn.execute("UPDATE dedup_clusters SET owner_source = ?, owner_hash = ? WHERE canonical_id = ?",
+                                          (heir[0], heir[1], canonical_id))
+                        retained[canonical_id] = {"source": heir[0], "chunk_num": heir[2], "page": heir[3]}
+                    else:
+                        self.conn.execute("DELETE FROM dedup_clusters WHERE canonical_id = ?", (canonical_id,))
+                        self.conn.execute("DELETE FROM dedup_bands WHERE canonical_id = ?", (canonical_id,))
+                        dropped.append(canonical_id)
+                self.conn.commit()
+                return retained, dropped
+            except Exception:
+                self.conn.rollback()
+                raise
+
+    def rollback_chunks(self, source: str, file_hash: str, from_chunk_num: int) -> int:
+        """
+        Undoes the registrations of one file version from chunk from_chunk_num on, for a file resumed
+        after an interrupted run: those chunks will be registered again. Clusters started by these chunks
+        are dropped (their vector may never have been written); references other files made to them are
+        kept and reattach when the same chunk re-registers under the same canonical ID.
+        Returns the number of references rolled back.
+        """
+        with self._lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                # Chunks that started their own cluster: the canonical ID is the chunk's own (make_chunk_id's format)
+                started = [row[0] for row in self.conn.execute(
+                    "SELECT canonical_id FROM dedup_refs WHERE source = ? AND file_hash = ? AND chunk_num >= ? "
+                    "AND canonical_id = source || ':' || file_hash || ':' || chunk_num", (source, file_hash, from_chunk_num))]
+                self.conn.executemany("DELETE FROM dedup_clusters WHERE canonical_id = ?", [(c,) for c in started])
+                self.conn.executemany("DELETE FROM dedup_bands WHERE canonical_id = ?", [(c,) for c in started])
+                removed = self.conn.execute("DELETE FROM dedup_refs WHERE source = ? AND file_hash = ? AND chunk_num >= ?",
+                                            (source, file_hash, from_chunk_num)).rowcount
+                self.conn.commit()
+                return removed
+            except Exception:
+                self.conn.rollback()
+                raise
+
+    def stats(self) -> dict:
+        duplicates = self.exact_duplicates + self.near_duplicates
+        return {
+            "chunks_seen": self.chunks_seen,
+            "chunks_stored": self.chunks_seen - duplicates,
+            "exact_duplicates": self.exact_duplicates,
+            "near_duplicates": self.near_duplicates,
+            "index_reduction": (duplicates / self.chunks_seen) if self.chunks_seen else 0.0,
+        }
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,157 @@
+# backend/context_packer.py
+
+import os
+import re
+import math
+from typing import List, Tuple
+
+from chunk_dedup import normalize_for_dedup, SHINGLE_SIZE # Same text folding and shingles as ingestion-time dedup
+
+
+# --- Configuration ---
+# Estimated tokens of retrieved text sent to Gemini per question. Passages are added best-ranked
+# first; the one that crosses the budget is cut at a line or sentence boundary.
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", 1500))
+# A passage whose word shingles are at least this share contained in a better-ranked passage is
+# dropped (the same article republished in another Journal issue, a chunk already inside a merge)
+CONTEXT_DUPLICATE_THRESHOLD = float(os.getenv("CONTEXT_DUPLICATE_THRESHOLD", 0.8))
+# Consecutive chunks share up to CHUNK_OVERLAP (150) characters; longer overlaps are looked for in
+# case the chunking settings change, shorter matches are treated as coincidence
+MAX_OVERLAP_CHARS = 400
+MIN_OVERLAP_CHARS = 20
+# A passage is only cut down to fit when at least this many tokens of budget remain
+MIN_PARTIAL_TOKENS = 80
+
+NO_CONTEXT_TEXT = "No relevant context snippets were retrieved."
+
+
+# --- Token estimate ---
+# Gemini's tokenizer isn't available offline (count_tokens is an API call). SentencePiece
+# vocabularies average about 4 characters per token on French words and about 2.5 on Arabic ones,
+# and punctuation marks are tokens of their own; good enough to budget, not to bill.
+LATIN_CHARS_PER_TOKEN = 4.0
+ARABIC_CHARS_PER_TOKEN = 2.5
+_WORD_RE = re.compile(r"\w+|[^\w\s]")
+_ARABIC_RE = re.compile(r"[\u0600-\u06FF]")
+_CUT_RE = re.compile(r"\n|(?<=[.;:؛!?])\s")
+
+
+def estimate_tokens(text: str) -> int:
+    """Approximate Gemini token count of text."""
+    tokens = 0
+    for match in _WORD_RE.finditer(text):
+        word = match.group()
+        tokens += max(1, math.ceil(len(word) / (ARABIC_CHARS_PER_TOKEN if _ARABIC_RE.match(word) else LATIN_CHARS_PER_TOKEN)))
+    return tokens
+
+
+# --- Packing ---
+def _merge_text(first: str, second: str) -> str:
+    """Joins a chunk and the one after it, keeping the text they share (the splitter's overlap) once."""
+    for size in range(min(len(first), len(second), MAX_OVERLAP_CHARS), MIN_OVERLAP_CHARS - 1, -1):
+        if first.endswith(second[:size]):
+            return first + second[size:]
+    return f"{first}\n{second}"
+
+
+def _merge_neighbours(docs: list) -> List[dict]:
+    """
+    Passages {"source", "chunks", "pages", "text", "rank"}: runs of consecutive chunk_nums of the
+    same source merged in document order, ranked by their best chunk.
+    """
+    by_source = {}
+    for rank, doc in enumerate(docs):
+        by_source.setdefault(doc.metadata.get("source"), []).append((rank, doc))
+    passages = []
+    for source, ranked in by_source.items():
+        ranked.sort(key=lambda item: (item[1].metadata.get("chunk_num") is None, item[1].metadata.get("chunk_num") or 0))
+        current = None
+        for rank, doc in ranked:
+            chunk_num, page = doc.metadata.get("chunk_num"), doc.metadata.get("page")
+            if current is not None and chunk_num is not None and current["chunks"][-1] is not None \
+                    and chunk_num - current["chunks"][-1] in (0, 1):
+                if chunk_num != current["chunks"][-1]: # The same chunk retrieved twice is kept once
+                    current["text"] = _merge_text(current["text"], doc.page_content)
+                    current["chunks"].append(chunk_num)
+                current["rank"] = min(current["rank"], rank)
+            else:
+                current = {"source": source, "chunks": [chunk_num], "pages": [], "text": doc.page_content, "rank": rank}
+                passages.append(current)
+            if page is not None and page not in current["pages"]:
+                current["pages"].append(page)
+    return sorted(passages, key=lambda passage: passage["rank"])
+
+
+def _shingles(text: str) -> set:
+    words = normalize_for_dedup(text).split()
+    if len(words) <= SHINGLE_SIZE:
+        return {" ".join(words)}
+    return {" ".join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)}
+
+
+def _drop_duplicates(passages: List[dict], threshold: float) -> Tuple[List[dict], int]:
+    kept, kept_shingles = [], []
+    for passage in passages:
+        shingles = _shingles(passage["text"])
+        if any(len(shingles & other) >= threshold * len(shingles) for other in kept_shingles):
+            continue
+        kept.append(passage)
+        kept_shingles.append(shingles)
+    return kept, len(passages) - len(kept)
+
+
+def _header(number: int, passage: dict) -> str:
+    pages = sorted(passage["pages"])
+    where = "" if not pages else f", p. {pages[0]}" if len(pages) == 1 else f", pp. {pages[0]}-{pages[-1]}"
+    return f"--- [{number}] {passage['source'] or 'JORADP'}{where} ---"
+
+
+def _truncate(text: str, max_tokens: int) -> str:
+    """Longest prefix of text ending at a line or sentence boundary that fits in max_tokens (with the ' [...]' marker)."""
+    cuts = [match.start() for match in _CUT_RE.finditer(text)]
+    low, high, best = 0, len(cuts) - 1, ""
+    while low <= high: # Estimates grow with the prefix, so binary search the boundaries
+        middle = (low + high) // 2
+        candidate = text[:cuts[middle]].rstrip() + " [...]"
+        if estimate_tokens(candidate) <= max_tokens:
+            best, low = candidate, middle + 1
+        else:
+            high = middle - 1
+    return best
+
+
+def pack_context(docs: list, budget: int = CONTEXT_TOKEN_BUDGET,
+                 duplicate_threshold: float = CONTEXT_DUPLICATE_THRESHOLD) -> Tuple[str, dict]:
+    """
+    Prompt context from retrieved chunks (Documents, best first):
+    1. Chunks of the same source with consecutive chunk_nums are merged in document order, their
+       overlapping text kept once, under a single header.
+    2. Passages mostly contained in a better-ranked one are dropped.
+    3. Passages are added best-ranked first while they fit in the token budget; the first one that
+       doesn't fit is cut at a line or sentence boundary if enough budget remains, else skipped.
+    Returns (context text, stats).
+    """
+    passages = _merge_neighbours(docs)
+    merged = len(docs) - len(passages)
+    passages, duplicates = _drop_duplicates(passages, duplicate_threshold)
+
+    parts, used, truncated, over_budget = [], 0, 0, 0
+    for passage in passages:
+        header = _header(len(parts) + 1, passage)
+        tokens = estimate_tokens(header) + estimate_tokens(passage["text"])
+        if used + tokens <= budget:
+            parts.append(f"{header}\n{passage['text']}")
+            used += tokens
+            continue
+        remaining = budget - used - estimate_tokens(header)
+        text = _truncate(passage["text"], remaining) if remaining >= MIN_PARTIAL_TOKENS else ""
+        if text:
+            parts.append(f"{header}\n{text}")
+            used += estimate_tokens(header) + estimate_tokens(text)
+            truncated += 1
+        else:
+            over_budget += 1
+
+    context = "\n\n".join(parts) if parts else NO_CONTEXT_TEXT
+    return context, {"chunks": len(docs), "passages": len(parts), "merged": merged, "duplicates": duplicates,
+                     "truncated": truncated, "over_budget": over_budget, "tokens": estimate_tokens(context)}
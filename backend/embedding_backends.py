@@ -0,0 +1,70 @@
+# backend/embedding_backends.py
+
+import os
+import re
+
+from langchain_community.embeddings import HuggingFaceEmbeddings
+
+from embedding_cache import EmbeddingCache, CachedEmbeddings
+
+
+# --- Configuration ---
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__)) # Directory of embedding_backends.py
+PROJECT_ROOT = os.path.abspath(os.path.join(CURRENT_DIR, '..')) # mezan directory (up one level)
+
+# Which runtime computes embeddings:
+#   "torch"     - full-precision PyTorch via HuggingFaceEmbeddings (default)
+#   "onnx-int8" - the same model exported to ONNX Runtime with dynamic int8 quantization
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch")
+ONNX_MODELS_DIR = os.getenv("ONNX_MODELS_DIR", os.path.join(PROJECT_ROOT, 'data', 'models'))
+
+# Persistent embedding cache shared by ingestion and the RAG service
+EMBEDDING_CACHE_DIR = os.getenv("EMBEDDING_CACHE_DIR", os.path.join(PROJECT_ROOT, 'data', 'embedding_cache'))
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", 200_000))
+EMBEDDING_CACHE_ENABLED = os.getenv("EMBEDDING_CACHE_ENABLED", "1") == "1"
+
+EMBEDDING_BACKENDS = ("torch", "onnx-int8")
+
+
+def onnx_model_dir(model_name: str) -> str:
+    """Where the int8 ONNX export of a model lives (exported on first use if missing)."""
+    return os.path.join(ONNX_MODELS_DIR, re.sub(r"[^A-Za-z0-9_.-]+", "_", model_name) + "-onnx-int8")
+
+
+def create_base_embedding_model(model_name: str, backend: str = EMBEDDING_BACKEND):
+    """Builds the uncached embedding model for the selected backend."""
+    if backend == "torch":
+        # model_kwargs={'device': 'cpu'} ensures it runs on CPU even if GPU is available
+        return HuggingFaceEmbeddings(model_name=model_name, model_kwargs={'device': 'cpu'})
+
+    if backend == "onnx-int8":
+        # Imported lazily: onnxruntime is only needed when this backend is selected
+        from onnx_embeddings import OnnxEmbeddings, export_onnx_model, ONNX_CONFIG_FILENAME
+        model_dir = onnx_model_dir(model_name)
+        # The config is written last, so a directory without it is an unfinished export
+        if not os.path.exists(os.path.join(model_dir, ONNX_CONFIG_FILENAME)):
+            export_onnx_model(model_name, model_dir, quantize=True)
+        return OnnxEmbeddings(model_dir)
+
+    raise ValueError(f"Unknown EMBEDDING_BACKEND '{backend}'. Expected one of: {', '.join(EMBEDDING_BACKENDS)}")
+
+
+def create_embedding_model(model_name: str, backend: str = EMBEDDING_BACKEND):
+    """
+    Builds the embedding model used by both ingestion.py and rag_service.py.
+    The two must produce identical vectors, so they share this single construction path.
+    """
+    embeddings = create_base_embedding_model(model_name, backend)
+    print(f"Embedding backend: {backend}")
+
+    if EMBEDDING_CACHE_ENABLED:
+        try:
+            # Backends agree closely but not bit-for-bit, so each gets its own cache namespace
+            cache_name = model_name if backend == "torch" else f"{model_name}@{backend}"
+            cache = EmbeddingCache(EMBEDDING_CACHE_DIR, cache_name, max_entries=EMBEDDING_CACHE_MAX_ENTRIES)
+            print(f"Embedding cache enabled at {cache.cache_dir} ({cache.stats()['entries']} entries).")
+            return CachedEmbeddings(embeddings, cache)
+        except Exception as e:
+            # The cache is an optimization; fall back to the bare model rather than failing startup
+            print(f"Error opening embedding cache, continuing without it: {e}")
+    return embeddings
@@ -0,0 +1,236 @@
+# backend/embedding_cache.py
+
+import os
+import re
+import time
+import sqlite3
+import hashlib
+import threading
+import unicodedata
+from typing import List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+
+# Collapses any whitespace run so re-extracted chunks that differ only in spacing share a cache entry
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def normalize_for_cache(text: str) -> str:
+    """Normalization applied before hashing: Unicode NFC plus whitespace collapsing."""
+    return _WHITESPACE_RE.sub(" ", unicodedata.normalize("NFC", text)).strip()
+
+
+def make_cache_key(model_name: str, text: str) -> str:
+    """Cache key for (embedding model name, normalized chunk text)."""
+    return hashlib.sha256(f"{model_name}\0{normalize_for_cache(text)}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    On-disk embedding cache for one embedding model.
+
+    Vectors live in a fixed-capacity float32 matrix memory-mapped from `vectors.f32`; a SQLite index
+    maps each cache key to its row (slot) and last-use time. When the cache is full, the least recently
+    used slots are reused. Vector rows are written before their index rows are committed, so other
+    processes sharing the directory never see a slot without its vector.
+    """
+
+    def __init__(self, cache_dir: str, model_name: str, max_entries: int = 200_000):
+        safe_name = re.sub(r"[^A-Za-z0-9_.-]+", "_", model_name)
+        self.cache_dir = os.path.join(cache_dir, safe_name)
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.model_name = model_name
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._lock = threading.Lock()
+        self._vectors = None # Opened lazily: the dimension is only known after the first embedding
+        self._vectors_path = os.path.join(self.cache_dir, "vectors.f32")
+        self.conn = sqlite3.connect(os.path.join(self.cache_dir, "index.sqlite3"), check_same_thread=False, timeout=30)
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS entries (
+                key       TEXT PRIMARY KEY,
+                slot      INTEGER NOT NULL UNIQUE,
+                last_used REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS entries_last_used ON entries(last_used);
+            CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT NOT NULL);
+        """)
+        self.conn.commit()
+
+        row = self.conn.execute("SELECT value FROM meta WHERE name = 'dim'").fetchone()
+        if row:
+            self._open_vectors(int(row[0]))
+            # After max_entries was lowered, entries beyond the new capacity are evicted
+            evicted = self.conn.execute("DELETE FROM entries WHERE slot >= ?", (self.max_entries,)).rowcount
+            self.conn.commit()
+            if evicted:
+                print(f"Embedding cache: evicted {evicted} entries beyond max_entries={self.max_entries}.")
+
+    def _open_vectors(self, dim: int):
+        mode = "r+" if os.path.exists(self._vectors_path) else "w+"
+        # Pre-sized sparse file: untouched slots take no disk space
+        self._vectors = np.memmap(self._vectors_path, dtype=np.float32, mode=mode, shape=(self.max_entries, dim))
+        self.dim = dim
+
+    # --- Lookups ---
+    def get_many(self, keys: List[str]) -> List[Optional[List[float]]]:
+        """Returns the cached vector for each key, or None on a miss. Updates hit/miss counters and LRU times."""
+        if self._vectors is None or not keys:
+            self.misses += len(keys)
+            return [None] * len(keys)
+
+        with self._lock:
+            # Vectors are copied inside the write transaction: until it commits, no other process can
+            # evict these keys and reuse their slots (put_many takes the same lock)
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                slots = {}
+                unique_keys = list(set(keys))
+                # SQLite caps bound parameters per statement, so look keys up in slices
+                for i in range(0, len(unique_keys), 500):
+                    part = unique_keys[i:i + 500]
+                    placeholders = ",".join("?" * len(part))
+                    slots.update(self.conn.execute(f"SELECT key, slot FROM entries WHERE key IN ({placeholders})", part).fetchall())
+                # Slots written by a process with a larger max_entries are outside this mapping
+                slots = {key: slot for key, slot in slots.items() if slot < len(self._vectors)}
+
+                if slots:
+                    now = time.time()
+                    self.conn.executemany("UPDATE entries SET last_used = ? WHERE key = ?", [(now, key) for key in slots])
+
+                results = []
+                for key in keys:
+                    slot = slots.get(key)
+                    if slot is None:
+                        self.misses += 1
+                        results.append(None)
+                    else:
+                        self.hits += 1
+                        results.append(self._vectors[slot].tolist())
+                self.conn.commit()
+                return results
+            except Exception:
+                self.conn.rollback()
+                raise
+
+    # --- Inserts ---
+    def put_many(self, keys: List[str], vectors: List[List[float]]):
+        """Stores vectors under their keys, evicting least recently used entries when the cache is full."""
+        if not keys:
+            return
+        with self._lock:
+            if self._vectors is None:
+                dim = len(vectors[0])
+                self.conn.execute("INSERT OR REPLACE INTO meta (name, value) VALUES ('dim', ?)", (str(dim),))
+                self.conn.execute("INSERT OR REPLACE INTO meta (name, value) VALUES ('model_name', ?)", (self.model_name,))
+                self.conn.commit()
+                self._open_vectors(dim)
+
+            # Dedupe within the batch and skip keys another writer already stored
+            pending = dict(zip(keys, vectors))
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                existing = {key for key in pending
+                            if self.conn.execute("SELECT 1 FROM entries WHERE key = ?", (key,)).fetchone()}
+                pending = {key: vec for key, vec in pending.items() if key not in existing}
+                if not pending:
+                    self.conn.commit()
+                    return
+
+                slots = self._allocate_slots(len(pending))
+                matrix = np.asarray(list(pending.values()), dtype=np.float32)
+                for slot, row in zip(slots, matrix):
+                    self._vectors[slot] = row
+                self._vectors.flush()
+
+                now = time.time()
+                self.conn.executemany("INSERT INTO entries (key, slot, last_used) VALUES (?, ?, ?)",
+                                      [(key, slot, now) for key, slot in zip(pending, slots)])
+                self.conn.commit()
+            except Exception:
+                self.conn.rollback()
+                raise
+
+    def _allocate_slots(self, count: int) -> List[int]:
+        """Free slots first, then slots of the least recently used entries (which are deleted)."""
+        count = min(count, self.max_entries)
+        used = self.conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        slots = []
+        if used < self.max_entries:
+            # Evicted slots are reused immediately, so occupied slots are always the dense range [0, used)
+            slots = list(range(used, min(used + count, self.max_entries)))
+        if len(slots) < count:
+            victims = self.conn.execute("SELECT key, slot FROM entries WHERE slot < ? ORDER BY last_used LIMIT ?",
+                                        (self.max_entries, count - len(slots))).fetchall()
+            self.conn.executemany("DELETE FROM entries WHERE key = ?", [(key,) for key, _ in victims])
+            slots.extend(slot for _, slot in victims)
+            self.evictions += len(victims)
+        return slots
+
+    # --- Stats ---
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        entries = self.conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        return {
+            "model_name": self.model_name,
+            "entries": entries,
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": (self.hits / lookups) if lookups else 0.0,
+        }
+
+    def close(self):
+        if self._vectors is not None:
+            self._vectors.flush()
+        self.conn.close()
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    LangChain Embeddings wrapper that serves repeated texts from an EmbeddingCache and only runs
+    the wrapped model on misses (in one batch). Used for both ingestion and query embedding.
+    """
+
+    def __init__(self, embeddings: Embeddings, cache: EmbeddingCache):
+        self.embeddings = embeddings
+        self.cache = cache
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [make_cache_key(self.cache.model_name, text) for text in texts]
+        vectors = self.cache.get_many(keys)
+
+        # Embed each distinct missing key once, even if it repeats within the batch
+        missing = {}
+        for i, vector in enumerate(vectors):
+            if vector is None:
+                missing.setdefault(keys[i], []).append(i)
+        if missing:
+            missing_keys = list(missing)
+            computed = self.embeddings.embed_documents([texts[missing[key][0]] for key in missing_keys])
+            for key, vector in zip(missing_keys, computed):
+                for i in missing[key]:
+                    vectors[i] = vector
+            try:
+                self.cache.put_many(missing_keys, computed)
+            except Exception as e:
+                # A cache write failure must never fail ingestion or a chat request
+                print(f"Embedding cache: error storing {len(missing_keys)} vectors: {e}")
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        key = make_cache_key(self.cache.model_name, text)
+        vector = self.cache.get_many([key])[0]
+        if vector is None:
+            vector = self.embeddings.embed_query(text)
+            try:
+                self.cache.put_many([key], [vector])
+            except Exception as e:
+                print(f"Embedding cache: error storing query vector: {e}")
+        return vector
@@ -0,0 +1,519 @@
+# backend/flat_index.py
+
+import os
+import json
+import time
+import threading
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from ann_index import AnnIndex, VECTOR_INDEX_MODES, ANN_MIN_ROWS, ANN_SAVE_EVERY_ROWS # Optional faiss index over the rows
+
+
+# Rows scored per matmul when the stored dtype has to be converted to float32 first (bounds the temporary)
+SCORE_BLOCK_ROWS = 16384
+# Rewrite the files without deleted rows once they make up this share of the index
+COMPACT_DEAD_RATIO = 0.25
+COMPACT_MIN_DEAD_ROWS = 1000
+
+_ALL_INCLUDES = ("documents", "metadatas", "embeddings", "distances")
+
+
+def _matches(metadata: dict, where: dict) -> bool:
+    """Evaluates the subset of Chroma's `where` syntax the pipeline uses: equality, $eq/$ne/$in/$nin, $and/$or."""
+    for key, condition in where.items():
+        if key == "$and":
+            if not all(_matches(metadata, clause) for clause in condition):
+                return False
+        elif key == "$or":
+            if not any(_matches(metadata, clause) for clause in condition):
+                return False
+        elif isinstance(condition, dict):
+            value = metadata.get(key)
+            for operator, operand in condition.items():
+                if operator == "$eq" and value != operand or operator == "$ne" and value == operand \
+                        or operator == "$in" and value not in operand or operator == "$nin" and value in operand:
+                    return False
+        elif metadata.get(key) != condition:
+            return False
+    return True
+
+
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Positions of the k highest scores, best first."""
+    best = np.argpartition(scores, -k)[-k:] if k < len(scores) else np.arange(len(scores))
+    return best[np.argsort(-scores[best], kind="stable")]
+
+
+class FlatIndexCollection:
+    """
+    Exact cosine-similarity vector index in flat files, with the subset of the Chroma collection API
+    that ingestion and the RAG service use (count, get, query, upsert, update, delete).
+
+    Layout of the directory:
+        meta.json       dimension, dtype, row count and file version; replaced atomically after every write
+        vectors.N.bin   row-major matrix of unit-normalized vectors (float16 or float32), memory-mapped
+        offsets.N.bin   per row: int64 (document start, length, metadata start, length), memory-mapped
+        live.N.bin      per row: 1 if live, 0 if deleted
+        ids.N.txt       one chunk ID per line, in row order
+        documents.N.bin, metadata.N.bin  UTF-8 texts and JSON metadata, appended, read through offsets
+        ann.MODE.N.faiss, ann.MODE.N.json  optional ANN index (ann_index.py) and the rows it covers
+
+    Opening maps the files and reads the ID list, so startup costs milliseconds and the vectors only
+    take memory as the OS pages them in. A search is one BLAS matmul of the (optionally pre-filtered)
+    matrix against all query vectors at once, then argpartition for each query's top k.
+    Rows are only appended; updates point a row at newly appended text/metadata, and deletes clear the
+    live flag until enough dead rows accumulate to compact the files into version N+1. A reader that
+    opened the previous version keeps its mapping, so ingestion can write while the app serves.
+
+    With index_mode "hnsw", "ivfpq", "binary" or "int8", searches over more than ANN_MIN_ROWS rows
+    take candidates from a faiss index (graph, compressed codes) instead of scanning the matrix, and
+    re-score them exactly: only the candidates' rows of the vector file are paged in.
+    """
+
+    def __init__(self, directory: str, name: str = "documents", dtype: str = "float32", index_mode: str = "exact",
+                 ann_options: dict = None):
+        if index_mode not in VECTOR_INDEX_MODES:
+            raise ValueError(f"Unknown vector index mode '{index_mode}'. Expected one of: {', '.join(VECTOR_INDEX_MODES)}")
+        self.directory = directory
+        self.name = name
+        self.index_mode = index_mode
+        self._ann_options = ann_options or {} # AnnIndex keyword arguments (efSearch, nprobe, PQ code size...)
+        self._lock = threading.RLock()
+        os.makedirs(directory, exist_ok=True)
+        meta = self._read_meta()
+        self.dtype = np.dtype(meta.get("dtype", dtype))
+        self.dim = meta.get("dim")
+        self.version = meta.get("version", 0)
+        self._rows = meta.get("rows", 0)
+        self._fds = {}
+        self._open_files()
+
+    # --- Files ---
+    def _path(self, kind: str, version: int = None) -> str:
+        extension = "txt" if kind == "ids" else "bin"
+        return os.path.join(self.directory, f"{kind}.{self.version if version is None else version}.{extension}")
+
+    def _read_meta(self) -> dict:
+        try:
+            with open(os.path.join(self.directory, "meta.json"), encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def _write_meta(self):
+        path = os.path.join(self.directory, "meta.json")
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"name": self.name, "dim": self.dim, "dtype": self.dtype.name, "rows": self._rows,
+                       "version": self.version, "updated_at": time.time()}, f)
+        os.replace(tmp_path, path) # Readers see the old or the new row count, never a partial write
+
+    def _map(self, kind: str, dtype, columns: int = None):
+        shape = (self._rows, columns) if columns else (self._rows,)
+        if self._rows == 0 or not os.path.exists(self._path(kind)):
+            return np.zeros(shape if self._rows == 0 else (0,) + shape[1:], dtype=dtype)
+        return np.memmap(self._path(kind), dtype=dtype, mode="r", shape=shape)
+
+    def _open_files(self):
+        """Maps the first self._rows rows of every file, opens the ones read with pread and reads the ID -> row map."""
+        self.close()
+        self._remap()
+        # Opened now rather than on first read, so they refer to this version's files even if another
+        # process compacts the index and removes them before this instance reads a document
+        for kind in ("vectors", "documents", "metadata"):
+            if os.path.exists(self._path(kind)):
+                self._fd(kind)
+        ids = []
+        if self._rows and os.path.exists(self._path("ids")):
+            with open(self._path("ids"), encoding="utf-8") as f:
+                ids = f.read().split("\n")[:self._rows]
+        self._ids = ids
+        self._row_of = {chunk_id: row for row, chunk_id in enumerate(ids) if self._live[row]}
+        self._metadata_cache = None # Decoded metadata of every row, loaded by the first `where` filter
+        self._load_ann()
+
+    def _remap(self):
+        self._vectors = self._map("vectors", self.dtype, self.dim)
+        self._offsets = self._map("offsets", np.int64, 4)
+        self._live = self._map("live", np.uint8)
+        self._mask_cache = {}
+
+    def _read(self, kind: str, start: int, length: int) -> str:
+        return self._read_bytes(kind, start, length).decode("utf-8")
+
+    def _read_bytes(self, kind: str, start: int, length: int) -> bytes:
+        # Descriptors stay open for the file version this instance mapped, so reads keep working after
+        # another process compacts the index and removes those files
+        return os.pread(self._fd(kind), int(length), int(start))
+
+    def _fd(self, kind: str) -> int:
+        fd = self._fds.get(kind)
+        if fd is None:
+            # Only files created after _open_files (the first writes to an empty store) are opened here
+            fd = self._fds[kind] = os.open(self._path(kind), os.O_RDONLY)
+        return fd
+
+    def close(self):
+        for fd in self._fds.values():
+            os.close(fd)
+        self._fds = {}
+
+    def _document(self, row: int) -> str:
+        start, length = self._offsets[row, 0], self._offsets[row, 1]
+        return self._read("documents", start, length) if length >= 0 else None
+
+    def _metadata(self, row: int) -> dict:
+        if self._metadata_cache is not None:
+            return self._metadata_cache[row]
+        start, length = self._offsets[row, 2], self._offsets[row, 3]
+        return json.loads(self._read("metadata", start, length)) if length > 0 else {}
+
+    def _all_metadata(self) -> List[dict]:
+        if self._metadata_cache is None:
+            blob = self._read_bytes("metadata", 0, os.fstat(self._fd("metadata")).st_size) if self._rows else b""
+            self._metadata_cache = [json.loads(blob[start:start + length]) if length > 0 else {}
+                                    for start, length in self._offsets[:, 2:4].tolist()]
+        return self._metadata_cache
+
+    @staticmethod
+    def _append(path: str, data: bytes) -> int:
+        """Appends data and returns the offset it was written at."""
+        with open(path, "ab") as f:
+            start = f.tell()
+            f.write(data)
+        return start
+
+    @staticmethod
+    def _overwrite(path: str, position: int, data: bytes):
+        with open(path, "r+b") as f:
+            f.seek(position)
+            f.write(data)
+
+    # --- Collection API ---
+    def count(self) -> int:
+        return len(self._row_of)
+
+    def upsert(self, ids: List[str], embeddings, documents: List[str] = None, metadatas: List[dict] = None):
+        if not len(ids):
+            return
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors = (vectors / np.where(norms == 0, 1, norms)).astype(self.dtype)
+        documents = documents or [None] * len(ids)
+        metadatas = metadatas or [None] * len(ids)
+        with self._lock:
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+            elif vectors.shape[1] != self.dim:
+                raise ValueError(f"Embedding dimension {vectors.shape[1]} does not match the index ({self.dim})")
+
+            new_ids, new_rows, rewritten_rows = [], [], []
+            for chunk_id, vector, document, metadata in zip(ids, vectors, documents, metadatas):
+                offsets = self._append_record(document, metadata)
+                row = self._row_of.get(chunk_id)
+                if row is None:
+                    self._row_of[chunk_id] = self._rows + len(new_rows)
+                    new_ids.append(chunk_id)
+                    new_rows.append((vector, offsets, metadata or {}))
+                elif row >= self._rows:
+                    # Repeated ID within this call: its row isn't on disk yet, the last occurrence wins
+                    new_rows[row - self._rows] = (vector, offsets, metadata or {})
+                else:
+                    # Existing chunk: overwrite its vector and point it at the new record
+                    self._overwrite(self._path("vectors"), row * self.dim * self.dtype.itemsize, vector.tobytes())
+                    self._overwrite(self._path("offsets"), row * 32, np.asarray(offsets, dtype=np.int64).tobytes())
+                    self._cache_metadata(row, metadata)
+                    rewritten_rows.append(row)
+            if new_rows:
+                self._append(self._path("vectors"), np.stack([vector for vector, _, _ in new_rows]).tobytes())
+                self._append(self._path("offsets"), np.asarray([offsets for _, offsets, _ in new_rows], dtype=np.int64).tobytes())
+                self._append(self._path("live"), np.ones(len(new_rows), dtype=np.uint8).tobytes())
+                self._append(self._path("ids"), "".join(f"{chunk_id}\n" for chunk_id in new_ids).encode("utf-8"))
+                self._rows += len(new_rows)
+                self._ids.extend(new_ids)
+                if self._metadata_cache is not None:
+                    self._metadata_cache.extend(metadata for _, _, metadata in new_rows)
+            self._commit()
+            self._sync_ann(rewritten_rows)
+
+    def _cache_metadata(self, row: int, metadata: Optional[dict]):
+        if self._metadata_cache is not None:
+            self._metadata_cache[row] = metadata or {}
+
+    add = upsert
+
+    def _append_record(self, document: Optional[str], metadata: Optional[dict]) -> tuple:
+        document_start, document_length = 0, -1 # -1: no document stored
+        if document is not None:
+            data = document.encode("utf-8")
+            document_start, document_length = self._append(self._path("documents"), data), len(data)
+        data = json.dumps(metadata or {}, ensure_ascii=False).encode("utf-8")
+        return document_start, document_length, self._append(self._path("metadata"), data), len(data)
+
+    def update(self, ids: List[str], embeddings=None, documents: List[str] = None, metadatas: List[dict] = None):
+        """Updates existing chunks; like Chroma, metadata is merged key by key (None removes a key)."""
+        with self._lock:
+            rows = [self._row_of.get(chunk_id) for chunk_id in ids]
+            for i, row in enumerate(rows):
+                if row is None:
+                    continue
+                metadata = self._metadata(row)
+                if metadatas is not None:
+                    metadata = {**metadata, **metadatas[i]}
+                    metadata = {key: value for key, value in metadata.items() if value is not None}
+                document = documents[i] if documents is not None else self._document(row)
+                offsets = self._append_record(document, metadata)
+                self._overwrite(self._path("offsets"), row * 32, np.asarray(offsets, dtype=np.int64).tobytes())
+                self._cache_metadata(row, metadata)
+            self._commit()
+            if embeddings is not None:
+                present = [i for i, row in enumerate(rows) if row is not None]
+                self.upsert([ids[i] for i in present], [embeddings[i] for i in present],
+                            [self._document(rows[i]) for i in present], [self._metadata(rows[i]) for i in present])
+
+    def delete(self, ids: List[str] = None, where: dict = None):
+        with self._lock:
+            rows = [self._row_of[chunk_id] for chunk_id in ids or () if chunk_id in self._row_of]
+            if where:
+                rows += np.flatnonzero(self._where_mask(where)).tolist()
+            for row in set(rows):
+                self._overwrite(self._path("live"), row, b"\x00")
+                self._row_of.pop(self._ids[row], None)
+            self._commit()
+            dead = self._rows - len(self._row_of)
+            if dead >= COMPACT_MIN_DEAD_ROWS and dead > COMPACT_DEAD_RATIO * self._rows:
+                self.compact()
+
+    def get(self, ids: List[str] = None, where: dict = None, limit: int = None, offset: int = None,
+            include: List[str] = ("metadatas", "documents")) -> dict:
+        with self._lock:
+            if ids is not None:
+                rows = [self._row_of[chunk_id] for chunk_id in ([ids] if isinstance(ids, str) else ids)
+                        if chunk_id in self._row_of]
+                if where:
+                    mask = self._where_mask(where)
+                    rows = [row for row in rows if mask[row]]
+            else:
+                mask = self._where_mask(where) if where else np.asarray(self._live, dtype=bool)
+                rows = np.flatnonzero(mask).tolist()
+            rows = rows[offset or 0:(offset or 0) + limit if limit is not None else None]
+            return self._results(rows, include)
+
+    def query(self, query_embeddings, n_results: int = 10, where: dict = None,
+              include: List[str] = ("metadatas", "documents", "distances")) -> dict:
+        """Top n_results by cosine similarity for each query vector; distances are 1 - similarity."""
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        if queries.ndim == 1:
+            queries = queries[None, :]
+        norms = np.linalg.norm(queries, axis=1, keepdims=True)
+        queries = queries / np.where(norms == 0, 1, norms)
+        with self._lock:
+            mask = self._where_mask(where) if where else None
+            top_rows, top_scores = self.search(queries, n_results, mask)
+            results = {key: [] for key in ("ids", "documents", "metadatas", "embeddings", "distances")}
+            for rows, scores in zip(top_rows, top_scores):
+                one = self._results(rows.tolist(), include)
+                for key in ("ids", "documents", "metadatas", "embeddings"):
+                    results[key].append(one[key])
+                results["distances"].append((1 - scores).tolist())
+            for key in _ALL_INCLUDES:
+                if key not in include:
+                    results[key] = None
+            return results
+
+    # --- Search ---
+    def search(self, queries: np.ndarray, k: int, mask: np.ndarray = None):
+        """
+        Exact top-k over the live rows (and mask) for a batch of unit query vectors.
+        Returns ([row indices per query], [scores per query]), best first.
+        """
+        candidates = np.asarray(self._live, dtype=bool) if mask is None else mask & np.asarray(self._live, dtype=bool)
+        selected = np.flatnonzero(candidates)
+        if not len(selected) or k <= 0:
+            return [np.zeros(0, dtype=np.int64)] * len(queries), [np.zeros(0, dtype=np.float32)] * len(queries)
+        if self._ann is not None and self._ann.ready and len(selected) > ANN_MIN_ROWS:
+            return self._ann_search(queries, k, candidates)
+        # A small partition (category filter) is gathered and scored alone; otherwise score every row
+        # in place and discard the dead or filtered ones
+        gather = len(selected) < 0.5 * self._rows
+        scores = self._score(self._vectors[selected] if gather else self._vectors, queries)
+        rows = selected if gather else np.arange(self._rows)
+        if not gather and len(selected) < self._rows:
+            scores[~candidates] = -np.inf
+
+        k = min(k, len(selected))
+        top_rows, top_scores = [], []
+        for column in range(len(queries)):
+            best = _top_k(scores[:, column], k)
+            top_rows.append(rows[best])
+            top_scores.append(scores[best, column])
+        return top_rows, top_scores
+
+    def _ann_search(self, queries: np.ndarray, k: int, candidates: np.ndarray):
+        """
+        Top-k from the ANN index's candidates (AnnIndex.candidate_count) among the rows it covers, plus an
+        exact scan of the rows added since it was saved, all re-scored against the stored vectors.
+        """
+        covered = min(self._ann.rows, self._rows)
+        allowed = candidates[:covered]
+        proposed = self._ann.search(queries, self._ann.candidate_count(k), None if allowed.all() else allowed)
+        tail = np.flatnonzero(candidates[covered:]) + covered
+        tail_scores = self._score(self._vectors[tail], queries) if len(tail) else None
+        top_rows, top_scores = [], []
+        for column, found in enumerate(proposed):
+            rows = np.unique(found[(found >= 0) & (found < covered)]) # Sorted, so the gather reads the file in order
+            scores = self._score(self._gather(rows), queries[column:column + 1])[:, 0]
+            if tail_scores is not None:
+                rows, scores = np.concatenate([rows, tail]), np.concatenate([scores, tail_scores[:, column]])
+            best = _top_k(scores, k)
+            top_rows.append(rows[best])
+            top_scores.append(scores[best])
+        return top_rows, top_scores
+
+    def _score(self, vectors: np.ndarray, queries: np.ndarray) -> np.ndarray:
+        """(rows x queries) similarities. float32 rows go straight to BLAS; float16 ones are converted block by block."""
+        if vectors.dtype == np.float32:
+            return np.asarray(vectors @ queries.T)
+        scores = np.empty((len(vectors), len(queries)), dtype=np.float32)
+        for start in range(0, len(vectors), SCORE_BLOCK_ROWS):
+            block = vectors[start:start + SCORE_BLOCK_ROWS]
+            np.matmul(block.astype(np.float32), queries.T, out=scores[start:start + len(block)])
+        return scores
+
+    def _where_mask(self, where: dict) -> np.ndarray:
+        key = json.dumps(where, sort_keys=True)
+        mask = self._mask_cache.get(key)
+        if mask is None:
+            metadata, live = self._all_metadata(), np.asarray(self._live, dtype=bool)
+            mask = np.fromiter((live[row] and _matches(metadata[row], where) for row in range(self._rows)),
+                               dtype=bool, count=self._rows)
+            self._mask_cache[key] = mask
+        return mask
+
+    def _results(self, rows: List[int], include) -> dict:
+        return {
+            "ids": [self._ids[row] for row in rows],
+            "documents": [self._document(row) for row in rows] if "documents" in include else None,
+            "metadatas": [self._metadata(row) for row in rows] if "metadatas" in include else None,
+            "embeddings": [np.asarray(self._vectors[row], dtype=np.float32) for row in rows] if "embeddings" in include else None,
+        }
+
+    def _gather(self, rows: np.ndarray) -> np.ndarray:
+        """
+        Stored vectors of candidate rows. Compact indexes (codes only) read them with pread: faulting
+        them in through the mapping would map whole page-cache folios around each row, and the
+        matrix the codes replace would creep back into the process.
+        """
+        if not self._ann.compact or not len(rows):
+            return self._vectors[rows]
+        row_bytes = self.dim * self.dtype.itemsize
+        fd = self._fd("vectors")
+        data = b"".join(os.pread(fd, row_bytes, row * row_bytes) for row in rows.tolist())
+        return np.frombuffer(data, dtype=self.dtype).reshape(len(rows), self.dim)
+
+    # --- ANN index ---
+    def _ann_path(self, extension: str, version: int = None) -> str:
+        return os.path.join(self.directory, f"ann.{self.index_mode}.{self.version if version is None else version}.{extension}")
+
+    def _load_ann(self):
+        self._ann = None
+        if self.index_mode == "exact" or not self.dim:
+            return
+        self._ann = AnnIndex(self.index_mode, self.dim, **self._ann_options)
+        if self._ann.load(self._ann_path("faiss"), self._ann_path("json")):
+            print(f"Flat index: loaded {self.index_mode} index over {self._ann.rows} of {self._rows} rows.")
+
+    def _sync_ann(self, rewritten_rows=(), save: bool = False) -> bool:
+        """
+        Writer side: builds the ANN index once the store has ANN_MIN_ROWS live rows, adds the rows
+        written since, and saves it every ANN_SAVE_EVERY_ROWS rows (or when save is set).
+        Returns True if the index file was written.
+        """
+        if self.index_mode == "exact" or not self.dim:
+            return False
+        if self._ann is None:
+            self._ann = AnnIndex(self.index_mode, self.dim, **self._ann_options)
+        if not self._ann.ready:
+            if self.count() < ANN_MIN_ROWS:
+                return False
+            self._ann.build(self._vectors, self._live)
+            save = True
+        else:
+            self._ann.add(self._vectors, self._live, rewritten_rows)
+        if self._ann.dirty and (save or self._ann.rows - self._ann.saved_rows >= ANN_SAVE_EVERY_ROWS):
+            self._ann.save(self._ann_path("faiss"), self._ann_path("json"))
+            return True
+        return False
+
+    def flush(self) -> bool:
+        """
+        Saves the ANN index with every row written so far, so readers opening the store don't scan a
+        tail. Returns True if it was written.
+        """
+        with self._lock:
+            return self._sync_ann(save=True)
+
+    # --- Maintenance ---
+    def _commit(self):
+        """Publishes the new row count and remaps the files (the ID map and metadata cache are kept current by the writes)."""
+        self._write_meta()
+        self._remap()
+
+    def compact(self):
+        """Rewrites the live rows into a new file version and drops the old one."""
+        with self._lock:
+            live_rows = np.flatnonzero(np.asarray(self._live, dtype=bool))
+            old_version, new_version = self.version, self.version + 1
+            documents, metadata, offsets = bytearray(), bytearray(), []
+            for row in live_rows.tolist():
+                document = self._document(row)
+                data = document.encode("utf-8") if document is not None else b""
+                document_offsets = (len(documents), len(data) if document is not None else -1)
+                documents += data
+                data = json.dumps(self._metadata(row), ensure_ascii=False).encode("utf-8")
+                offsets.append(document_offsets + (len(metadata), len(data)))
+                metadata += data
+            for kind, data in (("vectors", np.ascontiguousarray(self._vectors[live_rows]).tobytes()),
+                               ("offsets", np.asarray(offsets, dtype=np.int64).tobytes()),
+                               ("live", np.ones(len(live_rows), dtype=np.uint8).tobytes()),
+                               ("ids", "".join(f"{self._ids[row]}\n" for row in live_rows.tolist()).encode("utf-8")),
+                               ("documents", bytes(documents)), ("metadata", bytes(metadata))):
+                with open(self._path(kind, new_version), "wb") as f:
+                    f.write(data)
+            self.version, self._rows = new_version, len(live_rows)
+            self._write_meta()
+            self._open_files()
+            self._sync_ann(save=True) # Row numbers changed: the ANN index is rebuilt for the new version
+            for path in [self._path(kind, old_version) for kind in ("vectors", "offsets", "live", "ids", "documents", "metadata")] \
+                    + [self._ann_path(extension, old_version) for extension in ("faiss", "json")]:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+            print(f"Flat index: compacted to {self._rows} rows (file version {new_version}).")
+
+    def stats(self) -> Dict[str, object]:
+        return {"rows": self._rows, "live": self.count(), "dim": self.dim, "dtype": self.dtype.name,
+                "vector_mb": round(self._rows * (self.dim or 0) * self.dtype.itemsize / 1e6, 1),
+                "ann": self._ann.stats() if self._ann is not None else None}
+
+
+class FlatVectorStore:
+    """
+    Stand-in for the LangChain Chroma wrapper around a FlatIndexCollection: the pipeline and the RAG
+    service only use its `_collection` and `delete(ids=...)`.
+    """
+
+    def __init__(self, directory: str, collection_name: str, embedding_function=None, dtype: str = "float32",
+                 index_mode: str = "exact", ann_options: dict = None):
+        self._collection = FlatIndexCollection(directory, name=collection_name, dtype=dtype, index_mode=index_mode,
+                                               ann_options=ann_options)
+        self.embedding_function = embedding_function
+
+    def delete(self, ids: List[str] = None):
+        self._collection.delete(ids=ids)
+
+    def flush(self) -> bool:
+        return self._collection.flush()
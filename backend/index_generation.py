@@ -0,0 +1,43 @@
+# backend/index_generation.py
+
+import os
+import json
+import time
+from typing import Optional
+
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__)) # Directory of index_generation.py
+PROJECT_ROOT = os.path.abspath(os.path.join(CURRENT_DIR, '..')) # mezan directory (up one level)
+
+# Marker file bumped by ingestion whenever it commits changes to the vector store. The serving
+# process stats it per request and reopens its Chroma client when it moves, so new Journal issues
+# become searchable without restarting the app.
+INDEX_GENERATION_PATH = os.getenv("INDEX_GENERATION_PATH", os.path.join(PROJECT_ROOT, 'data', 'vector_store', 'index_generation.json'))
+
+
+def publish_index_generation(path: str = INDEX_GENERATION_PATH, **info) -> int:
+    """Atomically writes the next generation number (plus `info`) to the marker file and returns it."""
+    previous = read_index_generation(path)
+    generation = (previous or {}).get("generation", 0) + 1
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({"generation": generation, "published_at": time.time(), **info}, f)
+    os.replace(tmp_path, path) # Readers see either the old or the new marker, never a partial one
+    return generation
+
+
+def read_index_generation(path: str = INDEX_GENERATION_PATH) -> Optional[dict]:
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def index_generation_stamp(path: str = INDEX_GENERATION_PATH) -> Optional[int]:
+    """Cheap change check for the serving hot path: the marker's mtime, or None if it doesn't exist."""
+    try:
+        return os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
@@ -1,18 +1,32 @@
 # backend/ingestion.py
 
 import os
+import time
 import glob # For finding all PDF files in a directory
+import argparse
+import cProfile
+import pstats
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
 # dotenv is not strictly needed here if run independently, but good practice
 # from dotenv import load_dotenv
 
 # Import PDF and text processing tools
-import PyPDF2
-from langchain.text_splitter import RecursiveCharacterTextSplitter # Using base splitter
-from typing import List
+from pdf_extractors import get_pdf_extractor, PDF_EXTRACTOR, PDF_EXTRACTORS # PyPDF2 / pypdfium2 / pdfminer.six
+from legal_text import normalize_text, get_text_splitter, chunking_fingerprint # Arabic/French normalization and article-aware chunking
+from typing import Iterator, List, Tuple
 
 # LangChain components for embedding and vector store
 from langchain_community.vectorstores import Chroma
-from langchain_community.embeddings import HuggingFaceEmbeddings # For local sentence-transformer embeddings
+from embedding_backends import create_embedding_model # Local sentence-transformer embeddings behind the on-disk cache
+from vector_backends import open_vector_store, vector_store_directory, VECTOR_STORE_BACKEND # Chroma or the flat mmap index
+from ingestion_manifest import IngestionManifest, diff_corpus
+from ingestion_writer import PipelinedChunkWriter, delete_file_chunks, DEFAULT_EMBED_BATCH_SIZE, DEFAULT_QUEUE_DEPTH
+from chunk_dedup import ChunkDeduplicator, DEFAULT_THRESHOLD as DEFAULT_DEDUP_THRESHOLD
+from ingestion_metrics import IngestionMetrics, write_report, print_report_summary, DEFAULT_PROGRESS_INTERVAL
+from index_generation import publish_index_generation, INDEX_GENERATION_PATH
+from lexical_index import build_lexical_index, LEXICAL_INDEX_PATH # BM25 side of hybrid retrieval
+from legal_categories import classify_text, chunk_categories, retag_collection # Per-chunk legal category tags
 # If using Google Embeddings (requires API key):
 # from langchain_google_genai import GoogleGenerativeAIEmbeddings
 # import google.generativeai as genai # Needed for Google Embeddings config if not using LangChain wrapper
@@ -24,6 +38,7 @@ CURRENT_DIR = os.path.dirname(os.path.abspath(__file__)) # Directory of ingestio
 PROJECT_ROOT = os.path.abspath(os.path.join(CURRENT_DIR, '..')) # mezan directory (up one level)
 RAW_PDFS_DIR = os.path.join(PROJECT_ROOT, 'data', 'raw_pdfs')
 VECTOR_STORE_DIR = os.path.join(PROJECT_ROOT, 'data', 'vector_store', 'joradp_chroma_db') # Path for ChromaDB to persist
+MANIFEST_PATH = os.path.join(PROJECT_ROOT, 'data', 'vector_store', 'ingestion_manifest.sqlite3') # Content-hash record of ingested PDFs
 
 # Embedding model configuration (using a local sentence-transformer model)
 EMBEDDING_MODEL_NAME =  "sentence-transformers/all-mpnet-base-v2"
@@ -31,24 +46,62 @@ EMBEDDING_MODEL_NAME =  "sentence-transformers/all-mpnet-base-v2"
 # ChromaDB collection name
 CHROMA_COLLECTION_NAME = "joradp_documents"
 
-# --- PDF Text Extraction Function ---
-def extract_text_from_pdf(pdf_path: str) -> str:
+# Chunking parameters used by every ingestion mode
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 150
+
+# Number of worker processes that extract/clean/chunk PDFs in parallel (1 = sequential, in-process)
+INGESTION_WORKERS = int(os.getenv("INGESTION_WORKERS", os.cpu_count() or 1))
+
+# Chunks per embedding forward pass / Chroma upsert, and batches buffered between pipeline stages
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", DEFAULT_EMBED_BATCH_SIZE))
+PIPELINE_QUEUE_DEPTH = int(os.getenv("PIPELINE_QUEUE_DEPTH", DEFAULT_QUEUE_DEPTH))
+
+# Near-duplicate chunk elimination (repeated mastheads, tables of contents, preambles, signature blocks)
+CHUNK_DEDUP_ENABLED = os.getenv("CHUNK_DEDUP_ENABLED", "1") == "1"
+CHUNK_DEDUP_THRESHOLD = float(os.getenv("CHUNK_DEDUP_THRESHOLD", DEFAULT_DEDUP_THRESHOLD))
+
+# Machine-readable run report (per-stage timings, throughput, counters) and live progress cadence (0 = off)
+INGESTION_REPORT_PATH = os.getenv("INGESTION_REPORT_PATH", os.path.join(PROJECT_ROOT, 'data', 'vector_store', 'ingestion_report.json'))
+INGESTION_PROGRESS_INTERVAL = float(os.getenv("INGESTION_PROGRESS_INTERVAL", DEFAULT_PROGRESS_INTERVAL))
+
+# --- PDF Text Extraction Functions ---
+def iter_pdf_pages(pdf_path: str, metrics: IngestionMetrics = None, extractor: str = PDF_EXTRACTOR) -> Iterator[Tuple[int, str]]:
+    """
+    Yields (page_number, page_text) for each page of a PDF, 1-based, one page at a time, using the
+    selected extraction engine (see pdf_extractors.PDF_EXTRACTORS). Pages with no extractable text
+    are skipped. Errors propagate to the caller (the page is counted as failed first).
+    """
+    metrics = metrics or IngestionMetrics()
+    metrics.incr("files")
+    metrics.incr("bytes_read", os.path.getsize(pdf_path))
+    print(f"Reading PDF: {pdf_path} ({extractor})")
+
+    page_texts = get_pdf_extractor(extractor).iter_page_texts(pdf_path)
+    page_num = 0
+    while True:
+        try:
+            with metrics.timed("extract"):
+                page_text = next(page_texts, None)
+        except Exception:
+            metrics.incr("failed_pages")
+            raise
+        if page_text is None:
+            return
+        page_num += 1
+        metrics.incr("pages")
+        if page_text.strip():
+            yield page_num, page_text
+        else:
+            metrics.incr("empty_pages")
+            print(f"Warning: No text extracted from page {page_num} of {pdf_path}")
+
+
+def extract_text_from_pdf(pdf_path: str, extractor: str = PDF_EXTRACTOR) -> str:
     """Extracts text content from a given PDF file."""
-    text = ""
     try:
-        with open(pdf_path, 'rb') as pdf_file:
-            pdf_reader = PyPDF2.PdfReader(pdf_file)
-            num_pages = len(pdf_reader.pages)
-            print(f"Reading PDF: {pdf_path} - Found {num_pages} pages.")
-
-            for page_num in range(num_pages):
-                page = pdf_reader.pages[page_num]
-                page_text = page.extract_text()
-                if page_text:
-                    text += page_text + "\n" # Add a newline between pages
-                else:
-                    print(f"Warning: No text extracted from page {page_num + 1} of {pdf_path}")
-
+        # Join once at the end instead of growing a string page by page (quadratic on large Journals)
+        text = "\n".join(page_text for _, page_text in iter_pdf_pages(pdf_path, extractor=extractor))
         print(f"Successfully extracted text from {pdf_path}")
         return text.strip()
     except FileNotFoundError:
@@ -61,38 +114,69 @@ def extract_text_from_pdf(pdf_path: str) -> str:
 
 # --- Text Cleaning and Chunking Functions ---
 def clean_text(text: str) -> str:
-    """Basic text cleaning."""
-    text = text.replace('\n\n+', '\n') # Replace multiple newlines
-    text = text.replace('  +', ' ')   # Replace multiple spaces
-    text = "\n".join([line.strip() for line in text.split('\n')]).strip() # Remove leading/trailing whitespace from lines
-    # Add more cleaning steps here if needed (e.g., handling ligatures, hyphens)
-    return text
+    """Normalizes whitespace and Arabic spelling variants (see legal_text.normalize_text)."""
+    return normalize_text(text)
 
 def chunk_text_recursive(text: str, chunk_size: int = 700, chunk_overlap: int = 150) -> List[str]:
-    """Splits text into chunks using RecursiveCharacterTextSplitter."""
+    """Splits text into article- and sentence-aligned chunks (see legal_text.LegalTextSplitter)."""
     if not text:
         return []
 
     print(f"Chunking text. Original length: {len(text)} chars. Chunk size: {chunk_size}, Overlap: {chunk_overlap}")
-
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=chunk_size,
-        chunk_overlap=chunk_overlap,
-        length_function=len,
-        add_start_index=False,
-    )
-    chunks = text_splitter.split_text(text)
+    chunks = get_text_splitter(chunk_size, chunk_overlap).split_text(text)
     print(f"Text split into {len(chunks)} chunks.")
     return chunks
 
+def iter_pdf_chunks(pdf_path: str, chunk_size: int = CHUNK_SIZE, chunk_overlap: int = CHUNK_OVERLAP,
+                    metrics: IngestionMetrics = None, extractor: str = PDF_EXTRACTOR) -> Iterator[dict]:
+    """
+    Streaming counterpart of extract_text_from_pdf -> clean_text -> chunk_text_recursive.
+
+    Cleans and splits one page at a time and yields chunk records {"text": ..., "page": ..., "categories": [...]},
+    where page is the 1-based page the chunk starts on and categories are the legal categories the
+    chunk is about (legal_categories.classify_text, best match first). The last (usually partial) chunk of each page is
+    carried into the next page so chunks still flow across page breaks, which keeps memory bounded
+    by roughly one page plus one chunk regardless of document length.
+    """
+    text_splitter = get_text_splitter(chunk_size, chunk_overlap)
+    metrics = metrics or IngestionMetrics()
+    carry_text, carry_page = "", None
+
+    for page_number, page_text in iter_pdf_pages(pdf_path, metrics, extractor):
+        with metrics.timed("clean"):
+            page_text = clean_text(page_text)
+        if not page_text:
+            continue
+
+        buffer = f"{carry_text}\n{page_text}" if carry_text else page_text
+        carry_len = len(carry_text) + 1 if carry_text else 0
+        with metrics.timed("split"):
+            pieces = text_splitter.split(buffer)
+
+        # Emit everything but the last piece, which may continue on the next page
+        for start_index, piece_text in pieces[:-1]:
+            yield _chunk_record(piece_text, carry_page if start_index < carry_len else page_number, metrics)
+
+        start_index, carry_text = pieces[-1]
+        carry_page = carry_page if start_index < carry_len else page_number
+
+    if carry_text:
+        yield _chunk_record(carry_text, carry_page, metrics)
+
+
+def _chunk_record(text: str, page: int, metrics: IngestionMetrics) -> dict:
+    with metrics.timed("classify"):
+        categories = classify_text(text)
+    return {"text": text, "page": page, "categories": categories}
+
 # --- Embedding Model Initialization ---
 def initialize_embedding_model():
     """Initializes and returns the embedding model."""
     print(f"Initializing embedding model: {EMBEDDING_MODEL_NAME}")
     try:
-        # Using a local Sentence Transformer model via HuggingFaceEmbeddings
-        # model_kwargs={'device': 'cpu'} ensures it runs on CPU even if GPU is available
-        embeddings = HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL_NAME, model_kwargs={'device': 'cpu'})
+        # Local Sentence Transformer model on CPU, wrapped in the persistent embedding cache so
+        # rebuilds and chunk-size experiments only embed chunk texts that were never seen before
+        embeddings = create_embedding_model(EMBEDDING_MODEL_NAME)
 
         # --- Alternative: Using Google Generative AI Embeddings ---
         # Requires GEMINI_API_KEY in .env and potentially `google.generativeai.configure`
@@ -113,24 +197,26 @@ def initialize_embedding_model():
 
 # --- ChromaDB Vector Store Initialization ---
 def initialize_vector_store(embedding_function):
-    """Initializes or loads the ChromaDB vector store."""
-    print(f"Initializing ChromaDB vector store at: {VECTOR_STORE_DIR}")
+    """Initializes or loads the vector store (ChromaDB, or the flat index with VECTOR_STORE_BACKEND=flat)."""
+    store_dir = vector_store_directory(VECTOR_STORE_DIR)
+    print(f"Initializing {VECTOR_STORE_BACKEND} vector store at: {store_dir}")
     # Ensure the directory exists
-    if not os.path.exists(VECTOR_STORE_DIR):
-        os.makedirs(VECTOR_STORE_DIR)
-        print(f"Created directory: {VECTOR_STORE_DIR}")
+    if not os.path.exists(store_dir):
+        os.makedirs(store_dir)
+        print(f"Created directory: {store_dir}")
 
     try:
-        # Create a persistent ChromaDB client
-        # This will create files in the VECTOR_STORE_DIR if they don't exist,
+        # Create a persistent store
+        # This will create files in the store directory if they don't exist,
         # or load an existing DB from that path.
-        vector_store = Chroma(
-            collection_name=CHROMA_COLLECTION_NAME,
-            embedding_function=embedding_function, # Must use the same embedding function
-            persist_directory=VECTOR_STORE_DIR
+        vector_store = open_vector_store(
+            embedding_function, # Must use the same embedding function
+            CHROMA_COLLECTION_NAME,
+            store_dir,
         )
-        print(f"ChromaDB vector store initialized/loaded. Collection: '{CHROMA_COLLECTION_NAME}'. Documents in collection: {vector_store._collection.count()}")
-        if vector_store._collection.count() == 0:
+        document_count = vector_store._collection.count()
+        print(f"Vector store initialized/loaded. Collection: '{CHROMA_COLLECTION_NAME}'. Documents in collection: {document_count}")
+        if document_count == 0:
             print("Warning: Vector store is empty. No documents loaded.")
         return vector_store
     except Exception as e:
@@ -139,86 +225,331 @@ def initialize_vector_store(embedding_function):
         return None # Return None if initialization fails
 
 
+# --- Per-file Worker ---
+def process_pdf(pdf_path: str, chunk_size: int = CHUNK_SIZE, chunk_overlap: int = CHUNK_OVERLAP,
+                extractor: str = PDF_EXTRACTOR) -> Tuple[str, List[dict], dict]:
+    """
+    Extracts, cleans and chunks a single PDF and returns (pdf_filename, chunk_records, metrics_snapshot).
+    This is the CPU-bound part of ingestion. It runs inside pool workers, so it must not touch
+    the embedding model or the vector store. The records have to cross the process boundary,
+    so they are materialized here; the in-process path streams iter_pdf_chunks directly.
+    The worker's stage timings travel back as a snapshot for the parent to merge, even on failure.
+    """
+    pdf_filename = os.path.basename(pdf_path)
+    metrics = IngestionMetrics()
+    try:
+        chunk_records = list(iter_pdf_chunks(pdf_path, chunk_size=chunk_size, chunk_overlap=chunk_overlap,
+                                             metrics=metrics, extractor=extractor))
+    except Exception as e:
+        print(f"Error processing '{pdf_filename}': {e}")
+        return pdf_filename, None, metrics.snapshot()
+    if not chunk_records:
+        print(f"No chunks generated for {pdf_filename}. Skipping.")
+    return pdf_filename, chunk_records, metrics.snapshot()
+
+
 # --- Main Ingestion Process ---
-def run_ingestion_pipeline(pdf_directory: str, vector_store: Chroma, embedding_function):
+def run_ingestion_pipeline(pdf_directory: str, vector_store: Chroma, embedding_function, num_workers: int = 1,
+                           manifest_path: str = MANIFEST_PATH, batch_size: int = EMBED_BATCH_SIZE,
+                           queue_depth: int = PIPELINE_QUEUE_DEPTH, dedup: bool = CHUNK_DEDUP_ENABLED,
+                           dedup_threshold: float = CHUNK_DEDUP_THRESHOLD, report_path: str = INGESTION_REPORT_PATH,
+                           progress_interval: float = INGESTION_PROGRESS_INTERVAL, profile_path: str = None,
+                           generation_path: str = INDEX_GENERATION_PATH, extractor: str = PDF_EXTRACTOR,
+                           lexical_index_path: str = LEXICAL_INDEX_PATH, retag_categories: bool = False) -> dict:
     """
-    Processes all PDF files in a directory: extracts text, chunks, embeds, and stores in ChromaDB.
-    Checks if a document (by filename) has already been processed to avoid duplicates.
+    Processes all PDF files in a directory: extracts text, chunks, embeds, and stores in the vector store
+    (ChromaDB, or the flat index with VECTOR_STORE_BACKEND=flat).
+
+    The directory is diffed against the content-hash manifest once up front: only new or changed
+    files are re-embedded, chunks of changed or deleted files are removed, and an unchanged corpus
+    finishes without touching the vector store.
+
+    Chunks flow through a PipelinedChunkWriter, which embeds them in batches of batch_size and upserts
+    each batch in one call on background threads, so extraction, embedding and writes overlap.
+    With num_workers > 1, extraction/cleaning/chunking runs in a pool of worker processes while this
+    process feeds the results to the single writer.
+
+    With dedup enabled, near-duplicate chunks (MinHash similarity >= dedup_threshold) are folded into
+    one stored vector per cluster, with references back to every source file kept in the manifest DB.
+
+    Written batches are journaled in the manifest DB, so after an interrupted run (crash, OOM, Ctrl-C)
+    each unfinished file resumes from its last committed batch, and partial versions that are no
+    longer wanted are rolled back.
+
+    New chunks are tagged with their legal categories, which category-filtered retrieval selects on.
+    With retag_categories, every chunk already in the collection is re-classified first (for
+    collections ingested before tagging, or after the category keywords change).
+
+    When the run changed the collection (or lexical_index_path doesn't exist yet), the BM25 index used
+    by hybrid retrieval is rebuilt from the collection's chunks and saved to lexical_index_path.
+    Then the index generation marker at generation_path is bumped so a running rag_service reopens
+    its vector store and lexical index and serves the new chunks without a restart.
+
+    Every stage is timed; a progress line is printed every progress_interval seconds and the run
+    report (returned, and written to report_path as JSON if set) gives per-stage latency and throughput.
+    With profile_path, the run is profiled with cProfile (this thread plus both writer threads) and the
+    merged stats are dumped there for snakeviz / pstats.
     """
-    pdf_files = glob.glob(os.path.join(pdf_directory, "*.pdf"))
+    metrics = IngestionMetrics()
+    profiler = cProfile.Profile() if profile_path else None
+    chunking = chunking_fingerprint(CHUNK_SIZE, CHUNK_OVERLAP) # What the chunk numbers of this run's files depend on
+    writer_profiles = []
+    if profiler:
+        profiler.enable()
+
+    pdf_files = sorted(glob.glob(os.path.join(pdf_directory, "*.pdf")))
     if not pdf_files:
         print(f"No PDF files found in {pdf_directory}. Please add JORADP PDFs there.")
-        return
-
-    print(f"Found {len(pdf_files)} PDF files to process in {pdf_directory}")
+        # Still fall through so chunks of PDFs removed from the directory get cleaned up
 
-    for pdf_path in pdf_files:
-        pdf_filename = os.path.basename(pdf_path)
-        print(f"\n--- Processing PDF: {pdf_filename} ---")
+    if retag_categories:
+        print("Re-classifying the legal categories of every stored chunk...")
+        with metrics.timed("retag"):
+            retagged = retag_collection(vector_store._collection)
+        metrics.incr("chunks_retagged", retagged)
+        print(f"Updated the category tags of {retagged} chunks.")
 
-        # --- Check if document already processed ---
-        # Simple check by filename in metadata. Query for existence.
+    manifest = IngestionManifest(manifest_path)
+    deduplicator = ChunkDeduplicator(manifest_path, threshold=dedup_threshold) if dedup else None
+    try:
+        manifest_entries = manifest.snapshot()
+        to_ingest, refreshed, removed = diff_corpus(pdf_files, manifest_entries)
+        unchanged = len(pdf_files) - len(to_ingest)
+        print(f"Found {len(pdf_files)} PDF files in {pdf_directory}: {len(to_ingest)} new or changed, "
+              f"{unchanged} unchanged, {len(removed)} removed since last run.")
+
+        # Before refreshed files are re-recorded, which would clear their journal rows
+        _recover_interrupted_files(pdf_files, manifest, manifest_entries, to_ingest, refreshed,
+                                   vector_store, deduplicator, metrics, extractor, chunking)
+
+        for entry in refreshed:
+            previous = entry["previous"]
+            manifest.record_file(entry["filename"], entry["file_hash"], previous["chunk_count"], entry["size"], entry["mtime_ns"])
+
+        for filename, entry in removed.items():
+            print(f"Removing {entry['chunk_count']} stale chunks of deleted file '{filename}'.")
+            try:
+                with metrics.timed("delete"):
+                    delete_file_chunks(vector_store, filename, entry["file_hash"], entry["chunk_count"], deduplicator)
+                manifest.remove_file(filename)
+            except Exception as e:
+                print(f"Error removing chunks of '{filename}': {e}")
+
+        for entry in to_ingest:
+            # Journaled with the file's batches, checked before resuming it
+            entry["extractor"], entry["chunking"] = extractor, chunking
+
+        if to_ingest:
+            writer = PipelinedChunkWriter(vector_store, embedding_function, manifest, batch_size=batch_size,
+                                          queue_depth=queue_depth, deduplicator=deduplicator, metrics=metrics,
+                                          profile=profiler is not None)
+            writer.start()
+            metrics.start_progress(len(to_ingest), progress_interval)
+            try:
+                if num_workers <= 1:
+                    for entry in to_ingest:
+                        print(f"\n--- Processing PDF: {entry['filename']} ---")
+                        # Chunks go to the writer as each page is parsed; the document is never held whole
+                        writer.submit_file(entry, iter_pdf_chunks(entry["path"], metrics=metrics, extractor=extractor))
+                else:
+                    _run_parallel(to_ingest, writer, num_workers, metrics, extractor)
+            finally:
+                writer.close()
+                metrics.stop_progress()
+                writer_profiles = writer.profiles or []
+    finally:
+        if deduplicator:
+            deduplicator.close()
+        manifest.close()
+
+    print("\n--- PDF Processing Complete" + ("" if to_ingest else " (nothing new to process)") + " ---")
+    # One count per run, for the report; the pipeline itself never queries the collection size
+    report = metrics.report(
+        pdf_directory=pdf_directory,
+        config={"num_workers": num_workers, "batch_size": batch_size, "queue_depth": queue_depth,
+                "dedup": dedup, "dedup_threshold": dedup_threshold, "extractor": extractor,
+                "chunking": chunking},
+        files_to_ingest=len(to_ingest), files_unchanged=unchanged, files_removed=len(removed),
+        dedup=deduplicator.stats() if deduplicator else None,
+        collection_count=vector_store._collection.count(),
+    )
+    changed = report["counters"].get("files_committed", 0) or report["counters"].get("files_rolled_back", 0) or removed \
+        or report["counters"].get("chunks_retagged", 0)
+    # The flat backend's ANN index (VECTOR_INDEX_MODE) is saved with every row of this run, so the
+    # serving process doesn't scan the new rows exactly; Chroma persists on its own
+    flush = getattr(vector_store, "flush", None)
+    if flush is not None and flush():
+        report["ann_index"] = vector_store._collection.stats()["ann"]
+        changed = True
+    if lexical_index_path and (changed or not os.path.exists(lexical_index_path)):
+        print(f"Rebuilding the lexical (BM25) index over {report['collection_count']} chunks...")
         try:
-            existing_docs = vector_store.get(where={"source": pdf_filename}, include=[]) # Only need IDs or count
-            if existing_docs and existing_docs.get('ids') and len(existing_docs['ids']) > 0:
-                print(f"Document '{pdf_filename}' seems to be already processed ({len(existing_docs['ids'])} chunks found). Skipping.")
-                continue # Skip to the next PDF
-            else:
-                 print(f"Document '{pdf_filename}' not found in store or has no chunks. Processing.")
+            start = time.perf_counter()
+            report["lexical_index"] = build_lexical_index(vector_store._collection, lexical_index_path, tags_of=chunk_categories)
+            report["lexical_index"]["seconds"] = round(time.perf_counter() - start, 3)
+            print(f"Lexical index saved to {lexical_index_path}: {report['lexical_index']}")
+            changed = True # The serving process must reload it even if no chunk changed
         except Exception as e:
-             print(f"Error checking existence of '{pdf_filename}' in vector store: {e}. Attempting to re-process.")
-             # import traceback; traceback.print_exc() # Uncomment for detailed error
-             # Continue processing if check fails
+            print(f"Error building the lexical index at {lexical_index_path}: {e}")
+    if changed and generation_path:
+        try:
+            report["index_generation"] = publish_index_generation(generation_path, collection_count=report["collection_count"])
+        except OSError as e:
+            print(f"Error publishing index generation to {generation_path}: {e}")
+    print_report_summary(report)
+    print(f"Current total documents in collection '{CHROMA_COLLECTION_NAME}': {report['collection_count']}")
+    if report_path:
+        try:
+            write_report(report, report_path)
+        except OSError as e:
+            print(f"Error writing ingestion run report to {report_path}: {e}")
 
+    if profiler:
+        profiler.disable()
+        _dump_profile([profiler] + writer_profiles, profile_path)
+    return report
 
-        # 1. Extract Text
-        raw_text = extract_text_from_pdf(pdf_path)
-        if not raw_text:
-            print(f"No text extracted from {pdf_filename}. Skipping.")
-            continue
 
-        # 2. Clean Text
-        cleaned_text = clean_text(raw_text)
-        # print(f"Cleaned text length: {len(cleaned_text)} chars.")
-
-        # 3. Chunk Text
-        # Adjust chunk_size and chunk_overlap based on your content and embedding model's preferences
-        # Smaller chunks capture more local context but might lose broader context.
-        # Overlap helps prevent splitting important sentences/phrases.
-        # 1000 chars, 150 overlap is a common starting point.
-        text_chunks = chunk_text_recursive(cleaned_text, chunk_size=1000, chunk_overlap=150)
-        if not text_chunks:
-            print(f"No chunks generated for {pdf_filename}. Skipping.")
+def _recover_interrupted_files(pdf_files: List[str], manifest: IngestionManifest, manifest_entries: dict,
+                               to_ingest: List[dict], refreshed: List[dict], vector_store, deduplicator,
+                               metrics: IngestionMetrics, extractor: str = PDF_EXTRACTOR,
+                               chunking: str = chunking_fingerprint(CHUNK_SIZE, CHUNK_OVERLAP)):
+    """
+    Uses the journal left by interrupted runs. A file still pending in the same version resumes from
+    its last committed chunk (entry["resume_from"]), provided it is extracted with the same engine and
+    chunked the same way (chunking fingerprint): otherwise its chunks wouldn't line up with the ones
+    already written. Any other partially written version is rolled back.
+    If the interrupted run had already replaced the recorded version's chunks, that version is queued
+    for re-ingestion so the store never stays silently incomplete. Mutates to_ingest and refreshed.
+    """
+    journal = manifest.journal_snapshot()
+    if not journal:
+        return
+    pending = {entry["filename"]: entry for entry in to_ingest}
+    on_disk = {os.path.basename(path): path for path in pdf_files}
+
+    for filename, state in journal.items():
+        entry = pending.get(filename)
+        same_chunks = state["extractor"] == extractor and state["chunking"] == chunking
+        if entry and entry["file_hash"] == state["file_hash"] and same_chunks:
+            entry["resume_from"] = state["chunks_committed"]
+            metrics.incr("files_resumed")
+            print(f"Resuming interrupted file '{filename}' from chunk {state['chunks_committed']} "
+                  f"({state['batches_committed']} batches already committed).")
             continue
 
-        print(f"Generated {len(text_chunks)} chunks for {pdf_filename}.")
-
-        # 4. Prepare Metadatas for each chunk
-        # This helps in filtering or identifying sources later
-        metadatas = [{"source": pdf_filename, "chunk_num": i, "category": "General JORADP"} for i in range(len(text_chunks))]
-        # You could potentially add category metadata here if you know the PDF's category (e.g., all Civil Law PDFs get category="Civil Law")
-        # But for general JORADP, "General JORADP" might be fine.
-
-        # 5. Add Chunks to Vector Store (this also handles embedding)
-        # vector_store.add_texts handles embedding the texts using the provided embedding_function
-        # and then stores the texts and their embeddings.
+        if entry and entry["file_hash"] == state["file_hash"]:
+            print(f"Not resuming '{filename}': it was being chunked with {state['extractor']} / {state['chunking']}, "
+                  f"this run uses {extractor} / {chunking}.")
+        print(f"Rolling back {state['chunks_written']} chunks of interrupted ingestion of '{filename}'.")
         try:
-            print(f"Adding {len(text_chunks)} chunks from '{pdf_filename}' to vector store...")
-            vector_store.add_texts(texts=text_chunks, metadatas=metadatas)
-            # vector_store.persist() # Recent ChromaDB versions auto-persist. This line might give a deprecation warning or not be needed.
-            print(f"Successfully added chunks from '{pdf_filename}'.") # Updated message
-            print(f"Current total documents in collection '{CHROMA_COLLECTION_NAME}': {vector_store._collection.count()}")
+            with metrics.timed("delete"):
+                delete_file_chunks(vector_store, filename, state["file_hash"], state["chunks_written"], deduplicator)
+            manifest.clear_journal(filename)
+            metrics.incr("files_rolled_back")
         except Exception as e:
-            print(f"Error adding texts from '{pdf_filename}' to vector store: {e}")
-            # import traceback; traceback.print_exc()
-            # Potentially log which document failed and continue with others
-
+            print(f"Error rolling back interrupted ingestion of '{filename}': {e}")
+            continue
 
-    print("\n--- PDF Processing Complete ---")
+        previous = manifest_entries.get(filename)
+        if entry or filename not in on_disk or not previous or not state["chunks_written"]:
+            continue
+        # The file is back to its recorded version, whose chunks the interrupted run had deleted
+        entry = next((e for e in refreshed if e["filename"] == filename), None)
+        if entry:
+            refreshed.remove(entry)
+        else:
+            entry = {"path": on_disk[filename], "filename": filename, "file_hash": previous["file_hash"],
+                     "size": previous["size"], "mtime_ns": previous["mtime_ns"], "previous": previous}
+        print(f"Re-ingesting '{filename}': its recorded version was partially replaced.")
+        to_ingest.append(entry)
+
+
+def _dump_profile(profilers: List[cProfile.Profile], profile_path: str):
+    """Merges per-thread profiles into one stats file and prints the hottest functions."""
+    stats = pstats.Stats(profilers[0])
+    for profiler in profilers[1:]:
+        stats.add(profiler)
+    stats.dump_stats(profile_path)
+    print(f"\ncProfile stats (main + writer threads) written to {profile_path}. Top functions by cumulative time:")
+    stats.sort_stats("cumulative").print_stats(25)
+
+
+def _run_parallel(file_entries: List[dict], writer: PipelinedChunkWriter, num_workers: int, metrics: IngestionMetrics,
+                  extractor: str = PDF_EXTRACTOR):
+    """
+    Fans PDFs out to a process pool and hands results to the writer as they complete.
+    At most 2 * num_workers files are in flight so finished-but-unwritten chunks don't pile up in memory.
+    """
+    print(f"Processing {len(file_entries)} PDFs with {num_workers} worker processes...")
+    # 'spawn' keeps workers from inheriting the parent's torch/Chroma state (forking those is unsafe)
+    mp_context = multiprocessing.get_context("spawn")
+    remaining = iter(file_entries)
+    max_in_flight = num_workers * 2
+
+    with ProcessPoolExecutor(max_workers=num_workers, mp_context=mp_context) as executor:
+        in_flight = {}
+        for entry in remaining:
+            in_flight[executor.submit(process_pdf, entry["path"], extractor=extractor)] = entry
+            if len(in_flight) >= max_in_flight:
+                break
+
+        while in_flight:
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                entry = in_flight.pop(future)
+                try:
+                    _, chunk_records, worker_metrics = future.result()
+                except Exception as e:
+                    print(f"Error processing '{entry['filename']}' in worker: {e}")
+                    metrics.incr("files_failed")
+                    continue
+                metrics.merge(worker_metrics)
+                if chunk_records is None:
+                    # Extraction failed; leave the file out of the manifest so the next run retries it
+                    metrics.incr("files_failed")
+                    continue
+                writer.submit_file(entry, chunk_records)
+
+            # Top the pool back up
+            for entry in remaining:
+                in_flight[executor.submit(process_pdf, entry["path"], extractor=extractor)] = entry
+                if len(in_flight) >= max_in_flight:
+                    break
 
 
 if __name__ == "__main__":
     # This block runs when you execute `python backend/ingestion.py`
+    parser = argparse.ArgumentParser(description="Mezan JORADP ingestion pipeline")
+    parser.add_argument("--workers", type=int, default=INGESTION_WORKERS,
+                        help="Number of processes extracting/chunking PDFs in parallel (default: $INGESTION_WORKERS or CPU count)")
+    parser.add_argument("--batch-size", type=int, default=EMBED_BATCH_SIZE,
+                        help="Chunks per embedding batch and Chroma upsert (default: $EMBED_BATCH_SIZE or %(default)s)")
+    parser.add_argument("--queue-depth", type=int, default=PIPELINE_QUEUE_DEPTH,
+                        help="Batches buffered between pipeline stages (default: $PIPELINE_QUEUE_DEPTH or %(default)s)")
+    parser.add_argument("--no-dedup", action="store_true",
+                        help="Store every chunk, even near-duplicates (default: dedup unless CHUNK_DEDUP_ENABLED=0)")
+    parser.add_argument("--extractor", choices=sorted(PDF_EXTRACTORS), default=PDF_EXTRACTOR,
+                        help="PDF text extraction engine (default: $PDF_EXTRACTOR or %(default)s). "
+                             "Compare them with benchmarks/bench_extractors.py")
+    parser.add_argument("--report", default=INGESTION_REPORT_PATH,
+                        help="Where to write the JSON run report, '' to skip (default: $INGESTION_REPORT_PATH or %(default)s)")
+    parser.add_argument("--progress-interval", type=float, default=INGESTION_PROGRESS_INTERVAL,
+                        help="Seconds between live progress lines, 0 to disable (default: %(default)s)")
+    parser.add_argument("--watch", action="store_true",
+                        help="Run as a daemon: keep the model and Chroma client loaded and ingest new or changed PDFs "
+                             "as they land in the PDF directory (inotify via watchfiles, else polling)")
+    parser.add_argument("--poll", action="store_true",
+                        help="With --watch, scan the directory periodically instead of using inotify")
+    parser.add_argument("--profile", metavar="PATH", default=None,
+                        help="Profile the run with cProfile and dump the stats to PATH. Worker processes are not "
+                             "included; use --workers 1, or sample everything with "
+                             "`py-spy record --subprocesses -o ingest.svg -- python backend/ingestion.py`")
+    parser.add_argument("--retag-categories", action="store_true",
+                        help="Re-classify the legal categories of every chunk already stored (no re-embedding), e.g. "
+                             "for a collection ingested before chunks were tagged or after the category keywords changed")
+    args = parser.parse_args()
+
     print("Starting Data Ingestion Pipeline for Mezan JORADP...")
 
     # --- IMPORTANT: Place your JORADP PDF files in the 'data/raw_pdfs/' directory ---
@@ -242,11 +573,24 @@ if __name__ == "__main__":
 
 
     # 3. Process and Store PDFs
-    run_ingestion_pipeline(RAW_PDFS_DIR, db, embedding_model)
+    def run_once():
+        return run_ingestion_pipeline(RAW_PDFS_DIR, db, embedding_model, num_workers=args.workers,
+                                      batch_size=args.batch_size, queue_depth=args.queue_depth,
+                                      dedup=CHUNK_DEDUP_ENABLED and not args.no_dedup, report_path=args.report,
+                                      progress_interval=args.progress_interval, profile_path=args.profile,
+                                      extractor=args.extractor, retag_categories=args.retag_categories)
+
+    if args.watch:
+        # Imported lazily: only the daemon needs the watcher (and optionally watchfiles)
+        from ingestion_daemon import run_watch_loop, WATCH_FORCE_POLLING
+        run_watch_loop(RAW_PDFS_DIR, run_once, force_polling=args.poll or WATCH_FORCE_POLLING)
+        exit(0)
+
+    report = run_once()
 
     print("\nData Ingestion Pipeline Finished.")
     print(f"Vector store data is persisted in: {VECTOR_STORE_DIR}")
-    print(f"Total documents in collection '{CHROMA_COLLECTION_NAME}': {db._collection.count()}")
+    print(f"Total documents in collection '{CHROMA_COLLECTION_NAME}': {report['collection_count']}")
 
     # --- Example: How to query the store directly (for testing) ---
     # You can uncomment this block and run the script again to test retrieval
@@ -0,0 +1,137 @@
+# backend/ingestion_daemon.py
+
+import os
+import time
+import signal
+import threading
+from typing import Callable, Dict, Tuple
+
+
+# Seconds between directory scans when inotify (watchfiles) is unavailable
+WATCH_POLL_INTERVAL = float(os.getenv("INGESTION_WATCH_POLL_INTERVAL", 5.0))
+# A PDF must keep the same size and mtime this long before it is ingested (copies/downloads in progress)
+WATCH_SETTLE_SECONDS = float(os.getenv("INGESTION_WATCH_SETTLE_SECONDS", 2.0))
+# Groups bursts of filesystem events (e.g. a whole issue batch being copied) into one ingestion run
+WATCH_DEBOUNCE_MS = int(os.getenv("INGESTION_WATCH_DEBOUNCE_MS", 1600))
+WATCH_FORCE_POLLING = os.getenv("INGESTION_WATCH_FORCE_POLLING", "0") == "1"
+
+
+def scan_pdf_directory(directory: str) -> Dict[str, Tuple[int, int]]:
+    """filename -> (size, mtime_ns) for every PDF directly in `directory`."""
+    snapshot = {}
+    try:
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.is_file() and entry.name.lower().endswith(".pdf"):
+                    stat = entry.stat()
+                    snapshot[entry.name] = (stat.st_size, stat.st_mtime_ns)
+    except FileNotFoundError:
+        pass
+    return snapshot
+
+
+def _is_pdf_change(change, path: str) -> bool:
+    return path.lower().endswith(".pdf")
+
+
+class PdfDirectoryWatcher:
+    """
+    Blocks until the PDFs in a directory change, using inotify through watchfiles when available and
+    falling back to periodic scans otherwise (missing package, inotify watch limit, network mounts).
+    """
+
+    def __init__(self, directory: str, stop_event: threading.Event, force_polling: bool = WATCH_FORCE_POLLING,
+                 poll_interval: float = WATCH_POLL_INTERVAL, debounce_ms: int = WATCH_DEBOUNCE_MS):
+        self.directory = directory
+        self.stop_event = stop_event
+        self.poll_interval = poll_interval
+        self.debounce_ms = debounce_ms
+        self._events = None
+        if not force_polling:
+            try:
+                from watchfiles import watch
+                self._events = watch(directory, watch_filter=_is_pdf_change, debounce=debounce_ms,
+                                     stop_event=stop_event, raise_interrupt=False)
+                self.mode = "inotify"
+            except ImportError:
+                print("watchfiles is not installed; watching the PDF directory by polling.")
+        if self._events is None:
+            self.mode = "polling"
+        self._snapshot = {}
+
+    def mark(self):
+        """Remembers the directory state an ingestion run is about to process."""
+        self._snapshot = scan_pdf_directory(self.directory)
+
+    def wait_for_change(self) -> bool:
+        """Returns True once something changed since mark(), False if the daemon is stopping."""
+        if scan_pdf_directory(self.directory) != self._snapshot:
+            # Arrived while the last run was busy (and possibly before inotify was listening)
+            return True
+        if self._events is not None:
+            try:
+                for _ in self._events:
+                    return not self.stop_event.is_set()
+                return False
+            except Exception as e:
+                print(f"File watcher failed ({e}); falling back to polling every {self.poll_interval:.0f}s.")
+                self._events = None
+                self.mode = "polling"
+
+        while not self.stop_event.wait(self.poll_interval):
+            snapshot = scan_pdf_directory(self.directory)
+            if snapshot != self._snapshot:
+                self._snapshot = snapshot
+                return True
+        return False
+
+    def wait_until_stable(self, settle_seconds: float = WATCH_SETTLE_SECONDS):
+        """Waits until no PDF changed size or mtime for settle_seconds, so half-copied files aren't ingested."""
+        snapshot = scan_pdf_directory(self.directory)
+        while not self.stop_event.wait(settle_seconds):
+            current = scan_pdf_directory(self.directory)
+            if current == snapshot:
+                break
+            snapshot = current
+
+
+def run_watch_loop(pdf_directory: str, run_once: Callable[[], dict], force_polling: bool = WATCH_FORCE_POLLING,
+                   poll_interval: float = WATCH_POLL_INTERVAL, settle_seconds: float = WATCH_SETTLE_SECONDS):
+    """
+    Long-running incremental ingestion. The caller builds the embedding model and the Chroma client
+    once and passes `run_once` (an incremental run_ingestion_pipeline call reusing them); it runs once
+    to catch up, then again each time the directory settles after a change. The manifest diff makes
+    each run cost one stat() per unchanged file, so only new or changed issues are processed.
+    SIGTERM/SIGINT let the current run finish (or be resumed from the journal) and then stop.
+    """
+    stop_event = threading.Event()
+
+    def _request_stop(signum, frame):
+        if stop_event.is_set():
+            raise KeyboardInterrupt # Second Ctrl-C: stop now, the journal resumes the run next time
+        print(f"\nReceived signal {signum}; stopping after the current ingestion run (again to stop now).")
+        stop_event.set()
+
+    previous_handlers = {sig: signal.signal(sig, _request_stop) for sig in (signal.SIGTERM, signal.SIGINT)}
+    try:
+        watcher = PdfDirectoryWatcher(pdf_directory, stop_event, force_polling=force_polling, poll_interval=poll_interval)
+        print(f"Watching {pdf_directory} for new or changed PDFs ({watcher.mode}). Press Ctrl-C to stop.")
+
+        while not stop_event.is_set():
+            started = time.perf_counter()
+            watcher.mark()
+            try:
+                run_once()
+            except Exception as e:
+                # One bad run (unreadable PDF, transient Chroma error) must not take the daemon down
+                print(f"Error during incremental ingestion run: {e}")
+                import traceback; traceback.print_exc()
+            print(f"Incremental run finished in {time.perf_counter() - started:.1f}s; waiting for changes...")
+
+            if not watcher.wait_for_change():
+                break
+            watcher.wait_until_stable(settle_seconds)
+    finally:
+        for sig, handler in previous_handlers.items():
+            signal.signal(sig, handler)
+    print("Ingestion daemon stopped.")
@@ -0,0 +1,186 @@
+# backend/ingestion_manifest.py
+
+import os
+import sqlite3
+import hashlib
+import time
+from typing import Dict, List, Tuple
+
+
+# Read files in 1 MiB blocks when hashing so large Journals are never fully loaded in memory
+HASH_BLOCK_SIZE = 1024 * 1024
+
+
+# --- Hashing and Chunk IDs ---
+def compute_file_hash(path: str) -> str:
+    """Returns the SHA-256 hex digest of a file's content."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def make_chunk_id(filename: str, file_hash: str, chunk_num: int) -> str:
+    """
+    Deterministic chunk ID: the same file content always yields the same IDs, so retries upsert instead
+    of duplicating. The filename is part of it because the manifest is keyed by filename: identical
+    PDFs under two names are two manifest entries and must not share (and delete) each other's chunks.
+    """
+    return f"{filename}:{file_hash}:{chunk_num}"
+
+
+def make_chunk_ids(filename: str, file_hash: str, chunk_count: int) -> List[str]:
+    return [make_chunk_id(filename, file_hash, i) for i in range(chunk_count)]
+
+
+# --- Manifest ---
+class IngestionManifest:
+    """
+    Local SQLite record of every ingested PDF: filename -> content hash, chunk count and the
+    (size, mtime) seen when it was hashed. Lets ingestion diff the whole corpus in one pass
+    instead of querying the vector store per file.
+
+    It also holds the ingestion journal: for each file version being written but not yet recorded,
+    how many of its leading chunks are durably in the vector store (chunks_committed), the highest
+    chunk number any written batch reached (chunks_written), and the extraction engine and chunking
+    fingerprint the chunks came from. An interrupted run resumes each file from chunks_committed; recording the file in the
+    manifest clears its journal row in the same transaction.
+    """
+
+    def __init__(self, db_path: str):
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self.db_path = db_path
+        # The pipelined writer commits files from its own thread; access is still serialized
+        self.conn = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+        # WAL lets the dedup stage's connection read while this one commits
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS files (
+                filename    TEXT PRIMARY KEY,
+                file_hash   TEXT NOT NULL,
+                chunk_count INTEGER NOT NULL,
+                size        INTEGER NOT NULL,
+                mtime_ns    INTEGER NOT NULL,
+                ingested_at REAL NOT NULL
+            )
+        """)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS journal (
+                filename          TEXT PRIMARY KEY,
+                file_hash         TEXT NOT NULL,
+                chunks_committed  INTEGER NOT NULL,
+                chunks_written    INTEGER NOT NULL,
+                batches_committed INTEGER NOT NULL,
+                started_at        REAL NOT NULL,
+                updated_at        REAL NOT NULL,
+                extractor         TEXT,
+                chunking          TEXT
+            )
+        """)
+        self._add_missing_column("journal", "extractor", "TEXT")
+        self._add_missing_column("journal", "chunking", "TEXT")
+        self.conn.commit()
+
+    def _add_missing_column(self, table: str, column: str, declaration: str):
+        """Upgrades a table created by an older version; existing rows get NULL."""
+        columns = {row[1] for row in self.conn.execute(f"PRAGMA table_info({table})")}
+        if column not in columns:
+            self.conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {declaration}")
+
+    def snapshot(self) -> Dict[str, dict]:
+        """Returns all manifest entries keyed by filename."""
+        rows = self.conn.execute("SELECT filename, file_hash, chunk_count, size, mtime_ns FROM files").fetchall()
+        return {
+            filename: {"file_hash": file_hash, "chunk_count": chunk_count, "size": size, "mtime_ns": mtime_ns}
+            for filename, file_hash, chunk_count, size, mtime_ns in rows
+        }
+
+    def record_file(self, filename: str, file_hash: str, chunk_count: int, size: int, mtime_ns: int):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO files (filename, file_hash, chunk_count, size, mtime_ns, ingested_at) VALUES (?, ?, ?, ?, ?, ?)",
+            (filename, file_hash, chunk_count, size, mtime_ns, time.time()),
+        )
+        self.conn.execute("DELETE FROM journal WHERE filename = ?", (filename,))
+        self.conn.commit()
+
+    def remove_file(self, filename: str):
+        self.conn.execute("DELETE FROM files WHERE filename = ?", (filename,))
+        self.conn.commit()
+
+    # --- Journal ---
+    def journal_snapshot(self) -> Dict[str, dict]:
+        """Returns the journal rows of files left unfinished by earlier runs, keyed by filename."""
+        rows = self.conn.execute("SELECT filename, file_hash, extractor, chunking, chunks_committed, chunks_written, batches_committed "
+                                 "FROM journal").fetchall()
+        return {
+            filename: {"file_hash": file_hash, "extractor": extractor, "chunking": chunking, "chunks_committed": chunks_committed,
+                       "chunks_written": chunks_written, "batches_committed": batches_committed}
+            for filename, file_hash, extractor, chunking, chunks_committed, chunks_written, batches_committed in rows
+        }
+
+    def journal_batch(self, progress: List[Tuple[str, str, str, str, int, int]]):
+        """
+        Records one written batch, as (filename, file_hash, extractor, chunking, chunks_committed,
+        chunks_written) per file it touched, in a single transaction.
+        """
+        now = time.time()
+        self.conn.executemany("""
+            INSERT INTO journal (filename, file_hash, extractor, chunking, chunks_committed, chunks_written, batches_committed, started_at, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, 1, ?, ?)
+            ON CONFLICT(filename) DO UPDATE SET
+                file_hash = excluded.file_hash,
+                extractor = excluded.extractor,
+                chunking = excluded.chunking,
+                chunks_committed = excluded.chunks_committed,
+                chunks_written = MAX(chunks_written, excluded.chunks_written),
+                batches_committed = batches_committed + 1,
+                updated_at = excluded.updated_at
+        """, [(filename, file_hash, extractor, chunking, committed, written, now, now)
+              for filename, file_hash, extractor, chunking, committed, written in progress])
+        self.conn.commit()
+
+    def clear_journal(self, filename: str):
+        self.conn.execute("DELETE FROM journal WHERE filename = ?", (filename,))
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+
+# --- Corpus Diff ---
+def diff_corpus(pdf_paths: List[str], manifest_entries: Dict[str, dict]) -> Tuple[List[dict], List[dict], Dict[str, dict]]:
+    """
+    Compares the PDFs on disk against the manifest in a single pass.
+
+    Files whose size and mtime match the manifest reuse the stored hash, so an unchanged corpus
+    is diffed with one stat() per file and no reads. Returns:
+      - to_ingest: new or changed files, as dicts with path/filename/file_hash/size/mtime_ns and
+        'previous' (the old manifest entry, or None for new files)
+      - refreshed: files that were touched but whose content hash is unchanged; only their
+        manifest size/mtime need updating
+      - removed: manifest entries whose file is no longer on disk, keyed by filename
+    """
+    to_ingest = []
+    refreshed = []
+    seen = set()
+
+    for pdf_path in pdf_paths:
+        filename = os.path.basename(pdf_path)
+        seen.add(filename)
+        stat = os.stat(pdf_path)
+        previous = manifest_entries.get(filename)
+
+        if previous and previous["size"] == stat.st_size and previous["mtime_ns"] == stat.st_mtime_ns:
+            continue
+
+        entry = {"path": pdf_path, "filename": filename, "file_hash": compute_file_hash(pdf_path),
+                 "size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "previous": previous}
+        if previous and previous["file_hash"] == entry["file_hash"]:
+            # Re-downloaded or touched, but byte-identical: nothing to re-embed
+            refreshed.append(entry)
+        else:
+            to_ingest.append(entry)
+
+    removed = {filename: entry for filename, entry in manifest_entries.items() if filename not in seen}
+    return to_ingest, refreshed, removed
@@ -0,0 +1,178 @@
+# backend/ingestion_metrics.py
+
+import os
+import sys
+import json
+import time
+import threading
+import statistics
+from contextlib import contextmanager
+from typing import Dict, List
+
+
+# Stages whose individual samples are kept, so the report can give per-batch latency percentiles
+LATENCY_STAGES = ("embed", "write")
+# Seconds between two live progress lines
+DEFAULT_PROGRESS_INTERVAL = 2.0
+
+
+def _percentile(sorted_samples: List[float], fraction: float) -> float:
+    return sorted_samples[min(len(sorted_samples) - 1, int(len(sorted_samples) * fraction))]
+
+
+class IngestionMetrics:
+    """
+    Per-stage timers and counters for one ingestion run.
+
+    Stages (seconds spent, number of calls):
+        extract - PDF page text extraction         clean - text normalization
+        split   - article-aware chunking           dedup - near-duplicate index lookups
+        embed   - embedding forward passes          write - Chroma upserts
+        delete  - removal of stale chunks           commit - manifest updates
+    Counters: files, files_committed, files_failed, bytes_read, pages, empty_pages, failed_pages,
+    chunks, chunks_embedded, chunks_written, embed_batches, write_batches.
+
+    The object is shared by the producer and both writer threads, so updates go through a lock.
+    Worker processes fill their own instance and the parent merges its snapshot().
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started_at = time.time()
+        self._start = time.perf_counter()
+        self.stage_seconds: Dict[str, float] = {}
+        self.stage_calls: Dict[str, int] = {}
+        self.samples: Dict[str, List[float]] = {stage: [] for stage in LATENCY_STAGES}
+        self.counters: Dict[str, int] = {}
+        self.total_files = 0
+        self._progress_thread = None
+        self._progress_stop = threading.Event()
+
+    # --- Recording ---
+    @contextmanager
+    def timed(self, stage: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(stage, time.perf_counter() - start)
+
+    def add_time(self, stage: str, seconds: float, calls: int = 1):
+        with self._lock:
+            self.stage_seconds[stage] = self.stage_seconds.get(stage, 0.0) + seconds
+            self.stage_calls[stage] = self.stage_calls.get(stage, 0) + calls
+            if stage in self.samples and calls == 1:
+                self.samples[stage].append(seconds)
+
+    def incr(self, counter: str, amount: int = 1):
+        with self._lock:
+            self.counters[counter] = self.counters.get(counter, 0) + amount
+
+    def count(self, counter: str) -> int:
+        return self.counters.get(counter, 0)
+
+    # --- Worker processes ---
+    def snapshot(self) -> dict:
+        """Picklable state, returned by pool workers so the parent can merge it."""
+        with self._lock:
+            return {"stage_seconds": dict(self.stage_seconds), "stage_calls": dict(self.stage_calls),
+                    "counters": dict(self.counters)}
+
+    def merge(self, snapshot: dict):
+        with self._lock:
+            for stage, seconds in snapshot["stage_seconds"].items():
+                self.stage_seconds[stage] = self.stage_seconds.get(stage, 0.0) + seconds
+                self.stage_calls[stage] = self.stage_calls.get(stage, 0) + snapshot["stage_calls"].get(stage, 0)
+            for counter, value in snapshot["counters"].items():
+                self.counters[counter] = self.counters.get(counter, 0) + value
+
+    # --- Live progress ---
+    def progress_line(self) -> str:
+        elapsed = max(time.perf_counter() - self._start, 1e-9)
+        embed = sorted(self.samples["embed"][-50:])
+        write = sorted(self.samples["write"][-50:])
+        return (f"[ingest {elapsed:6.0f}s] files {self.count('files_committed')}/{self.total_files} | "
+                f"pages {self.count('pages')} ({self.count('pages') / elapsed:.1f}/s, {self.count('failed_pages')} failed) | "
+                f"chunks {self.count('chunks')} ({self.count('chunks') / elapsed:.1f}/s) | "
+                f"written {self.count('chunks_written')} | "
+                f"embed p50 {statistics.median(embed) * 1000 if embed else 0:.0f}ms | "
+                f"write p50 {statistics.median(write) * 1000 if write else 0:.0f}ms")
+
+    def start_progress(self, total_files: int, interval: float = DEFAULT_PROGRESS_INTERVAL):
+        """Prints a progress line every `interval` seconds (rewritten in place on a terminal)."""
+        self.total_files = total_files
+        if interval <= 0:
+            return
+        self._progress_stop.clear()
+        self._progress_thread = threading.Thread(target=self._progress_loop, args=(interval,),
+                                                 name="ingestion-progress", daemon=True)
+        self._progress_thread.start()
+
+    def _progress_loop(self, interval: float):
+        in_place = sys.stdout.isatty()
+        while not self._progress_stop.wait(interval):
+            if in_place:
+                print("\r" + self.progress_line(), end="", flush=True)
+            else:
+                print(self.progress_line(), flush=True)
+
+    def stop_progress(self):
+        if self._progress_thread is None:
+            return
+        self._progress_stop.set()
+        self._progress_thread.join()
+        self._progress_thread = None
+        if sys.stdout.isatty():
+            print()
+
+    # --- Report ---
+    def report(self, **extra) -> dict:
+        """Machine-readable summary of the run; `extra` fields (config, collection size...) are added as-is."""
+        elapsed = time.perf_counter() - self._start
+        with self._lock:
+            stages = {}
+            for stage, seconds in sorted(self.stage_seconds.items()):
+                calls = self.stage_calls.get(stage, 0)
+                stages[stage] = {"seconds": round(seconds, 4), "calls": calls,
+                                 "mean_ms": round(seconds / calls * 1000, 3) if calls else 0.0}
+                samples = sorted(self.samples.get(stage, []))
+                if samples:
+                    stages[stage].update({"p50_ms": round(_percentile(samples, 0.50) * 1000, 3),
+                                          "p95_ms": round(_percentile(samples, 0.95) * 1000, 3),
+                                          "max_ms": round(samples[-1] * 1000, 3)})
+            counters = dict(sorted(self.counters.items()))
+
+        rate = lambda value: round(value / elapsed, 3) if elapsed > 0 else 0.0
+        return {
+            "started_at": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.started_at)),
+            "elapsed_seconds": round(elapsed, 3),
+            "counters": counters,
+            "throughput": {
+                "pages_per_sec": rate(counters.get("pages", 0)),
+                "chunks_per_sec": rate(counters.get("chunks", 0)),
+                "chunks_written_per_sec": rate(counters.get("chunks_written", 0)),
+                "mb_read_per_sec": rate(counters.get("bytes_read", 0) / 1e6),
+            },
+            # With worker processes, extract/clean/split seconds are summed across workers
+            "stages": stages,
+            **extra,
+        }
+
+
+def write_report(report: dict, path: str):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"Ingestion run report written to {path}")
+
+
+def print_report_summary(report: dict):
+    counters = report["counters"]
+    throughput = report["throughput"]
+    print(f"Ingestion took {report['elapsed_seconds']:.1f}s: {counters.get('files', 0)} files, "
+          f"{counters.get('bytes_read', 0) / 1e6:.1f} MB, {counters.get('pages', 0)} pages "
+          f"({throughput['pages_per_sec']:.1f}/s, {counters.get('failed_pages', 0)} failed), "
+          f"{counters.get('chunks', 0)} chunks ({throughput['chunks_per_sec']:.1f}/s).")
+    for stage, values in report["stages"].items():
+        latency = f", p50 {values['p50_ms']:.1f}ms, p95 {values['p95_ms']:.1f}ms" if "p50_ms" in values else ""
+        print(f"  {stage:<8} {values['seconds']:9.2f}s over {values['calls']} calls{latency}")
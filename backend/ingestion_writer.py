@@ -0,0 +1,351 @@
+# backend/ingestion_writer.py
+
+import threading
+import queue
+import cProfile
+from typing import Iterable
+
+from ingestion_manifest import IngestionManifest, make_chunk_id, make_chunk_ids
+from legal_categories import category_metadata
+from ingestion_metrics import IngestionMetrics
+
+
+# Number of chunks embedded per forward pass and written per Chroma upsert
+DEFAULT_EMBED_BATCH_SIZE = 64
+# How many batches may wait between stages before the upstream stage blocks
+DEFAULT_QUEUE_DEPTH = 4
+
+# Marks the end of the chunk stream / batch stream
+_STOP = object()
+
+
+def delete_file_chunks(vector_store, filename: str, file_hash: str, chunk_count: int, deduplicator=None):
+    """
+    Deletes the chunks of one ingested file version by their deterministic IDs.
+    With dedup enabled, canonical chunks that other files still reference are kept, and canonical
+    chunks the file inherited from an earlier owner are deleted along with its own.
+    """
+    retained, dropped = deduplicator.release_file(filename, file_hash) if deduplicator else ({}, [])
+    _point_to_new_owner(vector_store, retained)
+    own_ids = [chunk_id for chunk_id in make_chunk_ids(filename, file_hash, chunk_count) if chunk_id not in retained]
+    ids = list(dict.fromkeys(own_ids + dropped))
+    if ids:
+        vector_store.delete(ids=ids)
+
+
+def _point_to_new_owner(vector_store, retained: dict):
+    """Kept canonical vectors now stand for another file's occurrence; cite that one instead."""
+    if retained:
+        vector_store._collection.update(
+            ids=list(retained),
+            metadatas=[{key: value for key, value in owner.items() if value is not None} for owner in retained.values()],
+        )
+
+
+class PipelinedChunkWriter:
+    """
+    Streams chunks into the vector store through two background stages:
+
+        submit_file() -> [chunk queue] -> embed thread (dedup, embed) -> [batch queue] -> write thread -> Chroma
+
+    Chunks are embedded in fixed-size batches (which may span files) and each batch is written with a
+    single upsert, so PDF parsing, the embedding forward pass and Chroma writes overlap. Both queues are
+    bounded, so a slow stage applies back-pressure instead of letting chunks accumulate in memory.
+
+    Stage timings and counters go to an IngestionMetrics shared with the producer.
+
+    With a ChunkDeduplicator, each batch is checked against the near-duplicate index before embedding
+    and only chunks that start a new cluster are embedded and written.
+
+    A file is recorded in the manifest only once its last batch has been written; files with a failed
+    batch are left out of the manifest so the next run retries them.
+
+    Every written batch is also journaled in the manifest DB: per file, how many leading chunks are
+    durably stored, and the file_entry's "extractor" and "chunking" fingerprint they were produced with.
+    A file_entry carrying "resume_from" (set from that journal after an interrupted run with the same
+    extractor and chunking) skips its first resume_from chunks instead of re-embedding them, and keeps
+    what was written.
+    """
+
+    def __init__(self, vector_store, embedding_function, manifest: IngestionManifest,
+                 batch_size: int = DEFAULT_EMBED_BATCH_SIZE, queue_depth: int = DEFAULT_QUEUE_DEPTH,
+                 deduplicator=None, metrics: IngestionMetrics = None, profile: bool = False):
+        self.vector_store = vector_store
+        self.embedding_function = embedding_function
+        self.manifest = manifest
+        self.deduplicator = deduplicator
+        self.batch_size = max(1, batch_size)
+        self.metrics = metrics or IngestionMetrics()
+
+        # Chunk queue holds individual chunks, batch queue holds embedded batches
+        self._chunk_queue = queue.Queue(maxsize=self.batch_size * max(1, queue_depth))
+        self._batch_queue = queue.Queue(maxsize=max(1, queue_depth))
+        # cProfile only sees the thread it runs in, so with profile=True each stage records its own
+        self.profiles = [] if profile else None
+        self._embed_thread = threading.Thread(target=self._run_stage, args=(self._embed_loop,), name="ingestion-embed", daemon=True)
+        self._write_thread = threading.Thread(target=self._run_stage, args=(self._write_loop,), name="ingestion-write", daemon=True)
+
+        self._seen_files = set()     # Embed stage: files whose first chunk has been seen
+        self._retained_ids = {}      # filename -> canonical IDs of stale registrations other files still use
+        self._started_files = set()  # Write stage: files whose old chunks have been cleared
+        self._failed_files = set()
+        self._committed_through = {} # Write stage: filename -> leading chunks durably written (journal)
+        self.files_committed = 0
+        self.chunks_written = 0
+
+    # --- Producer side ---
+    def start(self):
+        self._embed_thread.start()
+        self._write_thread.start()
+
+    def _run_stage(self, loop):
+        if self.profiles is None:
+            loop()
+            return
+        profiler = cProfile.Profile()
+        try:
+            profiler.runcall(loop)
+        finally:
+            self.profiles.append(profiler)
+
+    def submit_file(self, file_entry: dict, chunk_records: Iterable[dict]) -> bool:
+        """
+        Queues the chunk records ({"text", "page"}) of one file, consuming them lazily so a generator
+        can stream pages straight into the pipeline. Blocks while the pipeline is full.
+        If the records fail midway, the file is marked failed and never committed to the manifest.
+        """
+        chunk_num = 0
+        resume_from = file_entry.get("resume_from", 0)
+        ok = True
+        try:
+            for record in chunk_records:
+                # resume_from is only set when the journal's extractor and chunking fingerprint match this
+                # run's, and chunking is deterministic, so chunk numbers line up with the interrupted run's
+                if chunk_num >= resume_from:
+                    self._chunk_queue.put((file_entry, chunk_num, record))
+                    self.metrics.incr("chunks")
+                else:
+                    self.metrics.incr("chunks_resumed")
+                chunk_num += 1
+        except Exception as e:
+            print(f"Error reading chunks of '{file_entry['filename']}': {e}")
+            self._failed_files.add(file_entry["filename"])
+            ok = False
+        # End-of-file marker carries the final chunk count
+        self._chunk_queue.put((file_entry, chunk_num, None))
+        return ok
+
+    def close(self):
+        """Flushes the remaining partial batch and waits for both stages to finish."""
+        self._chunk_queue.put(_STOP)
+        self._embed_thread.join()
+        self._write_thread.join()
+        print(f"Writer finished: {self.chunks_written} chunks written, {self.files_committed} files committed, "
+              f"{len(self._failed_files)} files failed.")
+        if self.deduplicator:
+            stats = self.deduplicator.stats()
+            print(f"Dedup: {stats['exact_duplicates']} exact and {stats['near_duplicates']} near duplicates out of "
+                  f"{stats['chunks_seen']} chunks; index is {stats['index_reduction']:.1%} smaller than without dedup.")
+
+    # --- Embed stage ---
+    def _embed_loop(self):
+        batch = []           # (file_entry, chunk_num, record)
+        completed = []       # (file_entry, chunk_count) whose chunks are all in this batch or earlier ones
+
+        while True:
+            item = self._chunk_queue.get()
+            if item is _STOP:
+                if batch or completed:
+                    self._emit_batch(batch, completed)
+                self._batch_queue.put(_STOP)
+                return
+
+            file_entry, chunk_num, record = item
+            if file_entry["filename"] not in self._seen_files:
+                self._seen_files.add(file_entry["filename"])
+                if self.deduplicator:
+                    self._reset_registrations(file_entry)
+            if record is None:
+                completed.append((file_entry, chunk_num))
+                continue
+
+            batch.append(item)
+            if len(batch) >= self.batch_size:
+                self._emit_batch(batch, completed)
+                batch, completed = [], []
+
+    def _reset_registrations(self, file_entry: dict):
+        pdf_filename = file_entry["filename"]
+        try:
+            if "resume_from" in file_entry:
+                # Keep the registrations of the journaled chunks, redo the ones after them
+                self.deduplicator.rollback_chunks(pdf_filename, file_entry["file_hash"], file_entry["resume_from"])
+            else:
+                # Registrations left by an interrupted attempt at this same version would make its
+                # chunks look like duplicates of themselves; drop them before registering anew
+                # (dropped clusters still stored are found by source in _delete_stale_chunks)
+                self._retained_ids[pdf_filename], _ = self.deduplicator.release_file(pdf_filename, file_entry["file_hash"])
+        except Exception as e:
+            # An exception here would end the embed thread and leave submit_file() blocked on a full queue;
+            # the file still flows through but isn't recorded, so the next run retries it
+            print(f"Error resetting dedup registrations of '{pdf_filename}': {e}")
+            self._failed_files.add(pdf_filename)
+
+    def _emit_batch(self, batch: list, completed: list):
+        # Journal progress covers every chunk of the batch, including duplicates that won't be written
+        progress = {}
+        for file_entry, chunk_num, _ in batch:
+            progress[file_entry["filename"]] = (file_entry, chunk_num + 1)
+
+        if batch and self.deduplicator:
+            with self.metrics.timed("dedup"):
+                batch = self._drop_duplicates(batch)
+
+        embeddings = None
+        if batch:
+            try:
+                with self.metrics.timed("embed"):
+                    embeddings = self.embedding_function.embed_documents([record["text"] for _, _, record in batch])
+                self.metrics.incr("embed_batches")
+                self.metrics.incr("chunks_embedded", len(batch))
+            except Exception as e:
+                print(f"Error embedding batch of {len(batch)} chunks: {e}")
+                for file_entry, _, _ in batch:
+                    self._failed_files.add(file_entry["filename"])
+        self._batch_queue.put((batch, embeddings, completed, progress))
+
+    def _drop_duplicates(self, batch: list) -> list:
+        try:
+            canonical_ids = self.deduplicator.register_many([
+                (make_chunk_id(file_entry["filename"], file_entry["file_hash"], chunk_num), record["text"], file_entry["filename"],
+                 file_entry["file_hash"], chunk_num, record.get("page"))
+                for file_entry, chunk_num, record in batch
+            ])
+        except Exception as e:
+            # Dedup is an optimization: if the index is unavailable, store the batch as-is
+            print(f"Error checking batch for duplicates, storing all {len(batch)} chunks: {e}")
+            return batch
+        return [item for item, canonical_id in zip(batch, canonical_ids) if canonical_id is None]
+
+    # --- Write stage ---
+    def _write_loop(self):
+        while True:
+            item = self._batch_queue.get()
+            if item is _STOP:
+                return
+            batch, embeddings, completed, progress = item
+
+            # Every file with a chunk in the batch replaces its previous version first, including files
+            # whose chunks were all dropped as duplicates; so a journaled file has always been started
+            started = self._begin_files([file_entry for file_entry, _ in progress.values()])
+            written = started and (not batch or (embeddings is not None and self._write_batch(batch, embeddings)))
+            if written and progress:
+                self._journal_batch(progress)
+            for file_entry, chunk_count in completed:
+                self._commit_file(file_entry, chunk_count)
+
+    def _begin_files(self, file_entries: list) -> bool:
+        try:
+            for file_entry in file_entries:
+                self._begin_file(file_entry)
+            return True
+        except Exception as e:
+            # The batch isn't written or journaled; the next batch of a failed file retries the cleanup
+            print(f"Error removing previous chunks of {len(file_entries)} files before writing their batch: {e}")
+            for file_entry in file_entries:
+                self._failed_files.add(file_entry["filename"])
+            return False
+
+    def _begin_file(self, file_entry: dict):
+        """Removes what a previous version of the file left behind, before its first new chunk is written."""
+        pdf_filename = file_entry["filename"]
+        if pdf_filename in self._started_files:
+            return
+        if "resume_from" not in file_entry:
+            # With resume_from, the interrupted run already replaced the old version; what it wrote of this one stays
+            with self.metrics.timed("delete"):
+                self._delete_stale_chunks(file_entry)
+        self._started_files.add(pdf_filename)
+
+    def _delete_stale_chunks(self, file_entry: dict):
+        pdf_filename = file_entry["filename"]
+        previous = file_entry.get("previous")
+        if previous:
+            delete_file_chunks(self.vector_store, pdf_filename, previous["file_hash"], previous["chunk_count"], self.deduplicator)
+        elif self.deduplicator:
+            # Files not yet in the manifest may still have chunks from older or interrupted runs; keep
+            # the ones that other files now reference as their canonical copy
+            retained = self._retained_ids.get(pdf_filename, {})
+            existing = self.vector_store._collection.get(where={"source": pdf_filename}, include=[])["ids"]
+            _point_to_new_owner(self.vector_store, {chunk_id: retained[chunk_id] for chunk_id in existing if chunk_id in retained})
+            stale = [chunk_id for chunk_id in existing if chunk_id not in retained]
+            if stale:
+                self.vector_store._collection.delete(ids=stale)
+        else:
+            # Files not yet in the manifest may still have random-ID chunks from older runs
+            self.vector_store._collection.delete(where={"source": pdf_filename})
+
+    def _write_batch(self, batch: list, embeddings: list) -> bool:
+        try:
+            # Upsert under deterministic IDs: re-running a partially written file overwrites instead of duplicating
+            with self.metrics.timed("write"):
+                self.vector_store._collection.upsert(
+                    ids=[make_chunk_id(file_entry["filename"], file_entry["file_hash"], chunk_num) for file_entry, chunk_num, _ in batch],
+                    embeddings=embeddings,
+                    documents=[record["text"] for _, _, record in batch],
+                    metadatas=[{"source": file_entry["filename"], "chunk_num": chunk_num, "page": record["page"],
+                                **category_metadata(record.get("categories", []))}
+                               for file_entry, chunk_num, record in batch],
+                )
+            self.chunks_written += len(batch)
+            self.metrics.incr("write_batches")
+            self.metrics.incr("chunks_written", len(batch))
+            return True
+        except Exception as e:
+            print(f"Error writing batch of {len(batch)} chunks to vector store: {e}")
+            for file_entry, _, _ in batch:
+                self._failed_files.add(file_entry["filename"])
+            return False
+
+    def _journal_batch(self, progress: dict):
+        """Advances each file's durable prefix; it stops at a file's first failed batch."""
+        rows = []
+        for pdf_filename, (file_entry, written_through) in progress.items():
+            committed = self._committed_through.get(pdf_filename, file_entry.get("resume_from", 0))
+            if pdf_filename not in self._failed_files:
+                committed = written_through
+            self._committed_through[pdf_filename] = committed
+            rows.append((pdf_filename, file_entry["file_hash"], file_entry.get("extractor"), file_entry.get("chunking"),
+                         committed, written_through))
+        try:
+            with self.metrics.timed("journal"):
+                self.manifest.journal_batch(rows)
+        except Exception as e:
+            # Losing a journal entry only means more chunks get redone if this run is interrupted
+            print(f"Error journaling batch progress: {e}")
+
+    def _commit_file(self, file_entry: dict, chunk_count: int):
+        pdf_filename = file_entry["filename"]
+        if pdf_filename in self._failed_files:
+            committed = self._committed_through.get(pdf_filename, file_entry.get("resume_from", 0))
+            print(f"Not recording '{pdf_filename}' in manifest: some of its chunks failed. "
+                  f"The next run resumes it from chunk {committed}.")
+            self.metrics.incr("files_failed")
+            if self.deduplicator:
+                try:
+                    self.deduplicator.rollback_chunks(pdf_filename, file_entry["file_hash"], committed)
+                except Exception as e:
+                    print(f"Error rolling back dedup references of '{pdf_filename}': {e}")
+            return
+        try:
+            if pdf_filename not in self._started_files:
+                # No batch went through _begin_file (no chunks, or all of them resumed), but stale
+                # chunks of the old version may still need removing
+                self._begin_file(file_entry)
+            # Files that yielded no text are recorded too, so they aren't re-extracted on every run
+            with self.metrics.timed("commit"):
+                self.manifest.record_file(pdf_filename, file_entry["file_hash"], chunk_count, file_entry["size"], file_entry["mtime_ns"])
+            self.files_committed += 1
+            self.metrics.incr("files_committed")
+        except Exception as e:
+            print(f"Error committing '{pdf_filename}': {e}")
@@ -0,0 +1,106 @@
+# backend/legal_categories.py
+
+import os
+from collections import Counter
+from typing import Dict, List, Optional
+
+from lexical_index import tokenize # Keywords are matched as index terms (normalized, accents folded, "ال" stripped)
+
+
+# --- Categories ---
+# The legal categories the chat frontend offers (selectIssue('...') in select-issue*.html), each with
+# French and Arabic keywords. A chunk is tagged with every category that has at least
+# CATEGORY_MIN_HITS keyword occurrences in it; chunks with none are only found by global searches.
+CATEGORY_KEYWORDS = {
+    "accident": (
+        "accident accidents circulation routier routiere vehicule vehicules assurance assurances assureur "
+        "indemnisation indemnite victime victimes sinistre sinistres dommages",
+        "حادث حوادث المرور السير مركبة المركبات التأمين التأمينات المؤمن تعويض التعويض الضحية الضحايا الأضرار",
+    ),
+    "penal": (
+        "penal penale penales infraction infractions delit delits contravention contraventions peine peines "
+        "amende amendes emprisonnement reclusion sanction sanctions",
+        "العقوبات عقوبة العقوبة جنحة الجنح مخالفة المخالفات غرامة الغرامة الحبس السجن",
+    ),
+    "criminal": (
+        "criminel criminelle crime crimes poursuite poursuites prevenu accuse inculpe parquet procureur "
+        "detention instruction jugement",
+        "جناية الجنايات الجزائية الجزائي المتهم النيابة وكيل التحقيق المحاكمة الجريمة الجرائم",
+    ),
+    "family": (
+        "famille familial familiale mariage divorce epoux epouse conjoint conjoints enfant enfants filiation "
+        "heritage succession successions tutelle dot pension",
+        "الأسرة الزواج الطلاق الزوج الزوجة الزوجين الحضانة النفقة الميراث التركة النسب الولاية الخلع الصداق",
+    ),
+    "property": (
+        "propriete proprietaire immobilier immobiliere immobiliers foncier fonciere terrain terrains logement "
+        "bail locataire cadastre domaine domanial urbanisme construction expropriation",
+        "الملكية المالك عقار العقار العقارية العقارات الأراضي الأرض السكن الإيجار المستأجر المسح الأملاك التعمير البناء",
+    ),
+    "business": (
+        "commerce commercial commerciale commerciaux commercant societe societes entreprise entreprises "
+        "investissement investissements banque bancaire fiscal fiscale impot impots douane douanes marches",
+        "التجارة التجاري التجارية تاجر الشركة الشركات المؤسسة المؤسسات الاستثمار البنك المصرفية الضرائب الجمارك الصفقات",
+    ),
+}
+# Other names the frontend uses for the same categories (search pages, older chat code)
+CATEGORY_ALIASES = {"commercial": "business", "commerce": "business", "crime": "criminal", "famille": "family"}
+# Category stored on chunks that match no category
+GENERAL_CATEGORY = "general"
+CATEGORY_MIN_HITS = int(os.getenv("CATEGORY_MIN_HITS", 2))
+
+_CATEGORY_TERMS = {category: frozenset(tokenize(" ".join(keywords))) for category, keywords in CATEGORY_KEYWORDS.items()}
+
+
+def classify_text(text: str, min_hits: int = CATEGORY_MIN_HITS) -> List[str]:
+    """Categories whose keywords occur at least min_hits times in text, most hits first."""
+    counts = Counter(tokenize(text))
+    hits = {category: sum(counts[term] for term in terms) for category, terms in _CATEGORY_TERMS.items()}
+    return sorted((category for category, count in hits.items() if count >= min_hits), key=lambda category: -hits[category])
+
+
+# --- Chunk metadata ---
+# Chroma metadata values are scalars, so each category is a boolean flag ("cat_family": True) that
+# query-time filters select on; "category" holds the best-matching one for display and debugging.
+def _flag(category: str) -> str:
+    return f"cat_{category}"
+
+
+def category_metadata(categories: List[str]) -> Dict[str, object]:
+    """Metadata fields for a chunk tagged with categories (best first). Every flag is set, so updates overwrite stale tags."""
+    return {"category": categories[0] if categories else GENERAL_CATEGORY,
+            **{_flag(category): category in categories for category in CATEGORY_KEYWORDS}}
+
+
+def chunk_categories(metadata: Optional[dict]) -> List[str]:
+    """Categories a stored chunk was tagged with, from its metadata."""
+    return [category for category in CATEGORY_KEYWORDS if (metadata or {}).get(_flag(category))]
+
+
+def resolve_category(requested: Optional[str]) -> Optional[str]:
+    """Known category for the category a chat request names ("Family", "commercial"...), or None."""
+    name = (requested or "").strip().lower()
+    name = CATEGORY_ALIASES.get(name, name)
+    return name if name in CATEGORY_KEYWORDS else None
+
+
+def category_filter(category: str) -> dict:
+    """Chroma `where` filter selecting the chunks tagged with category."""
+    return {_flag(category): True}
+
+
+def retag_collection(collection, page_size: int = 1000) -> int:
+    """
+    Re-classifies every chunk already stored in a Chroma collection and rewrites its category
+    metadata in place (no re-embedding). For collections ingested before chunks were tagged, or
+    after the keywords change. Returns the number of chunks updated.
+    """
+    updated, offset = 0, 0
+    while True:
+        page = collection.get(include=["documents"], limit=page_size, offset=offset)
+        if not page["ids"]:
+            return updated
+        collection.update(ids=page["ids"], metadatas=[category_metadata(classify_text(text or "")) for text in page["documents"]])
+        updated += len(page["ids"])
+        offset += len(page["ids"])
+
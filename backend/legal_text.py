@@ -0,0 +1,188 @@
+# backend/legal_text.py
+
+import re
+from functools import lru_cache
+from typing import List, Tuple
+
+
+# --- Normalization ---
+# Single characters to delete ("") or rewrite. One precompiled character-class regex finds them, so
+# text without any (most French) is scanned at C speed; whitespace is then fixed in one split/join.
+# Applied page by page during ingestion and to queries before retrieval, so both sides of the
+# similarity search see the same spelling.
+_DELETED_CHARS = (
+    "\u0640"                                          # Tatweel (kashida) used to stretch words
+    + "".join(map(chr, range(0x064B, 0x0660)))        # Harakat: fathatan .. wavy hamza below
+    + "\u0670"                                        # Superscript alef
+    + "".join(map(chr, range(0x06D6, 0x06EE)))        # Quranic annotation marks
+    + "\u00AD\u200B\u200C\u200D\u200E\u200F\u2060\uFEFF"  # Soft hyphen, zero-width and direction marks
+    + "".join(map(chr, range(0x202A, 0x202F)))        # Bidi embeddings/overrides
+    + "".join(map(chr, range(0x2066, 0x206A)))        # Bidi isolates
+)
+_CHAR_REPLACEMENTS = {
+    **{char: "" for char in _DELETED_CHARS},
+    "\u0622": "\u0627", "\u0623": "\u0627", "\u0625": "\u0627", "\u0671": "\u0627",  # آ أ إ ٱ -> ا
+    "\u0649": "\u064A",                                                            # ى -> ي
+    "\u06CC": "\u064A",                                                            # Farsi yeh -> ي
+    "\u06A9": "\u0643",                                                            # Keheh -> ك
+    **{chr(0x0660 + digit): str(digit) for digit in range(10)},                    # Arabic-Indic digits -> 0-9
+    "\u00A0": " ", "\u2007": " ", "\u202F": " ", "\t": " ", "\f": " ", "\v": " ", "\r": "\n",
+}
+_CHAR_RE = re.compile("[" + re.escape("".join(_CHAR_REPLACEMENTS)) + "]")
+_SPACE_RUN_RE = re.compile(r"  +")
+_BLANK_LINES_RE = re.compile(r"\n\n+")
+
+
+def _replace_char(match) -> str:
+    return _CHAR_REPLACEMENTS[match.group()]
+
+
+def normalize_text(text: str) -> str:
+    """
+    Normalizes extracted or typed text: drops tatweel, Arabic diacritics, zero-width and bidi
+    control characters; folds alef (آ أ إ ٱ) and yaa (ى) variants and Arabic-Indic digits;
+    collapses runs of spaces and blank lines; strips every line.
+    """
+    text = _CHAR_RE.sub(_replace_char, text)
+    text = "\n".join([line.strip() for line in text.split("\n")])
+    if "  " in text:
+        text = _SPACE_RUN_RE.sub(" ", text)
+    if "\n\n" in text:
+        text = _BLANK_LINES_RE.sub("\n", text)
+    return text.strip()
+
+
+# --- Chunking ---
+# Where text that is too long for a chunk gets cut, strongest boundary first
+ARTICLE, LINE, SENTENCE, WORD, HARD = range(5)
+# "Art. 12", "Article 3", "Art. 1er" / "المادة 12", "المادة الأولى"; an article starts there only at
+# the start of a line or after punctuation (not in "prévues à l'Art. 3" or "وفقا للمادة 5")
+_ARTICLE_RE = re.compile(r"(?:Art(?:icle)?\.?\s*(?:\d|1er|premier)|المادة\s*(?:\d|ال[اأ]ول))")
+_ARTICLE_PRECEDERS = "\n.:;؛—-"
+_ARTICLE_KEYWORDS = ("Art", "المادة")
+# Cut points inside a line longer than a chunk, strongest first
+_BOUNDARY_RES = {
+    # Sentence ends, French and Arabic (؟ ؛ ۔), but not the "Art." abbreviation
+    SENTENCE: re.compile(r"(?<=[.!?؟؛۔])(?<!Art\.)[ \n]+"),
+    WORD: re.compile(r" +"),
+}
+
+
+def _article_starts(text: str) -> List[int]:
+    # str.find on the two keywords is several times faster than scanning with the regex
+    starts = []
+    for keyword in _ARTICLE_KEYWORDS:
+        position = text.find(keyword)
+        while position != -1:
+            i = position - 1
+            while i >= 0 and text[i] == " ":
+                i -= 1
+            if i >= 0 and text[i] in _ARTICLE_PRECEDERS and _ARTICLE_RE.match(text, position):
+                starts.append(position)
+            position = text.find(keyword, position + 1)
+    return starts
+
+
+class LegalTextSplitter:
+    """
+    Article- and sentence-aware splitter for Official Journal text (French and Arabic).
+
+    Chunks are at most chunk_size characters and are packed with whole articles ("Art. N" /
+    "المادة N"). An article that would not fit in a chunk that is already half full starts a new
+    chunk, without overlap, so chunks rarely mix the tail of one article with the head of another.
+    Only articles that have to be cut are broken into lines (then sentences, then words), and there
+    consecutive chunks overlap by up to chunk_overlap characters. Drop-in replacement for
+    RecursiveCharacterTextSplitter with add_start_index: split() returns (start_index, text) pairs.
+    """
+
+    def __init__(self, chunk_size: int = 1000, chunk_overlap: int = 150):
+        if chunk_overlap >= chunk_size:
+            raise ValueError(f"chunk_overlap ({chunk_overlap}) must be smaller than chunk_size ({chunk_size})")
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        # Below this size a chunk keeps filling up with the next article instead of being closed
+        self.min_chunk = chunk_size // 2
+
+    def _cut(self, text: str, start: int, end: int, level: int, out: list):
+        """Appends (start, end) spans covering text[start:end], none longer than chunk_size."""
+        if end - start <= self.chunk_size:
+            out.append((start, end))
+        elif level == HARD:
+            out.extend((position, min(position + self.chunk_size, end)) for position in range(start, end, self.chunk_size))
+        else:
+            cuts = [match.end() for match in _BOUNDARY_RES[level].finditer(text, start, end) if match.end() < end]
+            for piece_start, piece_end in zip([start] + cuts, cuts + [end]):
+                self._cut(text, piece_start, piece_end, level + 1, out)
+
+    def _line_spans(self, text: str, start: int, end: int) -> list:
+        spans = []
+        while start < end:
+            line_end = text.find("\n", start, end)
+            line_end = end if line_end == -1 else line_end + 1
+            if line_end - start <= self.chunk_size:
+                spans.append((start, line_end))
+            else:
+                self._cut(text, start, line_end, SENTENCE, spans)
+            start = line_end
+        return spans
+
+    def _emit(self, text: str, spans: list, chunks: list):
+        start, end = spans[0][0], spans[-1][1]
+        piece = text[start:end]
+        stripped = piece.strip()
+        if stripped:
+            chunks.append((start + len(piece) - len(piece.lstrip()), stripped))
+
+    def split(self, text: str) -> List[Tuple[int, str]]:
+        """Splits text into [(start_index, chunk_text)], in order."""
+        if len(text) <= self.chunk_size:
+            return [(len(text) - len(text.lstrip()), text.strip())] if text.strip() else []
+
+        bounds = [0] + sorted(_article_starts(text)) + [len(text)]
+        chunks, current = [], []
+        for article_start, article_end in zip(bounds, bounds[1:]):
+            article_len = article_end - article_start
+            current_len = current[-1][1] - current[0][0] if current else 0
+            if current_len + article_len <= self.chunk_size:
+                current.append((article_start, article_end))
+                continue
+            if current_len >= self.min_chunk:
+                # The article doesn't fit: start it in a fresh chunk, without overlap
+                self._emit(text, current, chunks)
+                current = []
+                if article_len <= self.chunk_size:
+                    current.append((article_start, article_end))
+                    continue
+
+            # Too long for one chunk, or topping up a small one: continue line by line
+            for span in self._line_spans(text, article_start, article_end):
+                span_len = span[1] - span[0]
+                if current and current[-1][1] - current[0][0] + span_len > self.chunk_size:
+                    self._emit(text, current, chunks)
+                    # Keep a tail of whole spans as overlap, leaving room for the new span
+                    while current and (current[-1][1] - current[0][0] > self.chunk_overlap
+                                       or current[-1][1] - current[0][0] + span_len > self.chunk_size):
+                        current.pop(0)
+                current.append(span)
+        if current:
+            self._emit(text, current, chunks)
+        return chunks
+
+    def split_text(self, text: str) -> List[str]:
+        return [chunk for _, chunk in self.split(text)]
+
+
+# Bump whenever normalize_text or LegalTextSplitter changes the chunks they produce: an interrupted
+# ingestion run only resumes files whose journal was written with the same chunking
+CHUNKER_VERSION = 1
+
+
+def chunking_fingerprint(chunk_size: int, chunk_overlap: int) -> str:
+    """Identifies how chunk texts (and so chunk numbers) were produced: splitter version and settings."""
+    return f"{LegalTextSplitter.__name__}-v{CHUNKER_VERSION}:{chunk_size}:{chunk_overlap}"
+
+
+@lru_cache(maxsize=8)
+def get_text_splitter(chunk_size: int, chunk_overlap: int) -> LegalTextSplitter:
+    """Shared splitter per configuration (its patterns are compiled once at import)."""
+    return LegalTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
@@ -0,0 +1,227 @@
+# backend/lexical_index.py
+
+import os
+import re
+import math
+import unicodedata
+from array import array
+from collections import Counter
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from legal_text import normalize_text # Same normalization as the chunks and the embedded queries
+
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__)) # Directory of lexical_index.py
+PROJECT_ROOT = os.path.abspath(os.path.join(CURRENT_DIR, '..')) # mezan directory (up one level)
+
+# BM25 index over the chunks of the Chroma collection, rebuilt by ingestion whenever the collection
+# changes (before the index generation is published, so the serving process reloads both together)
+LEXICAL_INDEX_PATH = os.getenv("LEXICAL_INDEX_PATH", os.path.join(PROJECT_ROOT, 'data', 'vector_store', 'lexical_index.npz'))
+
+# Okapi BM25 parameters
+BM25_K1 = 1.2
+BM25_B = 0.75
+# Reciprocal rank fusion constant: a document ranked r-th in a list contributes 1 / (RRF_K + r)
+RRF_K = 60
+
+
+# --- Tokenization ---
+# Words, plus compounds such as law numbers and dates ("84-11", "2023/05/12") kept as one token
+_TOKEN_RE = re.compile(r"\w+(?:[-/]\w+)*")
+_COMPOUND_SEPARATORS_RE = re.compile(r"[-/]")
+# Arabic definite article, alone or after و/ب/ك/ف/ل ("والقانون", "بالمادة", "للقانون" -> "قانون")
+_ARABIC_ARTICLE_PREFIXES = ("وال", "بال", "كال", "فال", "لل", "ال")
+# Compared after normalization and accent folding (alef/yaa variants folded, "à" -> "a")
+_STOPWORDS = frozenset("""
+    a au aux avec ce ces cet cette c d dans de des du elle en et il ils j l la le les leur leurs m n ne
+    ou par pas pour qu que qui s sa se ses son sont sur un une y est
+    في من على الي عن ان او ما لا التي الذي الذين هذا هذه ذلك تلك مع كل و ب ل ف ثم قد هو هي
+""".split())
+
+
+def _fold_accents(text: str) -> str:
+    # "décret" -> "decret"; Arabic diacritics are already gone after normalize_text
+    if text.isascii():
+        return text
+    return "".join(char for char in unicodedata.normalize("NFD", text) if not unicodedata.combining(char))
+
+
+def _stem(token: str) -> str:
+    for prefix in _ARABIC_ARTICLE_PREFIXES:
+        if token.startswith(prefix) and len(token) - len(prefix) >= 2:
+            return token[len(prefix):]
+    return token
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Index terms of a chunk or query: normalize_text, lowercase, French accents folded, Arabic
+    definite article stripped, stopwords and one-letter words dropped (numbers are kept).
+    Compounds containing a digit ("84-11") are indexed whole and by their parts.
+    """
+    tokens = []
+    for match in _TOKEN_RE.finditer(_fold_accents(normalize_text(text).lower())):
+        word = match.group()
+        parts = _COMPOUND_SEPARATORS_RE.split(word) if ("-" in word or "/" in word) else (word,)
+        if len(parts) > 1 and any(char.isdigit() for char in word):
+            tokens.append(word)
+        for part in parts:
+            if part in _STOPWORDS or (len(part) < 2 and not part.isdigit()):
+                continue
+            tokens.append(_stem(part))
+    return tokens
+
+
+# --- Index ---
+class LexicalIndex:
+    """
+    In-memory BM25 inverted index keyed by Chroma chunk ID. Postings are stored term by term in flat
+    numpy arrays (CSR layout: offsets into doc/tf arrays), so a 100k-chunk Journal collection takes a
+    few tens of MB and a query costs one vectorized pass over the postings of its terms.
+    Chunks can carry tags (legal categories, up to 32), kept as one bitmask per chunk, and a search
+    can be restricted to the chunks with a given tag.
+    """
+
+    def __init__(self, chunk_ids: List[str], terms: List[str], offsets: np.ndarray, postings: np.ndarray,
+                 term_freqs: np.ndarray, doc_lengths: np.ndarray, tags: List[str] = (), doc_tags: np.ndarray = None):
+        self.chunk_ids = chunk_ids
+        self.tags = list(tags)
+        self.doc_tags = doc_tags if doc_tags is not None else np.zeros(len(chunk_ids), dtype=np.uint32)
+        self.term_index = {term: i for i, term in enumerate(terms)}
+        self.offsets = offsets
+        self.postings = postings
+        self.term_freqs = term_freqs
+        self.doc_lengths = doc_lengths
+        average_length = float(doc_lengths.mean()) if len(doc_lengths) else 1.0
+        # Per-document part of the BM25 denominator, computed once
+        self._length_norm = (BM25_K1 * (1 - BM25_B + BM25_B * doc_lengths / max(average_length, 1.0))).astype(np.float32)
+
+    def __len__(self) -> int:
+        return len(self.chunk_ids)
+
+    @classmethod
+    def build(cls, chunks: Iterable[Tuple[str, str, Iterable[str]]]) -> "LexicalIndex":
+        """Indexes (chunk_id, text, tags) triples."""
+        chunk_ids, vocabulary, tag_bits = [], {}, {}
+        doc_lengths, posting_terms, posting_docs, posting_tfs = array("i"), array("i"), array("i"), array("i")
+        doc_tags = array("I")
+        for chunk_id, text, tags in chunks:
+            doc = len(chunk_ids)
+            chunk_ids.append(chunk_id)
+            doc_tags.append(sum(1 << tag_bits.setdefault(tag, len(tag_bits)) for tag in set(tags)))
+            counts = Counter(tokenize(text or ""))
+            doc_lengths.append(sum(counts.values()))
+            for term, tf in counts.items():
+                posting_terms.append(vocabulary.setdefault(term, len(vocabulary)))
+                posting_docs.append(doc)
+                posting_tfs.append(tf)
+
+        # Group the postings by term; the stable sort keeps each term's documents in order
+        term_ids = np.frombuffer(posting_terms, dtype=np.int32)
+        order = np.argsort(term_ids, kind="stable")
+        offsets = np.zeros(len(vocabulary) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(term_ids, minlength=len(vocabulary)), out=offsets[1:])
+        return cls(
+            chunk_ids, list(vocabulary), offsets,
+            np.frombuffer(posting_docs, dtype=np.int32)[order].copy(),
+            np.minimum(np.frombuffer(posting_tfs, dtype=np.int32)[order], np.iinfo(np.uint16).max).astype(np.uint16),
+            np.frombuffer(doc_lengths, dtype=np.int32).copy(),
+            list(tag_bits), np.frombuffer(doc_tags, dtype=np.uint32).copy(),
+        )
+
+    def search(self, query: str, k: int, tag: Optional[str] = None) -> List[Tuple[str, float]]:
+        """
+        Top-k (chunk_id, BM25 score) for the query, best first; chunks matching no term are left out.
+        With a tag, only chunks carrying it are scored (statistics stay global).
+        """
+        term_ids = {self.term_index[term] for term in tokenize(query) if term in self.term_index}
+        if not term_ids or k <= 0 or (tag is not None and tag not in self.tags):
+            return []
+        tag_bit = np.uint32(1 << self.tags.index(tag)) if tag is not None else None
+        scores = np.zeros(len(self.chunk_ids), dtype=np.float32)
+        for term_id in term_ids:
+            start, end = self.offsets[term_id], self.offsets[term_id + 1]
+            docs = self.postings[start:end]
+            tf = self.term_freqs[start:end].astype(np.float32)
+            idf = math.log(1 + (len(self.chunk_ids) - (end - start) + 0.5) / ((end - start) + 0.5))
+            if tag_bit is not None:
+                tagged = (self.doc_tags[docs] & tag_bit) != 0
+                docs, tf = docs[tagged], tf[tagged]
+            scores[docs] += idf * tf * (BM25_K1 + 1) / (tf + self._length_norm[docs]) # A term lists a document once
+        matched = np.flatnonzero(scores)
+        if len(matched) > k:
+            matched = matched[np.argpartition(scores[matched], -k)[-k:]]
+        matched = matched[np.argsort(-scores[matched], kind="stable")]
+        return [(self.chunk_ids[doc], float(scores[doc])) for doc in matched]
+
+    def stats(self) -> dict:
+        return {"chunks": len(self.chunk_ids), "terms": len(self.term_index), "postings": int(len(self.postings)),
+                **{f"tagged_{tag}": int(np.count_nonzero(self.doc_tags & np.uint32(1 << bit))) for bit, tag in enumerate(self.tags)}}
+
+    # --- Persistence ---
+    def save(self, path: str):
+        """Writes the index as one .npz file, atomically (the serving process may be loading it)."""
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, chunk_ids=_pack_strings(self.chunk_ids), terms=_pack_strings(list(self.term_index)),
+                     offsets=self.offsets, postings=self.postings, term_freqs=self.term_freqs, doc_lengths=self.doc_lengths,
+                     tags=_pack_strings(self.tags), doc_tags=self.doc_tags)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "LexicalIndex":
+        with np.load(path) as data:
+            tagged = "doc_tags" in data.files # Absent from indexes built before chunks were tagged
+            return cls(_unpack_strings(data["chunk_ids"]), _unpack_strings(data["terms"]), data["offsets"],
+                       data["postings"], data["term_freqs"], data["doc_lengths"],
+                       _unpack_strings(data["tags"]) if tagged else [], data["doc_tags"] if tagged else None)
+
+
+def _pack_strings(strings: List[str]) -> np.ndarray:
+    # One UTF-8 buffer instead of a fixed-width unicode array (4 bytes per character of the longest string)
+    return np.frombuffer("\n".join(strings).encode("utf-8"), dtype=np.uint8)
+
+
+def _unpack_strings(buffer: np.ndarray) -> List[str]:
+    return buffer.tobytes().decode("utf-8").split("\n") if len(buffer) else []
+
+
+def build_lexical_index(collection, path: str = LEXICAL_INDEX_PATH, tags_of: Callable[[dict], List[str]] = None,
+                        page_size: int = 5000) -> dict:
+    """
+    Rebuilds the index from every chunk stored in a Chroma collection and saves it to path.
+    tags_of maps a chunk's metadata to its tags (e.g. legal_categories.chunk_categories).
+    """
+    def iter_chunks():
+        offset = 0
+        while True:
+            page = collection.get(include=["documents", "metadatas"] if tags_of else ["documents"],
+                                  limit=page_size, offset=offset)
+            if not page["ids"]:
+                return
+            metadatas = page["metadatas"] if tags_of else [None] * len(page["ids"])
+            for chunk_id, text, metadata in zip(page["ids"], page["documents"], metadatas):
+                yield chunk_id, text, tags_of(metadata) if tags_of else ()
+            offset += len(page["ids"])
+
+    index = LexicalIndex.build(iter_chunks())
+    index.save(path)
+    return index.stats()
+
+
+# --- Fusion ---
+def reciprocal_rank_fusion(rankings: Iterable[List[str]], k: int = RRF_K, limit: int = None) -> List[Tuple[str, float]]:
+    """
+    Merges ranked ID lists (best first) by reciprocal rank fusion: each ID scores the sum of
+    1 / (k + rank) over the lists it appears in. Only ranks are used, so BM25 and cosine scores
+    never have to be put on one scale. Returns [(id, fused score)], best first.
+    """
+    fused: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, item in enumerate(ranking, start=1):
+            fused[item] = fused.get(item, 0.0) + 1.0 / (k + rank)
+    ordered = sorted(fused.items(), key=lambda pair: pair[1], reverse=True)
+    return ordered[:limit] if limit else ordered
@@ -0,0 +1,192 @@
+# backend/onnx_embeddings.py
+
+import os
+import json
+import shutil
+import argparse
+import tempfile
+from typing import List
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+
+# Written next to the exported model so the runtime knows how to tokenize and pool
+ONNX_CONFIG_FILENAME = "mezan_onnx_config.json"
+FP32_MODEL_FILENAME = "model.onnx"
+INT8_MODEL_FILENAME = "model_int8.onnx"
+
+
+# --- Export ---
+def export_onnx_model(model_name: str, output_dir: str, quantize: bool = True) -> str:
+    """
+    Exports a sentence-transformer to ONNX and (by default) applies dynamic int8 quantization.
+
+    The transformer body is exported as-is; pooling and normalization are read from the
+    sentence-transformers pipeline and re-applied at runtime in NumPy, so the ONNX model produces
+    vectors in the same space as HuggingFaceEmbeddings and the existing index stays usable.
+
+    The export is written to a temporary directory next to output_dir and renamed into place once
+    complete, so an interrupted export never leaves a half-written model at output_dir.
+    Returns the path of the model file to load.
+    """
+    print(f"Exporting '{model_name}' to ONNX in {output_dir}...")
+    output_dir = os.path.abspath(output_dir)
+    os.makedirs(os.path.dirname(output_dir), exist_ok=True)
+    staging_dir = tempfile.mkdtemp(prefix=os.path.basename(output_dir) + ".tmp-", dir=os.path.dirname(output_dir))
+    os.chmod(staging_dir, 0o755) # mkdtemp's default 0700 would carry over to output_dir
+    try:
+        model_file = _export_to(model_name, staging_dir, quantize)
+        if os.path.exists(output_dir):
+            shutil.rmtree(output_dir) # A previous export being replaced
+        os.replace(staging_dir, output_dir)
+    except BaseException:
+        shutil.rmtree(staging_dir, ignore_errors=True)
+        raise
+
+    model_path = os.path.join(output_dir, model_file)
+    print(f"ONNX export complete: {model_path}")
+    return model_path
+
+
+def _export_to(model_name: str, output_dir: str, quantize: bool) -> str:
+    """Writes the export into output_dir and returns the model file's name."""
+    import torch
+    from sentence_transformers import SentenceTransformer
+    from sentence_transformers.models import Pooling, Normalize
+
+    st_model = SentenceTransformer(model_name, device='cpu')
+    tokenizer = st_model.tokenizer
+    transformer = st_model[0].auto_model.eval()
+
+    pooling = next((module for module in st_model if isinstance(module, Pooling)), None)
+    if pooling is None or pooling.get_pooling_mode_str() not in ("mean", "cls"):
+        raise ValueError(f"Unsupported pooling for ONNX export: {pooling.get_pooling_mode_str() if pooling else None}")
+    normalize = any(isinstance(module, Normalize) for module in st_model)
+
+    # Export with whatever inputs this tokenizer produces (BERT-style models also take token_type_ids)
+    sample = tokenizer(["Exemple de texte", "نص تجريبي"], padding=True, return_tensors="pt")
+    input_names = list(sample.keys())
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+    dynamic_axes["last_hidden_state"] = {0: "batch", 1: "sequence"}
+
+    class _NamedInputs(torch.nn.Module):
+        # Tokenizer key order (input_ids, token_type_ids, attention_mask) differs from forward()'s
+        # positional order, so inputs are passed to the transformer by name
+        def __init__(self, model):
+            super().__init__()
+            self.model = model
+
+        def forward(self, *inputs):
+            return self.model(**dict(zip(input_names, inputs))).last_hidden_state
+
+    fp32_path = os.path.join(output_dir, FP32_MODEL_FILENAME)
+    with torch.no_grad():
+        torch.onnx.export(
+            _NamedInputs(transformer),
+            args=tuple(sample[name] for name in input_names),
+            f=fp32_path,
+            input_names=input_names,
+            output_names=["last_hidden_state"],
+            dynamic_axes=dynamic_axes,
+            opset_version=14,
+            dynamo=False, # TorchScript exporter: handles the dynamic batch/sequence axes of HF models
+        )
+
+    model_file = FP32_MODEL_FILENAME
+    if quantize:
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+        model_file = INT8_MODEL_FILENAME
+        quantize_dynamic(fp32_path, os.path.join(output_dir, model_file), weight_type=QuantType.QInt8)
+
+    tokenizer.save_pretrained(output_dir)
+    with open(os.path.join(output_dir, ONNX_CONFIG_FILENAME), 'w', encoding='utf-8') as f:
+        json.dump({
+            "source_model": model_name,
+            "input_names": input_names,
+            "max_seq_length": st_model.max_seq_length,
+            "pooling": pooling.get_pooling_mode_str(),
+            "normalize": normalize,
+            "quantized": quantize,
+        }, f, indent=2)
+    return model_file
+
+
+# --- Runtime ---
+class OnnxEmbeddings(Embeddings):
+    """
+    LangChain Embeddings backed by ONNX Runtime on CPU. Drop-in replacement for
+    HuggingFaceEmbeddings for a model exported with export_onnx_model.
+    """
+
+    def __init__(self, model_dir: str, batch_size: int = 32, num_threads: int = 0):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        with open(os.path.join(model_dir, ONNX_CONFIG_FILENAME), encoding='utf-8') as f:
+            self.config = json.load(f)
+        model_file = INT8_MODEL_FILENAME if self.config["quantized"] else FP32_MODEL_FILENAME
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        self.session = ort.InferenceSession(os.path.join(model_dir, model_file), options, providers=["CPUExecutionProvider"])
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        self.batch_size = batch_size
+
+    def _embed_batch(self, texts: List[str]) -> np.ndarray:
+        encoded = self.tokenizer(texts, padding=True, truncation=True,
+                                 max_length=self.config["max_seq_length"], return_tensors="np")
+        feeds = {name: encoded[name].astype(np.int64) for name in self.config["input_names"]}
+        hidden = self.session.run(["last_hidden_state"], feeds)[0]
+
+        if self.config["pooling"] == "cls":
+            pooled = hidden[:, 0]
+        else:
+            mask = feeds["attention_mask"][..., None].astype(np.float32)
+            pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+
+        if self.config["normalize"]:
+            pooled = pooled / np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+        return pooled
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        # Sorting by length keeps padding (and wasted compute) per batch small
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        vectors = [None] * len(texts)
+        for start in range(0, len(order), self.batch_size):
+            batch_ids = order[start:start + self.batch_size]
+            for i, vector in zip(batch_ids, self._embed_batch([texts[i] for i in batch_ids])):
+                vectors[i] = vector.tolist()
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed_batch([text])[0].tolist()
+
+
+# --- Parity Check ---
+def check_parity(reference: Embeddings, candidate: Embeddings, texts: List[str]) -> dict:
+    """Cosine agreement between two embedding backends on the same texts."""
+    ref = np.asarray(reference.embed_documents(texts), dtype=np.float32)
+    cand = np.asarray(candidate.embed_documents(texts), dtype=np.float32)
+    cosines = (ref * cand).sum(axis=1) / (np.linalg.norm(ref, axis=1) * np.linalg.norm(cand, axis=1))
+    return {
+        "texts": len(texts),
+        "min_cosine": float(cosines.min()),
+        "mean_cosine": float(cosines.mean()),
+        "p05_cosine": float(np.percentile(cosines, 5)),
+    }
+
+
+if __name__ == "__main__":
+    # python backend/onnx_embeddings.py --model sentence-transformers/all-mpnet-base-v2
+    # exports to data/models/sentence-transformers_all-mpnet-base-v2-onnx-int8, where EMBEDDING_BACKEND=onnx-int8 loads it
+    from embedding_backends import onnx_model_dir
+
+    parser = argparse.ArgumentParser(description="Export a sentence-transformer to (int8) ONNX for EMBEDDING_BACKEND=onnx-int8")
+    parser.add_argument("--model", required=True)
+    parser.add_argument("--output", default=None, help="Export directory (default: the one EMBEDDING_BACKEND=onnx-int8 loads)")
+    parser.add_argument("--no-quantize", action="store_true", help="Keep the fp32 ONNX model")
+    args = parser.parse_args()
+    export_onnx_model(args.model, args.output or onnx_model_dir(args.model), quantize=not args.no_quantize)
@@ -0,0 +1,99 @@
+# backend/pdf_extractors.py
+
+import os
+import re
+import abc
+import unicodedata
+from typing import Dict, Iterator
+
+
+# Which engine extracts page text during ingestion (see PDF_EXTRACTORS). Can be overridden per run
+# with `ingestion.py --extractor`. Chunk texts (and so chunk IDs' content) depend on the engine, so
+# switching engines is best done on a full rebuild.
+PDF_EXTRACTOR = os.getenv("PDF_EXTRACTOR", "pypdf2")
+
+# Arabic Presentation Forms-A/B: contextual glyphs (and lam-alef ligatures) that some PDF producers
+# emit instead of base letters. They look right but never match typed queries, so they are folded
+# back to the base letters with NFKC, leaving all other characters untouched.
+ARABIC_PRESENTATION_FORMS_RE = re.compile(r"[\uFB50-\uFDFF\uFE70-\uFEFC]+")
+
+
+def fold_arabic_presentation_forms(text: str) -> str:
+    return ARABIC_PRESENTATION_FORMS_RE.sub(lambda m: unicodedata.normalize("NFKC", m.group()), text)
+
+
+class PdfExtractor(abc.ABC):
+    """
+    Text extraction engine. iter_page_texts yields the text of every page in order ("" for pages
+    without extractable text) and lets errors propagate; callers number the pages.
+    Engines are only imported when selected, so just the chosen one needs to be installed.
+    """
+
+    name = None
+
+    def iter_page_texts(self, pdf_path: str) -> Iterator[str]:
+        for text in self.iter_raw_page_texts(pdf_path):
+            yield fold_arabic_presentation_forms(text or "")
+
+    @abc.abstractmethod
+    def iter_raw_page_texts(self, pdf_path: str) -> Iterator[str]:
+        """Page texts exactly as the engine returns them (no presentation-form folding)."""
+
+
+class PyPDF2Extractor(PdfExtractor):
+    """Pure-Python PyPDF2 (the original engine). Slowest, and weakest on Arabic."""
+
+    name = "pypdf2"
+
+    def iter_raw_page_texts(self, pdf_path: str) -> Iterator[str]:
+        import PyPDF2
+        with open(pdf_path, 'rb') as pdf_file:
+            pdf_reader = PyPDF2.PdfReader(pdf_file)
+            for page in pdf_reader.pages:
+                yield page.extract_text()
+
+
+class PdfiumExtractor(PdfExtractor):
+    """PDFium (Chrome's PDF engine) through pypdfium2: native code, typically several times faster."""
+
+    name = "pypdfium2"
+
+    def iter_raw_page_texts(self, pdf_path: str) -> Iterator[str]:
+        import pypdfium2
+        document = pypdfium2.PdfDocument(pdf_path)
+        try:
+            for index in range(len(document)):
+                page = document[index]
+                text_page = page.get_textpage()
+                try:
+                    # PDFium separates lines with CRLF
+                    yield text_page.get_text_range().replace("\r\n", "\n")
+                finally:
+                    text_page.close()
+                    page.close()
+        finally:
+            document.close()
+
+
+class PdfMinerExtractor(PdfExtractor):
+    """pdfminer.six layout analysis: slower than PDFium but best at reading order in multi-column pages."""
+
+    name = "pdfminer"
+
+    def iter_raw_page_texts(self, pdf_path: str) -> Iterator[str]:
+        from pdfminer.high_level import extract_pages
+        from pdfminer.layout import LAParams, LTTextContainer
+        for page_layout in extract_pages(pdf_path, laparams=LAParams()):
+            yield "".join(element.get_text() for element in page_layout if isinstance(element, LTTextContainer))
+
+
+PDF_EXTRACTORS: Dict[str, type] = {
+    extractor.name: extractor for extractor in (PyPDF2Extractor, PdfiumExtractor, PdfMinerExtractor)
+}
+
+
+def get_pdf_extractor(name: str = PDF_EXTRACTOR) -> PdfExtractor:
+    try:
+        return PDF_EXTRACTORS[name]()
+    except KeyError:
+        raise ValueError(f"Unknown PDF_EXTRACTOR '{name}'. Expected one of: {', '.join(PDF_EXTRACTORS)}") from None
@@ -0,0 +1,91 @@
+# backend/query_batcher.py
+
+import os
+import time
+import queue
+import threading
+from concurrent.futures import Future
+from typing import Callable
+
+from service_metrics import QUERY_BATCH_SIZE, QUERY_BATCH_WAIT_SECONDS # Batch size and queue-wait histograms for /metrics
+
+
+# --- Configuration ---
+# Concurrent chat requests embed their questions and run their first vector search together (see
+# rag_service.embed_and_search): a batch opens with the first waiting question and closes
+# QUERY_BATCH_WINDOW_MS later or at QUERY_BATCH_MAX_SIZE questions. Questions arriving while a batch
+# runs form the next one without waiting out the window, so under load batches fill up and the
+# window only costs an idle server its few milliseconds. QUERY_BATCH_MAX_SIZE=1 turns batching off.
+QUERY_BATCH_WINDOW_MS = float(os.getenv("QUERY_BATCH_WINDOW_MS", 5))
+QUERY_BATCH_MAX_SIZE = int(os.getenv("QUERY_BATCH_MAX_SIZE", 32))
+
+
+class QueryBatcher:
+    """
+    Collects items submitted from any number of threads (or event loops, through
+    asyncio.wrap_future) into batches for process_batch, which maps a list of items to a list of
+    results in the same order. submit() returns a Future resolving to (result, queue wait seconds);
+    if process_batch raises, every Future of the batch raises it. Batches run one at a time on a
+    daemon thread, started on first use in each process (gunicorn workers forked after import
+    don't inherit threads).
+    """
+
+    def __init__(self, process_batch: Callable[[list], list], max_batch: int = QUERY_BATCH_MAX_SIZE,
+                 window_seconds: float = QUERY_BATCH_WINDOW_MS / 1000, name: str = "query-batcher"):
+        self.process_batch = process_batch
+        self.max_batch = max(1, max_batch)
+        self.window_seconds = max(0.0, window_seconds)
+        self.name = name
+        self._queue = queue.Queue()
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _ensure_thread(self):
+        """Starts the batching thread on first use in this process."""
+        with self._lock:
+            if self._pid == os.getpid() and self._thread.is_alive():
+                return
+            if self._pid != os.getpid():
+                self._queue = queue.Queue() # A queue copied from the parent process may hold its items
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+            self._pid = os.getpid()
+
+    def submit(self, item) -> Future:
+        if self._pid != os.getpid() or not self._thread.is_alive():
+            self._ensure_thread()
+        future = Future()
+        self._queue.put((item, future, time.perf_counter()))
+        return future
+
+    def _collect(self) -> list:
+        """The next batch: the first waiting item, then whatever arrives before the window closes or the batch is full."""
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.window_seconds
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            # Items whose caller gave up (a cancelled async request) are dropped, the rest can no longer be cancelled
+            batch = [entry for entry in self._collect() if entry[1].set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            started = time.perf_counter()
+            QUERY_BATCH_SIZE.observe(len(batch))
+            for _, _, submitted in batch:
+                QUERY_BATCH_WAIT_SECONDS.observe(started - submitted)
+            try:
+                results = self.process_batch([item for item, _, _ in batch])
+            except Exception as e:
+                for _, future, _ in batch:
+                    future.set_exception(e)
+                continue
+            for (_, future, submitted), result in zip(batch, results):
+                future.set_result((result, started - submitted))
@@ -0,0 +1,181 @@
+# backend/query_cache.py
+
+import os
+import time
+import threading
+from collections import OrderedDict
+from typing import Hashable, List, Optional
+
+import numpy as np
+
+
+# In-memory query-embedding cache of the RAG service (entries, seconds; size 0 disables it)
+QUERY_EMBEDDING_CACHE_SIZE = int(os.getenv("QUERY_EMBEDDING_CACHE_SIZE", 2048))
+QUERY_EMBEDDING_CACHE_TTL = float(os.getenv("QUERY_EMBEDDING_CACHE_TTL", 3600))
+
+# Semantic cache of LLM answers (entries, seconds; size 0 disables it). A new question reuses a cached
+# answer only if it retrieved the same chunks and its embedding is at least this similar (cosine).
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", 1000))
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", 6 * 3600))
+RESPONSE_CACHE_SIMILARITY = float(os.getenv("RESPONSE_CACHE_SIMILARITY", 0.95))
+
+
+class TTLLRUCache:
+    """
+    Thread-safe bounded LRU map whose entries also expire ttl_seconds after they were stored.
+    Keeps hit/miss/expiry/eviction counters for stats(). Values are returned as stored, so callers
+    must not mutate them.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: float, name: str = "cache"):
+        self.name = name
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.expirations = 0
+        self.evictions = 0
+        self._entries = OrderedDict() # key -> (stored_at, value), least recently used first
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[object]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            stored_at, value = entry
+            if self.ttl_seconds > 0 and time.monotonic() - stored_at > self.ttl_seconds:
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: Hashable, value: object):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "name": self.name,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "expirations": self.expirations,
+                "evictions": self.evictions,
+                "hit_rate": (self.hits / lookups) if lookups else 0.0,
+            }
+
+
+class SemanticResponseCache:
+    """
+    LLM answers keyed by (category, retrieved chunk IDs, prompt version). Under one key, a question
+    is answered from the cache when a previously answered question's embedding has cosine
+    similarity >= similarity_threshold with it, so paraphrases that retrieve the same context share
+    an answer. Entries expire after ttl_seconds; beyond max_entries the least recently used go.
+    The caller clears the cache when the index changes, since answers quote retrieved chunks.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: float, similarity_threshold: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        self.hits = 0
+        self.misses = 0
+        self.expirations = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._next_id = 0
+        self._entries = OrderedDict() # entry id -> (key, stored_at, unit question vector, question, reply), LRU first
+        self._ids_by_key = {}         # key -> [entry ids]
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _unit(vector: List[float]) -> np.ndarray:
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _remove(self, entry_id: int):
+        key = self._entries.pop(entry_id)[0]
+        ids = self._ids_by_key[key]
+        ids.remove(entry_id)
+        if not ids:
+            del self._ids_by_key[key]
+
+    def get(self, key: Hashable, query_vector: List[float]) -> Optional[dict]:
+        """The most similar cached answer under key as {"reply", "question", "similarity"}, or None."""
+        if self.max_entries <= 0:
+            return None
+        query = self._unit(query_vector)
+        now = time.monotonic()
+        with self._lock:
+            best_id, best_similarity = None, self.similarity_threshold
+            for entry_id in list(self._ids_by_key.get(key, ())):
+                _, stored_at, vector, _, _ = self._entries[entry_id]
+                if self.ttl_seconds > 0 and now - stored_at > self.ttl_seconds:
+                    self._remove(entry_id)
+                    self.expirations += 1
+                    continue
+                similarity = float(np.dot(query, vector))
+                if similarity >= best_similarity:
+                    best_id, best_similarity = entry_id, similarity
+            if best_id is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(best_id)
+            self.hits += 1
+            _, _, _, question, reply = self._entries[best_id]
+            return {"reply": reply, "question": question, "similarity": best_similarity}
+
+    def put(self, key: Hashable, query_vector: List[float], question: str, reply: str):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = (key, time.monotonic(), self._unit(query_vector), question, reply)
+            self._ids_by_key.setdefault(key, []).append(entry_id)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self._ids_by_key.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "similarity_threshold": self.similarity_threshold,
+                "hits": self.hits,
+                "misses": self.misses,
+                "expirations": self.expirations,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "hit_rate": (self.hits / lookups) if lookups else 0.0,
+            }
@@ -1,6 +1,11 @@
 # backend/rag_service.py
 
 import os
+import json
+import time
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
 # load_dotenv is typically called in the main app file (app.py)
 # from dotenv import load_dotenv
 
@@ -9,8 +14,18 @@ from google.generativeai import GenerativeModel, configure as genai_configure
 from google.generativeai.types import HarmCategory, HarmBlockThreshold
 
 # LangChain components
-from langchain_community.vectorstores import Chroma
-from langchain_community.embeddings import HuggingFaceEmbeddings # Must use the SAME embedding model
+from vector_backends import open_vector_store, vector_store_directory, VECTOR_STORE_BACKEND # Chroma or the flat mmap index
+from embedding_backends import create_embedding_model # Must use the SAME embedding model as ingestion
+from index_generation import index_generation_stamp # Bumped by ingestion when it commits new chunks
+from legal_text import normalize_text # Same normalization the chunks got at ingestion
+from lexical_index import LexicalIndex, reciprocal_rank_fusion, LEXICAL_INDEX_PATH # BM25 side of hybrid retrieval
+from legal_categories import resolve_category, category_filter # Category-filtered retrieval
+from service_metrics import StageTimer, RAG_ANSWERS, RETRIEVAL_SCOPE, LLM_IN_FLIGHT, CONTEXT_TOKENS, RAG_FIRST_TOKEN_SECONDS, RAG_EXECUTOR_JOBS, REGISTRY # Latency histograms and counters for /metrics
+from context_packer import pack_context, estimate_tokens # Merges neighbouring chunks and fits the context to a token budget
+from query_batcher import QueryBatcher, QUERY_BATCH_MAX_SIZE # Embeds and searches concurrent questions together
+from query_cache import TTLLRUCache, SemanticResponseCache, QUERY_EMBEDDING_CACHE_SIZE, QUERY_EMBEDDING_CACHE_TTL, \
+    RESPONSE_CACHE_SIZE, RESPONSE_CACHE_TTL, RESPONSE_CACHE_SIMILARITY
+from langchain_core.documents import Document
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.runnables import RunnablePassthrough, RunnableLambda # Add RunnableLambda
 from operator import itemgetter # Add itemgetter
@@ -33,26 +48,150 @@ CHROMA_COLLECTION_NAME = "joradp_documents"
 # Gemini LLM model name (use the one that successfully initialized)
 GEMINI_LLM_MODEL_NAME = "gemini-2.0-flash"
 
+# Number of chunks retrieved per question (and sent to Gemini). Hybrid retrieval puts exact article
+# and law-number matches in the top few, so a small k no longer misses them.
+RETRIEVAL_K = 5
+# Candidates taken from each of the vector and BM25 rankings before reciprocal rank fusion
+HYBRID_CANDIDATE_K = 20
+
+# Threads running the blocking retrieval stages (query embedding, vector and BM25 search, index
+# reloads) of the async server's requests (asgi_app.py). Gemini calls don't take one, so this bounds
+# CPU work, not in-flight chats; beyond it requests queue for retrieval (mezan_rag_executor_jobs).
+RAG_EXECUTOR_WORKERS = int(os.getenv("RAG_EXECUTOR_WORKERS", 4))
+
+# Prompt sent to Gemini, filled with {context}, {category} and {question}.
+# Bump PROMPT_VERSION whenever it (or the context format) changes, so cached answers to the old prompt are not served.
+PROMPT_VERSION = 2
+PROMPT_TEMPLATE = """
+         **Role:** You are Mezan, a helpful AI assistant providing guidance and information on Algerian law. You are part of a university project.
+
+        **Your Knowledge Sources:**
+        - "Context Snippets from JORADP" provided below (from processed Algerian Official Journal documents).
+        - Your inherent general knowledge about law and Algeria.
+
+        **Context Snippets from JORADP:**
+        {context}
+
+        **User's Question related to the legal category "{category}":**
+        {question}
+
+        **Task:**
+        1. Analyze the user's question and the provided "Context Snippets from JORADP".
+        2. Provide a clear, concise answer and accurate answer.
+        3. **If the "Context Snippets" are relevant and sufficient, base your answer *solely* on them.** Quote or reference them where appropriate. Do NOT paraphrase if quoting directly is possible and relevant.
+        4. **If the "Context Snippets" are not relevant, are insufficient, or do not contain the specific answer:**
+           a. Explicitly state that the answer was not found in the provided documents (e.g., "Based on the available documents, I couldn't find information on...").
+           b. Then, **use your general knowledge about law and Algeria** to provide, relevant information that might help the user understand the topic. Ensure this general information is distinct from information found in the snippets.
+        5. RESPOND IN THE SAME LANGUAGE AS THE USER'S QUESTION, AND **ENSURE THE WRITING (especially Arabic) IS CORRECT, CLEAR, AND HAS NO TYPOS.**
+        6. Aim to provide guidance relevant to Algerian law, indicating potential legal validity or next steps based on the information available (from snippets or general knowledge).
+
+        **Constraints:**
+        * Keep the response informative and relevant to legal principles.
+        * Adhere to your safety settings.
+        * Pay close attention to Arabic grammar, spelling, and correct character usage.
+        * **Do NOT invent information.** If neither snippets nor general knowledge can provide relevant information, state that you cannot answer based on the current query or knowledge.
+
+        **Answer:**
+        """
+
 
 # --- Global Variables for Initialized Components (Load once) ---
 embedding_model = None
 vector_store = None # This will be the loaded vector store
+lexical_index = None # BM25 index built by ingestion over the same chunks; None means vector-only retrieval
 llm_model_instance = None
+loaded_index_stamp = None # Index generation marker stamp the current vector_store was opened at
+_reload_lock = threading.Lock()
+# Normalized query -> embedding. Category pages send the same few questions over and over; a hit
+# skips the sentence-transformer forward pass (and the on-disk cache lookup behind it).
+query_embedding_cache = TTLLRUCache(QUERY_EMBEDDING_CACHE_SIZE, QUERY_EMBEDDING_CACHE_TTL, name="query_embeddings")
+# Gemini answers reused for repeated or paraphrased questions that retrieve the same chunks
+response_cache = SemanticResponseCache(RESPONSE_CACHE_SIZE, RESPONSE_CACHE_TTL, RESPONSE_CACHE_SIMILARITY)
+# Retrieval stages of async requests; threads are only started once the async server uses it
+_rag_executor = ThreadPoolExecutor(max_workers=RAG_EXECUTOR_WORKERS, thread_name_prefix="rag")
+
+
+def _load_vector_store():
+    """Opens the vector store persisted by ingestion.py (Chroma or the flat index); returns None if it can't be loaded."""
+    global loaded_index_stamp
+    store_dir = vector_store_directory(VECTOR_STORE_DIR)
+    print(f"RAG Service: Loading {VECTOR_STORE_BACKEND} vector store from: {store_dir}")
+    if not os.path.exists(store_dir):
+        print(f"Error: Vector store directory not found: {store_dir}. Please run ingestion.py first.")
+        return None # Let the LLM initialize even if the vector store isn't found
+    try:
+        # Taken before opening, so a generation published while loading triggers another reload
+        stamp = index_generation_stamp()
+        # Load the existing store from the persistence directory
+        store = open_vector_store(
+            embedding_model, # Must use the SAME embedding function for querying
+            CHROMA_COLLECTION_NAME,
+            store_dir,
+        )
+        document_count = store._collection.count()
+        print(f"RAG Service: Vector store loaded. Collection: '{CHROMA_COLLECTION_NAME}'. Documents in collection: {document_count}")
+        if document_count == 0:
+            print("Warning: Loaded vector store is empty. RAG will not find any relevant documents. Please run ingestion.py.")
+        loaded_index_stamp = stamp
+        return store
+    except Exception as e:
+        print(f"RAG Service: Error loading vector store: {e}")
+        import traceback; traceback.print_exc()
+        return None
+
+
+def _load_lexical_index():
+    """Loads the BM25 index saved by ingestion.py; returns None (vector-only retrieval) if it can't be loaded."""
+    if not os.path.exists(LEXICAL_INDEX_PATH):
+        print(f"Warning: Lexical index not found at {LEXICAL_INDEX_PATH}; retrieval is vector-only. Run ingestion.py to build it.")
+        return None
+    try:
+        index = LexicalIndex.load(LEXICAL_INDEX_PATH)
+        print(f"RAG Service: Lexical index loaded: {index.stats()}")
+        return index
+    except Exception as e:
+        print(f"RAG Service: Error loading lexical index: {e}")
+        return None
+
+
+def refresh_vector_store_if_updated():
+    """
+    Reopens the vector store when ingestion (the --watch daemon or a one-shot run) has published a
+    new index generation, so newly committed chunks are served without restarting the app. Chroma's
+    persistent client caches the collection per process, so another process's writes only become
+    visible through a fresh client. Costs one stat() per request when nothing changed.
+    """
+    global vector_store, lexical_index
+    if embedding_model is None or index_generation_stamp() == loaded_index_stamp:
+        return
+    with _reload_lock:
+        if index_generation_stamp() == loaded_index_stamp:
+            return # Another request already reloaded
+        print("RAG Service: Ingestion published a new index generation; reopening the vector store.")
+        if VECTOR_STORE_BACKEND == "chroma":
+            try:
+                from chromadb.api.client import SharedSystemClient
+                SharedSystemClient.clear_system_cache() # Otherwise Chroma hands back the cached client
+            except Exception as e:
+                print(f"RAG Service: Could not reset the Chroma client cache: {e}")
+        store = _load_vector_store()
+        if store is not None:
+            vector_store = store # Keep serving from the old store if the reload failed
+            lexical_index = _load_lexical_index() # Rebuilt by the same ingestion run
+            response_cache.clear() # Cached answers were grounded in the previous index
 
 
 def initialize_rag_components():
     """Initializes embedding model (for querying), loads vector store, and initializes LLM."""
-    global embedding_model, vector_store, llm_model_instance
+    global embedding_model, vector_store, lexical_index, llm_model_instance
 
     # 1. Initialize Embedding Model (MUST BE THE SAME MODEL/PARAMS AS INGESTION)
     if embedding_model is None:
         print(f"RAG Service: Initializing embedding model for querying: {EMBEDDING_MODEL_NAME}")
         try:
-            # Using a local Sentence Transformer model via HuggingFaceEmbeddings
-            embedding_model = HuggingFaceEmbeddings(
-                model_name=EMBEDDING_MODEL_NAME,
-                model_kwargs={'device': 'cpu'} # Use CPU device consistently
-            )
+            # Same construction path as ingestion (CPU, persistent embedding cache), so repeated
+            # queries are served from the cache instead of a forward pass
+            embedding_model = create_embedding_model(EMBEDDING_MODEL_NAME)
             print("RAG Service: Embedding model initialized.")
         except Exception as e:
             print(f"RAG Service: Error initializing embedding model: {e}")
@@ -62,26 +201,8 @@ def initialize_rag_components():
 
     # 2. Load Vector Store (Loads the data persisted by ingestion.py)
     if vector_store is None and embedding_model is not None:
-        print(f"RAG Service: Loading ChromaDB vector store from: {VECTOR_STORE_DIR}")
-        if not os.path.exists(VECTOR_STORE_DIR):
-            print(f"Error: Vector store directory not found: {VECTOR_STORE_DIR}. Please run ingestion.py first.")
-            vector_store = None # Ensure it's None if directory is missing
-            # Do NOT return here, let LLM initialize even if vector store isn't found
-        else: # Only load if directory exists
-            try:
-                # Load the existing ChromaDB from the persistence directory
-                vector_store = Chroma(
-                    collection_name=CHROMA_COLLECTION_NAME,
-                    embedding_function=embedding_model, # Must use the SAME embedding function for querying
-                    persist_directory=VECTOR_STORE_DIR
-                )
-                print(f"RAG Service: ChromaDB loaded. Collection: '{CHROMA_COLLECTION_NAME}'. Documents in collection: {vector_store._collection.count()}")
-                if vector_store._collection.count() == 0:
-                    print("Warning: Loaded vector store is empty. RAG will not find any relevant documents. Please run ingestion.py.")
-            except Exception as e:
-                print(f"RAG Service: Error loading vector store: {e}")
-                import traceback; traceback.print_exc()
-                vector_store = None
+        vector_store = _load_vector_store()
+        lexical_index = _load_lexical_index()
 
 
     # 3. Initialize LLM (Gemini)
@@ -120,8 +241,177 @@ def initialize_rag_components():
 initialize_rag_components()
 
 
+def _cache_metrics():
+    """Scrape-time /metrics families for the in-memory caches."""
+    stats = {"query_embeddings": query_embedding_cache.stats(), "responses": response_cache.stats()}
+    families = (
+        ("mezan_cache_hits_total", "Cache hits.", "counter", "hits"),
+        ("mezan_cache_misses_total", "Cache misses (including expired entries).", "counter", "misses"),
+        ("mezan_cache_evictions_total", "Entries evicted to stay within the size bound.", "counter", "evictions"),
+        ("mezan_cache_entries", "Entries currently cached.", "gauge", "entries"),
+    )
+    return [(name, help_text, metric_type, {(("cache", cache),): cache_stats[field] for cache, cache_stats in stats.items()})
+            for name, help_text, metric_type, field in families]
+
+
+REGISTRY.add_collector(_cache_metrics)
+
+
+def normalize_query(user_message: str) -> str:
+    """Query text as it is embedded and cached: normalized like the chunks, on one line."""
+    return " ".join(normalize_text(user_message).split())
+
+
+def embed_query_cached(user_message: str):
+    """Embedding of the normalized query, served from query_embedding_cache when possible."""
+    query = normalize_query(user_message)
+    vector = query_embedding_cache.get(query)
+    if vector is None:
+        vector = embedding_model.embed_query(query)
+        query_embedding_cache.put(query, vector)
+    return vector
+
+
+def _vector_search_many(query_vectors: list, k: int, where: dict = None) -> list:
+    """Nearest chunks to each query embedding (among those matching where), as lists of Documents carrying their Chroma IDs."""
+    results = vector_store._collection.query(query_embeddings=query_vectors, n_results=k, where=where,
+                                             include=["documents", "metadatas"])
+    return [[Document(page_content=text, metadata=metadata or {}, id=chunk_id)
+             for chunk_id, text, metadata in zip(ids, documents, metadatas)]
+            for ids, documents, metadatas in zip(results["ids"], results["documents"], results["metadatas"])]
+
+
+def _vector_search(query_vector, k: int, where: dict = None) -> list:
+    """Nearest chunks to the query embedding (among those matching where), as Documents carrying their Chroma IDs."""
+    return _vector_search_many([query_vector], k, where)[0]
+
+
+def _vector_search_params(category: str = None) -> tuple:
+    """(k, where) of _hybrid_search's vector search within the category (a resolved partition, or None for the whole index)."""
+    return HYBRID_CANDIDATE_K if lexical_index is not None else RETRIEVAL_K, category_filter(category) if category else None
+
+
+def _hybrid_search(user_message: str, query_vector, timer: StageTimer, category: str = None, vector_docs: list = None) -> list:
+    """
+    Hybrid retrieval: the HYBRID_CANDIDATE_K nearest chunks by embedding and the HYBRID_CANDIDATE_K
+    best BM25 matches (exact article/law numbers and terms the embedding model blurs) are merged by
+    reciprocal rank fusion, and the top RETRIEVAL_K are returned. Vector-only without a lexical index.
+    With a category, both searches only consider chunks tagged with it. vector_docs are the vector
+    search's results when they were already fetched (query batcher).
+    """
+    if vector_docs is None:
+        with timer.stage("search"):
+            vector_docs = _vector_search(query_vector, *_vector_search_params(category))
+    if lexical_index is None:
+        return vector_docs
+
+    with timer.stage("lexical_search"):
+        lexical_ids = [chunk_id for chunk_id, _ in lexical_index.search(user_message, HYBRID_CANDIDATE_K, tag=category)]
+    with timer.stage("fusion"):
+        fused_ids = [chunk_id for chunk_id, _ in
+                     reciprocal_rank_fusion([[doc.id for doc in vector_docs], lexical_ids], limit=RETRIEVAL_K)]
+        docs_by_id = {doc.id: doc for doc in vector_docs}
+        missing = [chunk_id for chunk_id in fused_ids if chunk_id not in docs_by_id]
+        if missing:
+            fetched = vector_store._collection.get(ids=missing, include=["documents", "metadatas"])
+            for chunk_id, text, metadata in zip(fetched["ids"], fetched["documents"], fetched["metadatas"]):
+                docs_by_id[chunk_id] = Document(page_content=text, metadata=metadata or {}, id=chunk_id)
+    print(f"RAG Service: Hybrid retrieval: {len(missing)} of {len(fused_ids)} chunks found by BM25 only.")
+    # A chunk deleted since the lexical index was built is simply skipped
+    return [docs_by_id[chunk_id] for chunk_id in fused_ids if chunk_id in docs_by_id]
+
+
+def retrieve_documents(user_message: str, query_vector, timer: StageTimer, category: str = None, vector_docs: list = None) -> list:
+    """
+    RETRIEVAL_K chunks for the question. When the request's category is one chunks are tagged with
+    (legal_categories), the search is restricted to that category's chunks, so it scans a fraction
+    of the corpus and every slot goes to an on-topic chunk. If the category yields fewer than
+    RETRIEVAL_K chunks (untagged collection, rare category), the rest comes from the global index.
+    vector_docs are the first vector search's results if embed_and_search already ran it.
+    """
+    partition = resolve_category(category)
+    if partition is None:
+        RETRIEVAL_SCOPE.inc(scope="global")
+        return _hybrid_search(user_message, query_vector, timer, vector_docs=vector_docs)
+
+    docs = _hybrid_search(user_message, query_vector, timer, partition, vector_docs)
+    if len(docs) >= RETRIEVAL_K:
+        RETRIEVAL_SCOPE.inc(scope="category")
+        return docs
+    print(f"RAG Service: Only {len(docs)} chunks in category '{partition}'; topping up from the global index.")
+    RETRIEVAL_SCOPE.inc(scope="fallback")
+    seen = {doc.id for doc in docs}
+    extra = [doc for doc in _hybrid_search(user_message, query_vector, timer) if doc.id not in seen]
+    return docs + extra[:RETRIEVAL_K - len(docs)]
+
+
+def _embed_and_search_batch(items: list) -> list:
+    """
+    One query batch: items are (normalized query, cached embedding or None, k, where). The uncached
+    queries go through the embedding model in a single embed_documents call, and each distinct
+    (k, where) gets one multi-query vector search. Returns {"vector", "docs", "embed_seconds",
+    "search_seconds"} per item; the seconds are the whole batch's.
+    """
+    vectors = [vector for _, vector, _, _ in items]
+    texts = list(dict.fromkeys(query for query, vector, _, _ in items if vector is None))
+    start = time.perf_counter()
+    if texts:
+        embedded = dict(zip(texts, embedding_model.embed_documents(texts)))
+        for text, vector in embedded.items():
+            query_embedding_cache.put(text, vector)
+        vectors = [embedded[query] if vector is None else vector for (query, _, _, _), vector in zip(items, vectors)]
+    embed_seconds = time.perf_counter() - start
+
+    groups = {}
+    for i, (_, _, k, where) in enumerate(items):
+        groups.setdefault((k, json.dumps(where, sort_keys=True)), []).append(i)
+    docs = [None] * len(items)
+    start = time.perf_counter()
+    for (k, _), indexes in groups.items():
+        for i, found in zip(indexes, _vector_search_many([vectors[i] for i in indexes], k, items[indexes[0]][3])):
+            docs[i] = found
+    search_seconds = time.perf_counter() - start
+    return [{"vector": vector, "docs": found, "embed_seconds": embed_seconds, "search_seconds": search_seconds}
+            for vector, found in zip(vectors, docs)]
+
+
+# Shared by every request thread of the process (and the async server's event loop)
+query_batcher = QueryBatcher(_embed_and_search_batch) if QUERY_BATCH_MAX_SIZE > 1 else None
+
+
+def _batch_item(user_message: str, category: str) -> tuple:
+    """The query batcher item of a question: (normalized query, cached embedding or None, k, where)."""
+    query = normalize_query(user_message)
+    return (query, query_embedding_cache.get(query), *_vector_search_params(resolve_category(category)))
+
+
+def _batched(result: tuple, timer: StageTimer) -> tuple:
+    """(query vector, vector docs) from a query batcher result, with its stages recorded in timer."""
+    result, queue_wait = result
+    timer.record("query_queue", queue_wait)
+    timer.record("embed_query", result["embed_seconds"])
+    timer.record("search", result["search_seconds"])
+    return result["vector"], result["docs"]
+
+
+def embed_and_search(user_message: str, category: str, timer: StageTimer) -> tuple:
+    """
+    (query vector, results of retrieve_documents' first vector search). With the query batcher,
+    the question is embedded and searched in a batch with the other requests' questions; without
+    it, the embedding comes from embed_query_cached and retrieve_documents runs the search (None).
+    """
+    if query_batcher is None:
+        with timer.stage("embed_query"):
+            return embed_query_cached(user_message), None
+    return _batched(query_batcher.submit(_batch_item(user_message, category)).result(), timer)
+
+
 def format_docs_for_prompt(docs: list) -> str:
-    """Helper function to format retrieved documents (list of Document objects) for the prompt."""
+    """
+    Helper function to format retrieved documents (list of Document objects) for the prompt, one
+    snippet per chunk. The prompt now gets pack_context's output; this unpacked format is what the
+    logged token savings are measured against.
+    """
     if not docs:
         # This case should ideally be handled by the prompt instructions if context is empty
         return "No relevant context snippets were retrieved."
@@ -130,129 +420,380 @@ def format_docs_for_prompt(docs: list) -> str:
     return "\n\n".join([f"--- Context Snippet from JORADP (Source: {doc.metadata.get('source', 'N/A')}, Chunk: {doc.metadata.get('chunk_num', 'N/A')}) ---\n{doc.page_content}" for doc in docs])
 
 
-def get_rag_response(user_message: str, category: str) -> str:
-    """
-    Performs RAG:
-    1. Receives user message and category.
-    2. Retrieves relevant contexts from the loaded vector store based on the user message.
-    3. Constructs an augmented prompt using the user message and retrieved contexts.
-    4. Calls the LLM (Gemini) with the augmented prompt.
-    5. Returns the LLM's response text.
-    """
-    print(f"RAG Service: Received query for category '{category}': '{user_message}'")
+def _chunk_id(doc) -> str:
+    """Chroma ID of a retrieved chunk (source and chunk number for stores that don't return IDs)."""
+    return getattr(doc, "id", None) or f"{doc.metadata.get('source')}:{doc.metadata.get('chunk_num')}"
+
+
+def _answer(reply: str, outcome: str, timer: StageTimer, cached: bool = False) -> dict:
+    """Counts the outcome and closes the request's timing breakdown."""
+    RAG_ANSWERS.inc(outcome=outcome)
+    return {"reply": reply, "cached": cached, "outcome": outcome, "timings": timer.finish()}
+
+
+def _sources(docs: list) -> list:
+    """Retrieved chunks grouped by source document, best-ranked first: [{"source", "pages", "chunks"}]."""
+    sources = {}
+    for doc in docs:
+        entry = sources.setdefault(doc.metadata.get("source"), {"source": doc.metadata.get("source"), "pages": [], "chunks": []})
+        page = doc.metadata.get("page")
+        if page is not None and page not in entry["pages"]:
+            entry["pages"].append(page)
+        entry["chunks"].append(_chunk_id(doc))
+    return list(sources.values())
+
+
+def _unavailable_answer(timer: StageTimer):
+    """Picks up index changes; (reply, "unavailable") if a component isn't loaded, else None."""
+    # Pick up chunks committed by ingestion since the store was opened
+    with timer.stage("refresh"):
+        refresh_vector_store_if_updated()
 
     # --- Check if essential components are initialized before proceeding ---
     if vector_store is None or embedding_model is None:
          print("Error: Vector store or embedding model not initialized. Cannot perform RAG retrieval.")
          # Return a specific error message indicating ingestion failure
-         return "Apologies, the legal knowledge base is not fully loaded. Please contact support or try again later."
+         return "Apologies, the legal knowledge base is not fully loaded. Please contact support or try again later.", "unavailable"
 
     if llm_model_instance is None:
         print("Error: LLM instance not initialized. Cannot generate AI response.")
         # Return a specific error message indicating LLM failure
-        return "Apologies, the AI language model is currently unavailable. Please check backend configuration."
+        return "Apologies, the AI language model is currently unavailable. Please check backend configuration.", "unavailable"
+    return None
 
 
-    try:
-        # --- 1. Retrieve relevant documents (contexts) ---
-        # Use the loaded vector store's retriever.
-        # LangChain's retriever.invoke() will use the associated embedding function
-        # to embed the user_message and perform the similarity search.
-        # k=10 is used to retrieve the top 10 most similar document chunks.
-        retriever = vector_store.as_retriever(search_kwargs={"k": 10}) # Using k=10
-
-        print(f"RAG Service: Retrieving documents for query: '{user_message[:50]}...'")
-        # The retriever.invoke method takes the query string as input.
-        retrieved_docs = retriever.invoke(user_message)
-
-        print(f"RAG Service: Retrieved {len(retrieved_docs)} documents.")
-        # Debug: print(f"Retrieved Docs: {retrieved_docs}") # Uncomment to see retrieved content
+def _prepare_answer(user_message: str, category: str, timer: StageTimer, embedded: tuple = None) -> dict:
+    """
+    The stages before the LLM call, shared by get_rag_answer and stream_rag_answer. Returns
+    {"answer": (reply, outcome)} when the request ends here (components not loaded, response cache
+    hit), else {"docs", "query_vector", "cache_key", "prompt"}. With docs retrieved, "docs" is set
+    in both cases. Exceptions are left to the caller. embedded is embed_and_search's result when
+    the caller already checked the components and ran it (async server).
+    """
+    if embedded is None:
+        unavailable = _unavailable_answer(timer)
+        if unavailable:
+            return {"answer": unavailable}
+
+    # --- 1. Retrieve relevant documents (contexts) ---
+    # The query is normalized like the stored chunks (diacritics, alef/yaa variants, digits) and
+    # embedded once per distinct question, in a batch with concurrent requests' questions (see
+    # embed_and_search); the vector search then skips LangChain's retriever, which would re-embed
+    # the text. BM25 matches are fused in, within the category (see retrieve_documents).
+    # The LLM still gets the message as typed.
+    print(f"RAG Service: Retrieving documents for query: '{user_message[:50]}...'")
+    query_vector, vector_docs = embedded or embed_and_search(user_message, category, timer)
+    retrieved_docs = retrieve_documents(user_message, query_vector, timer, category, vector_docs)
+
+    cache_stats = query_embedding_cache.stats()
+    print(f"RAG Service: Retrieved {len(retrieved_docs)} documents. "
+          f"Query embedding cache hit rate: {cache_stats['hit_rate']:.0%} ({cache_stats['entries']} entries).")
+    # Debug: print(f"Retrieved Docs: {retrieved_docs}") # Uncomment to see retrieved content
+
+    # Paraphrases of an answered question that retrieve the same chunks get the same answer,
+    # without contacting the LLM. Order-insensitive: paraphrases often rank the chunks differently.
+    cache_key = (category, tuple(sorted(_chunk_id(doc) for doc in retrieved_docs)), PROMPT_VERSION, GEMINI_LLM_MODEL_NAME)
+    with timer.stage("response_cache"):
+        cached = response_cache.get(cache_key, query_vector)
+    if cached is not None:
+        print(f"RAG Service: Served from the response cache (similarity {cached['similarity']:.3f} "
+              f"to '{cached['question'][:50]}'); hit rate {response_cache.stats()['hit_rate']:.0%}.")
+        return {"answer": (cached["reply"], "cache"), "docs": retrieved_docs}
+
+
+    # --- 2. Pack the retrieved documents into the prompt context ---
+    # Neighbouring chunks of a source are merged (their overlap kept once), near-duplicates are
+    # dropped and the rest is fitted to CONTEXT_TOKEN_BUDGET, best-ranked first (see context_packer)
+    with timer.stage("pack_context"):
+        context_text, packing = pack_context(retrieved_docs)
+        retrieved_tokens = estimate_tokens(format_docs_for_prompt(retrieved_docs))
+    CONTEXT_TOKENS.inc(retrieved_tokens, kind="retrieved")
+    CONTEXT_TOKENS.inc(packing["tokens"], kind="sent")
+    print(f"RAG Service: Packed {packing['chunks']} chunks into {packing['passages']} passages "
+          f"({packing['merged']} merged, {packing['duplicates']} near-duplicates, {packing['truncated']} cut, "
+          f"{packing['over_budget']} over budget): ~{packing['tokens']} context tokens, "
+          f"~{retrieved_tokens - packing['tokens']} saved of ~{retrieved_tokens}.")
+
+    # --- 3. Construct the Augmented Prompt ---
+    # PROMPT_TEMPLATE guides the AI using the retrieved context AND its general knowledge.
+    # Everything is formatted into a single string message for the LLM direct call.
+    with timer.stage("format_prompt"):
+        final_prompt_string = PROMPT_TEMPLATE.format(
+            context=context_text, # Populated by RAG
+            category=category,    # From frontend input
+            question=user_message # From frontend input
+        )
 
+    print(f"RAG Service: Sending augmented prompt to Gemini: {final_prompt_string[:500]}...") # Log larger snippet
+    return {"docs": retrieved_docs, "query_vector": query_vector, "cache_key": cache_key, "prompt": final_prompt_string}
 
-        # --- 2. Format the retrieved documents for the prompt ---
-        # The format_docs_for_prompt function prepares the retrieved documents into a string.
-        context_text = format_docs_for_prompt(retrieved_docs)
-        # Debug: print(f"Formatted Context: {context_text[:300]}...") # Uncomment to see formatted context snippet
 
+def _blocked_reply(response):
+    """Reply for a Gemini response with no text: the safety-filter message if it was blocked, else the empty-answer one."""
+    if response and response.prompt_feedback and response.prompt_feedback.block_reason:
+         block_reason_message = response.prompt_feedback.block_reason_message or "Content blocked by safety filters."
+         print(f"RAG Service: Gemini response blocked. Reason: {response.prompt_feedback.block_reason}, Message: {block_reason_message}")
+         # Return a specific message if blocked
+         return f"Sorry, I couldn't generate a response for that request. {block_reason_message} Please try rephrasing your question.", "blocked"
+    # Handle empty response that wasn't explicitly blocked
+    print("RAG Service: Gemini response was empty or format not recognized.")
+    # Debug: print(f"Full Gemini response object: {response}")
+    # Provide a fallback message if AI returns empty
+    return "Apologies, I couldn't generate a meaningful response based on your query and the available information.", "empty"
 
-        # --- 3. Construct the Augmented Prompt ---
-        # This prompt template guides the AI using the retrieved context AND its general knowledge.
-        template = """
-         **Role:** You are Mezan, a helpful AI assistant providing guidance and information on Algerian law. You are part of a university project.
 
-        **Your Knowledge Sources:**
-        - "Context Snippets from JORADP" provided below (from processed Algerian Official Journal documents).
-        - Your inherent general knowledge about law and Algeria.
+def _response_text(response) -> str:
+    """Text of a whole (non-streamed) Gemini response."""
+    reply_text = ""
+    if response and hasattr(response, 'text') and response.text:
+        reply_text = response.text
+    elif response and response.parts:
+         for part in response.parts:
+             if hasattr(part, 'text') and part.text:
+                 reply_text += part.text
+    return reply_text
 
-        **Context Snippets from JORADP:**
-        {context}
 
-        **User's Question related to the legal category "{category}":**
-        {question}
+def _chunk_text(chunk) -> str:
+    """Text of one streamed Gemini chunk; '' for chunks without candidates (blocked prompts, final usage chunk)."""
+    if not chunk.candidates or not chunk.candidates[0].content:
+        return ""
+    return "".join(getattr(part, "text", "") or "" for part in chunk.candidates[0].content.parts)
 
-        **Task:**
-        1. Analyze the user's question and the provided "Context Snippets from JORADP".
-        2. Provide a clear, concise answer and accurate answer.
-        3. **If the "Context Snippets" are relevant and sufficient, base your answer *solely* on them.** Quote or reference them where appropriate. Do NOT paraphrase if quoting directly is possible and relevant.
-        4. **If the "Context Snippets" are not relevant, are insufficient, or do not contain the specific answer:**
-           a. Explicitly state that the answer was not found in the provided documents (e.g., "Based on the available documents, I couldn't find information on...").
-           b. Then, **use your general knowledge about law and Algeria** to provide, relevant information that might help the user understand the topic. Ensure this general information is distinct from information found in the snippets.
-        5. RESPOND IN THE SAME LANGUAGE AS THE USER'S QUESTION, AND **ENSURE THE WRITING (especially Arabic) IS CORRECT, CLEAR, AND HAS NO TYPOS.**
-        6. Aim to provide guidance relevant to Algerian law, indicating potential legal validity or next steps based on the information available (from snippets or general knowledge).
 
-        **Constraints:**
-        * Keep the response informative and relevant to legal principles.
-        * Adhere to your safety settings.
-        * Pay close attention to Arabic grammar, spelling, and correct character usage.
-        * **Do NOT invent information.** If neither snippets nor general knowledge can provide relevant information, state that you cannot answer based on the current query or knowledge.
+def get_rag_response(user_message: str, category: str) -> str:
+    """Answer text only (see get_rag_answer)."""
+    return get_rag_answer(user_message, category)["reply"]
 
-        **Answer:**
-        """
-        # Create a ChatPromptTemplate instance
-        prompt_template = ChatPromptTemplate.from_template(template)
 
-        # Format the prompt with the retrieved context, user question, and category
-        # We format the prompt into a single string message for the LLM direct call.
-        final_prompt_string = template.format(
-            context=context_text, # Populated by RAG
-            category=category,    # From frontend input
-            question=user_message # From frontend input
-        )
+def get_rag_answer(user_message: str, category: str) -> dict:
+    """
+    Performs RAG:
+    1. Receives user message and category.
+    2. Retrieves relevant contexts based on the user message: vector search fused with BM25
+       keyword matches, among the chunks tagged with the category if it is a known one
+       (see retrieve_documents).
+    3. Serves the answer from the semantic response cache if a near-identical question in this
+       category retrieved the same chunks.
+    4. Otherwise constructs an augmented prompt using the user message and retrieved contexts
+       and calls the LLM (Gemini) with it.
+    5. Returns {"reply": response text, "cached": whether it came from the response cache,
+       "outcome": llm/cache/blocked/empty/unavailable/error, "timings": {stage: seconds}}.
+    Every stage is timed into the mezan_rag_stage_seconds histogram served on /metrics.
+    """
+    print(f"RAG Service: Received query for category '{category}': '{user_message}'")
+    timer = StageTimer()
 
-        print(f"RAG Service: Sending augmented prompt to Gemini: {final_prompt_string[:500]}...") # Log larger snippet
+    try:
+        prepared = _prepare_answer(user_message, category, timer)
+        if "answer" in prepared:
+            reply, outcome = prepared["answer"]
+            return _answer(reply, outcome, timer, cached=outcome == "cache")
 
 
         # --- 4. Call the LLM (Gemini) with the augmented prompt ---
         # Use the direct SDK call
-        response = llm_model_instance.generate_content(final_prompt_string)
+        with timer.stage("llm"), LLM_IN_FLIGHT.track_in_progress():
+            response = llm_model_instance.generate_content(prepared["prompt"])
 
         # Extract the text response - Handle different response structures and blocks
-        reply_text = ""
-        if response and hasattr(response, 'text') and response.text:
-            reply_text = response.text
-        elif response and response.parts:
-             for part in response.parts:
-                 if hasattr(part, 'text') and part.text:
-                     reply_text += part.text
-        # Handle blocked content
-        if not reply_text and response and response.prompt_feedback and response.prompt_feedback.block_reason:
-             block_reason_message = response.prompt_feedback.block_reason_message or "Content blocked by safety filters."
-             print(f"RAG Service: Gemini response blocked. Reason: {response.prompt_feedback.block_reason}, Message: {block_reason_message}")
-             # Return a specific message if blocked
-             return f"Sorry, I couldn't generate a response for that request. {block_reason_message} Please try rephrasing your question."
-        elif not reply_text:
-            # Handle empty response that wasn't explicitly blocked
-            print("RAG Service: Gemini response was empty or format not recognized.")
-            # Debug: print(f"Full Gemini response object: {response}")
-            # Provide a fallback message if AI returns empty
-            return "Apologies, I couldn't generate a meaningful response based on your query and the available information."
+        reply_text = _response_text(response)
+        # Handle blocked or empty content
+        if not reply_text:
+            return _answer(*_blocked_reply(response), timer)
 
 
         print(f"RAG Service: Gemini generated text: {reply_text[:200]}...") # Log larger snippet
-        return reply_text # Return the final response text
+        response_cache.put(prepared["cache_key"], prepared["query_vector"], user_message, reply_text)
+        return _answer(reply_text, "llm", timer) # Return the final response text
 
     except Exception as e:
         print(f"Error during RAG process in rag_service: {e}")
         import traceback; traceback.print_exc()
         # Return a generic error message if RAG process fails
-        return "Sorry, I encountered an error while processing your request with the knowledge base."
+        return _answer("Sorry, I encountered an error while processing your request with the knowledge base.", "error", timer)
+
+
+class _StreamedAnswer:
+    """Bookkeeping shared by stream_rag_answer and stream_rag_answer_async: time to first text, the "done" event, cancellation."""
+
+    def __init__(self):
+        self.timer = StageTimer()
+        self.first_token = None
+        self.finished = False
+
+    def text(self, text: str, replace: bool = False) -> tuple:
+        """The "token" event for text (or "reply" when it replaces the answer so far), noting the time to the first one."""
+        if self.first_token is None:
+            self.first_token = time.perf_counter() - self.timer.started
+            RAG_FIRST_TOKEN_SECONDS.observe(self.first_token)
+        return ("reply" if replace else "token"), {"text": text}
+
+    def done(self, reply: str, outcome: str) -> tuple:
+        self.finished = True
+        answer = _answer(reply, outcome, self.timer, cached=outcome == "cache")
+        if self.first_token is not None:
+            answer["timings"]["first_token"] = self.first_token
+        return "done", {"outcome": outcome, "cached": answer["cached"], "timings": answer["timings"]}
+
+    def cancel(self):
+        """Counts the answer as cancelled if its stream is closed before the "done" event."""
+        if not self.finished:
+            print("RAG Service: Client disconnected; streamed answer cancelled.")
+            RAG_ANSWERS.inc(outcome="cancelled")
+            self.timer.finish()
+
+
+def stream_rag_answer(user_message: str, category: str):
+    """
+    get_rag_answer with the answer streamed as Gemini generates it. Yields (event, data) pairs:
+      ("sources", {"sources": [{"source", "pages", "chunks"}]}) - right after retrieval, before the LLM call
+      ("token", {"text": ...})  - the next piece of the answer, to append
+      ("reply", {"text": ...})  - a whole reply replacing anything sent so far (cache hits, blocked,
+                                  empty and error answers)
+      ("done", {"outcome", "cached", "timings"}) - always last
+    The time to the first answer text is observed in mezan_rag_time_to_first_token_seconds and
+    reported as the "first_token" timing. Closing the generator early (the browser went away)
+    stops reading from Gemini and counts the answer as "cancelled".
+    """
+    print(f"RAG Service: Received streamed query for category '{category}': '{user_message}'")
+    stream = _StreamedAnswer()
+    try:
+        prepared = _prepare_answer(user_message, category, stream.timer)
+        if "docs" in prepared:
+            yield "sources", {"sources": _sources(prepared["docs"])}
+        if "answer" in prepared:
+            reply, outcome = prepared["answer"]
+            yield stream.text(reply, replace=True)
+            yield stream.done(reply, outcome)
+            return
+
+        # --- 4. Stream the LLM (Gemini) answer, forwarding each chunk as it arrives ---
+        reply_text, response = "", None
+        with stream.timer.stage("llm"), LLM_IN_FLIGHT.track_in_progress():
+            response = llm_model_instance.generate_content(prepared["prompt"], stream=True)
+            for chunk in response:
+                text = _chunk_text(chunk)
+                if text:
+                    reply_text += text
+                    yield stream.text(text)
+
+        if not reply_text:
+            reply, outcome = _blocked_reply(response)
+            yield stream.text(reply, replace=True)
+            yield stream.done(reply, outcome)
+            return
+
+        print(f"RAG Service: Gemini streamed text: {reply_text[:200]}...")
+        response_cache.put(prepared["cache_key"], prepared["query_vector"], user_message, reply_text)
+        yield stream.done(reply_text, "llm")
+
+    except GeneratorExit:
+        stream.cancel()
+        raise
+    except Exception as e:
+        print(f"Error during streamed RAG process in rag_service: {e}")
+        import traceback; traceback.print_exc()
+        reply = "Sorry, I encountered an error while processing your request with the knowledge base."
+        yield stream.text(reply, replace=True)
+        yield stream.done(reply, "error")
+
+
+# --- Async variants (asgi_app.py) ---
+# Same stages and answers as above. The retrieval stages are synchronous and CPU-bound, so they run
+# on the bounded _rag_executor; the Gemini call is awaited on the event loop (generate_content_async)
+# and holds no thread while Gemini writes, so one process can keep hundreds of chats waiting on it.
+async def _run_blocking(function, *args):
+    """Runs a blocking step on the bounded executor without holding up the event loop."""
+    loop = asyncio.get_running_loop()
+    with RAG_EXECUTOR_JOBS.track_in_progress():
+        return await loop.run_in_executor(_rag_executor, function, *args)
+
+
+async def _prepare_answer_async(user_message: str, category: str, timer: StageTimer) -> dict:
+    """_prepare_answer for the async server: the question waits for its query batch on the event loop, not on an executor thread."""
+    unavailable = await _run_blocking(_unavailable_answer, timer)
+    if unavailable:
+        return {"answer": unavailable}
+    if query_batcher is None:
+        embedded = await _run_blocking(embed_and_search, user_message, category, timer)
+    else:
+        item = _batch_item(user_message, category) # A cache lookup; not worth a thread hop
+        embedded = _batched(await asyncio.wrap_future(query_batcher.submit(item)), timer)
+    return await _run_blocking(_prepare_answer, user_message, category, timer, embedded)
+
+
+async def get_rag_answer_async(user_message: str, category: str) -> dict:
+    """get_rag_answer for the asyncio server. A request cancelled mid-answer is counted as "cancelled"."""
+    print(f"RAG Service: Received async query for category '{category}': '{user_message}'")
+    timer = StageTimer()
+
+    try:
+        prepared = await _prepare_answer_async(user_message, category, timer)
+        if "answer" in prepared:
+            reply, outcome = prepared["answer"]
+            return _answer(reply, outcome, timer, cached=outcome == "cache")
+
+        with timer.stage("llm"), LLM_IN_FLIGHT.track_in_progress():
+            response = await llm_model_instance.generate_content_async(prepared["prompt"])
+        reply_text = _response_text(response)
+        if not reply_text:
+            return _answer(*_blocked_reply(response), timer)
+
+        print(f"RAG Service: Gemini generated text: {reply_text[:200]}...")
+        response_cache.put(prepared["cache_key"], prepared["query_vector"], user_message, reply_text)
+        return _answer(reply_text, "llm", timer)
+
+    except asyncio.CancelledError:
+        print("RAG Service: Async request cancelled.")
+        RAG_ANSWERS.inc(outcome="cancelled")
+        timer.finish()
+        raise
+    except Exception as e:
+        print(f"Error during async RAG process in rag_service: {e}")
+        import traceback; traceback.print_exc()
+        return _answer("Sorry, I encountered an error while processing your request with the knowledge base.", "error", timer)
+
+
+async def stream_rag_answer_async(user_message: str, category: str):
+    """stream_rag_answer for the asyncio server: an async generator of the same (event, data) pairs."""
+    print(f"RAG Service: Received async streamed query for category '{category}': '{user_message}'")
+    stream = _StreamedAnswer()
+    try:
+        prepared = await _prepare_answer_async(user_message, category, stream.timer)
+        if "docs" in prepared:
+            yield "sources", {"sources": _sources(prepared["docs"])}
+        if "answer" in prepared:
+            reply, outcome = prepared["answer"]
+            yield stream.text(reply, replace=True)
+            yield stream.done(reply, outcome)
+            return
+
+        reply_text, response = "", None
+        with stream.timer.stage("llm"), LLM_IN_FLIGHT.track_in_progress():
+            response = await llm_model_instance.generate_content_async(prepared["prompt"], stream=True)
+            async for chunk in response:
+                text = _chunk_text(chunk)
+                if text:
+                    reply_text += text
+                    yield stream.text(text)
+
+        if not reply_text:
+            reply, outcome = _blocked_reply(response)
+            yield stream.text(reply, replace=True)
+            yield stream.done(reply, outcome)
+            return
+
+        print(f"RAG Service: Gemini streamed text: {reply_text[:200]}...")
+        response_cache.put(prepared["cache_key"], prepared["query_vector"], user_message, reply_text)
+        yield stream.done(reply_text, "llm")
+
+    except (GeneratorExit, asyncio.CancelledError):
+        stream.cancel()
+        raise
+    except Exception as e:
+        print(f"Error during async streamed RAG process in rag_service: {e}")
+        import traceback; traceback.print_exc()
+        reply = "Sorry, I encountered an error while processing your request with the knowledge base."
+        yield stream.text(reply, replace=True)
+        yield stream.done(reply, "error")
@@ -0,0 +1,237 @@
+# backend/service_metrics.py
+
+import os
+import time
+import random
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Tuple
+
+
+# Upper bounds (seconds) of the latency histogram buckets: sub-millisecond cache hits up to slow LLM calls
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# Bucket bounds of the query batcher's histograms: questions per batch, and seconds queued (a few ms window)
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128)
+QUEUE_WAIT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+# Share of /api/chat responses that carry an X-Timing header with their stage breakdown (0 = never, 1 = always)
+TIMING_HEADER_SAMPLE_RATE = float(os.getenv("TIMING_HEADER_SAMPLE_RATE", 0.05))
+
+
+def _format_labels(label_names: Tuple[str, ...], label_values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = ['%s="%s"' % (name, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", " "))
+             for name, value in zip(label_names, label_values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    type = None
+
+    def __init__(self, name: str, help_text: str, label_names: Tuple[str, ...] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.label_names)
+
+    def _sample_lines(self) -> List[str]:
+        with self._lock:
+            return [f"{self.name}{_format_labels(self.label_names, key)} {value}" for key, value in self._values.items()]
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.type}"] + self._sample_lines()
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    type = "gauge"
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    @contextmanager
+    def track_in_progress(self, **labels):
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, help_text: str, label_names: Tuple[str, ...] = (), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, label_names)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            # One count per bucket plus a last one for observations above the largest bound
+            counts, total = self._values.get(key, ([0] * (len(self.buckets) + 1), 0.0))
+            index = next((i for i, bound in enumerate(self.buckets) if value <= bound), len(self.buckets))
+            counts[index] += 1
+            self._values[key] = (counts, total + value)
+
+    def _sample_lines(self) -> List[str]:
+        lines = []
+        with self._lock:
+            for key, (counts, total) in self._values.items():
+                cumulative = 0
+                for bound, count in zip(self.buckets + ("+Inf",), counts):
+                    cumulative += count
+                    bucket_labels = _format_labels(self.label_names, key, 'le="%s"' % bound)
+                    lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+                lines.append(f"{self.name}_sum{_format_labels(self.label_names, key)} {total}")
+                lines.append(f"{self.name}_count{_format_labels(self.label_names, key)} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    Metrics of one server process in the Prometheus text exposition format. With several gunicorn
+    workers each worker has its own registry, so scrape them individually (or run one worker).
+    Collectors are callables returning extra (name, help, type, {labels: value}) families, computed
+    at scrape time (e.g. cache statistics).
+    """
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, help_text: str, label_names=()) -> Counter:
+        return self.register(Counter(name, help_text, label_names))
+
+    def gauge(self, name: str, help_text: str, label_names=()) -> Gauge:
+        return self.register(Gauge(name, help_text, label_names))
+
+    def histogram(self, name: str, help_text: str, label_names=(), buckets=LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help_text, label_names, buckets))
+
+    def add_collector(self, collector: Callable[[], List[Tuple[str, str, str, Dict[tuple, float]]]]):
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for collector in self._collectors:
+            try:
+                families = collector()
+            except Exception as e:
+                print(f"Metrics: collector failed: {e}")
+                continue
+            for name, help_text, metric_type, samples in families:
+                lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {metric_type}"]
+                for labels, value in samples.items():
+                    label_names = tuple(label_name for label_name, _ in labels)
+                    label_values = tuple(label_value for _, label_value in labels)
+                    lines.append(f"{name}{_format_labels(label_names, label_values)} {value}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+# --- Metrics of the chat service ---
+HTTP_REQUESTS = REGISTRY.counter("mezan_http_requests_total", "HTTP requests by endpoint and status code.", ("endpoint", "status"))
+HTTP_REQUEST_SECONDS = REGISTRY.histogram("mezan_http_request_seconds", "HTTP request latency by endpoint.", ("endpoint",))
+HTTP_IN_FLIGHT = REGISTRY.gauge("mezan_http_requests_in_flight", "HTTP requests being served.", ("endpoint",))
+RAG_STAGE_SECONDS = REGISTRY.histogram(
+    "mezan_rag_stage_seconds",
+    "Latency of each get_rag_answer stage (refresh, query_queue, embed_query, search, lexical_search, fusion, response_cache, pack_context, format_prompt, llm, total).",
+    ("stage",))
+RAG_ANSWERS = REGISTRY.counter(
+    "mezan_rag_answers_total",
+    "Answers by outcome: llm, cache, blocked (safety filters), empty, unavailable (components not loaded), error, cancelled (stream closed by the client).",
+    ("outcome",))
+RETRIEVAL_SCOPE = REGISTRY.counter(
+    "mezan_retrieval_scope_total",
+    "Retrievals by scope: category (filtered to the request's category), fallback (topped up from the global index), global.",
+    ("scope",))
+CONTEXT_TOKENS = REGISTRY.counter(
+    "mezan_context_tokens_total",
+    "Estimated prompt context tokens: retrieved (chunks as retrieved, one header each) and sent (after context packing).",
+    ("kind",))
+RAG_STAGE_ERRORS = REGISTRY.counter("mezan_rag_stage_errors_total", "Exceptions raised by get_rag_answer stages.", ("stage",))
+LLM_IN_FLIGHT = REGISTRY.gauge("mezan_llm_calls_in_flight", "Gemini generate_content calls in progress.")
+RAG_FIRST_TOKEN_SECONDS = REGISTRY.histogram(
+    "mezan_rag_time_to_first_token_seconds",
+    "Seconds from receiving a streamed question (/api/chat/stream) to sending the first text of its answer.")
+QUERY_BATCH_SIZE = REGISTRY.histogram(
+    "mezan_query_batch_size", "Questions embedded and searched together per query batch.", buckets=BATCH_SIZE_BUCKETS)
+QUERY_BATCH_WAIT_SECONDS = REGISTRY.histogram(
+    "mezan_query_batch_wait_seconds", "Seconds a question waited in the query batcher before its batch started.",
+    buckets=QUEUE_WAIT_BUCKETS)
+RAG_EXECUTOR_JOBS = REGISTRY.gauge(
+    "mezan_rag_executor_jobs",
+    "Retrieval steps of async-server requests queued or running on the bounded executor (RAG_EXECUTOR_WORKERS threads).")
+
+
+class StageTimer:
+    """
+    Times the stages of one request. Each stage is observed in RAG_STAGE_SECONDS (and counted in
+    RAG_STAGE_ERRORS if it raises); the per-request breakdown feeds the X-Timing header.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages: Dict[str, float] = {}
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            RAG_STAGE_ERRORS.inc(stage=name)
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            self.stages[name] = self.stages.get(name, 0.0) + elapsed
+            RAG_STAGE_SECONDS.observe(elapsed, stage=name)
+
+    def record(self, name: str, seconds: float):
+        """Adds a stage timed elsewhere (e.g. the shared query batch a request waited for)."""
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+        RAG_STAGE_SECONDS.observe(seconds, stage=name)
+
+    def finish(self) -> Dict[str, float]:
+        """Observes the total and returns the breakdown in seconds."""
+        self.stages["total"] = time.perf_counter() - self.started
+        RAG_STAGE_SECONDS.observe(self.stages["total"], stage="total")
+        return dict(self.stages)
+
+
+def format_timing_header(stages: Dict[str, float]) -> str:
+    """Server-Timing syntax, e.g. 'embed_query;dur=12.3, search;dur=4.1, total;dur=812.0' (milliseconds)."""
+    return ", ".join(f"{name};dur={seconds * 1000:.1f}" for name, seconds in stages.items())
+
+
+def should_sample_timing(sample_rate: float = TIMING_HEADER_SAMPLE_RATE) -> bool:
+    return sample_rate > 0 and random.random() < sample_rate
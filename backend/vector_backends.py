@@ -0,0 +1,55 @@
+# backend/vector_backends.py
+
+import os
+
+
+# --- Configuration ---
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__)) # Directory of vector_backends.py
+PROJECT_ROOT = os.path.abspath(os.path.join(CURRENT_DIR, '..')) # mezan directory (up one level)
+
+# Where chunk vectors are stored and searched (ingestion and the RAG service must agree):
+#   "chroma" - ChromaDB persistent collection via LangChain (default)
+#   "flat"   - memory-mapped flat matrix with exact BLAS search (flat_index.py); no chromadb needed.
+#              Compare them with benchmarks/bench_vector_store.py
+VECTOR_STORE_BACKEND = os.getenv("VECTOR_STORE_BACKEND", "chroma")
+FLAT_INDEX_DIR = os.getenv("FLAT_INDEX_DIR", os.path.join(PROJECT_ROOT, 'data', 'vector_store', 'joradp_flat_index'))
+# float32 rows go straight to BLAS. float16 halves the file and the page cache it needs, but numpy has
+# no float16 matmul, so every search first converts the rows (several times slower for one query;
+# batched queries amortize it)
+FLAT_INDEX_DTYPE = os.getenv("FLAT_INDEX_DTYPE", "float32")
+# Search structure of the flat backend, saved next to its files (see ann_index.py for the tuning knobs):
+#   "exact"  - scan every row with BLAS (default)
+#   "hnsw"   - faiss HNSW graph, for latency
+#   "ivfpq"  - faiss IVF-PQ, for memory
+#   "binary" - scan of 1-bit codes by Hamming distance (32x smaller than float32 rows)
+#   "int8"   - scan of 8-bit scalar-quantized codes (4x smaller)
+# The non-exact modes need faiss-cpu and re-score their candidates against the full vectors. Measure
+# recall and latency against exact search with benchmarks/bench_ann.py
+VECTOR_INDEX_MODE = os.getenv("VECTOR_INDEX_MODE", "exact")
+
+VECTOR_STORE_BACKENDS = ("chroma", "flat")
+
+
+def vector_store_directory(chroma_directory: str, backend: str = VECTOR_STORE_BACKEND) -> str:
+    """Directory the selected backend persists to."""
+    return FLAT_INDEX_DIR if backend == "flat" else chroma_directory
+
+
+def open_vector_store(embedding_function, collection_name: str, persist_directory: str,
+                      backend: str = VECTOR_STORE_BACKEND):
+    """
+    Opens (or creates) the vector store used by both ingestion.py and rag_service.py. Either backend
+    exposes the Chroma collection API the pipeline uses as `store._collection`.
+    """
+    if backend == "chroma":
+        # Imported lazily: the flat backend runs without chromadb installed
+        from langchain_community.vectorstores import Chroma
+        return Chroma(collection_name=collection_name, embedding_function=embedding_function,
+                      persist_directory=persist_directory)
+
+    if backend == "flat":
+        from flat_index import FlatVectorStore
+        return FlatVectorStore(persist_directory, collection_name, embedding_function, dtype=FLAT_INDEX_DTYPE,
+                               index_mode=VECTOR_INDEX_MODE)
+
+    raise ValueError(f"Unknown VECTOR_STORE_BACKEND '{backend}'. Expected one of: {', '.join(VECTOR_STORE_BACKENDS)}")
@@ -171,8 +171,42 @@ document.addEventListener('DOMContentLoaded', () => {
         }
     }
 
+    // Function to show the sources an answer is based on, under its message bubble
+    function addSourcesToMessage(messageElement, sources) {
+        if (!messageElement || !sources || sources.length === 0) return;
+
+        const sourcesElement = document.createElement('div');
+        sourcesElement.classList.add('chat-sources');
+        // e.g. "Sources: F2023045.pdf (p. 3, 4); F2021012.pdf"
+        sourcesElement.textContent = 'Sources: ' + sources.map(source => {
+            const pages = source.pages && source.pages.length ? ` (p. ${source.pages.join(', ')})` : '';
+            return `${source.source || 'JORADP'}${pages}`;
+        }).join('; ');
+        messageElement.appendChild(sourcesElement);
+    }
+
+    // Function to read the error message of a failed backend response
+    async function readErrorMessage(response) {
+        let errorMsg = `Sorry, there was an issue communicating with the server (Status: ${response.status}). Please try again later.`;
+        console.error(`Error from backend: ${response.status} ${response.statusText}`);
+        try {
+            // Attempt to read a more specific error message from the backend response if it's JSON
+            const errorData = await response.json();
+            if (errorData && errorData.error) {
+                errorMsg = `Error: ${errorData.error}`; // Use the error message provided by the backend
+            }
+        } catch (e) {
+            // If parsing the error response fails (e.g., backend didn't return JSON error),
+            // just use the generic error message.
+            console.error("Failed to parse backend error response as JSON:", e);
+        }
+        return errorMsg;
+    }
+
     // --- Function to send message to the backend API ---
-    // This function makes the network request to your Flask server
+    // This function makes the network request to your Flask server. The answer is streamed
+    // (/api/chat/stream, Server-Sent Events) and shown as it is written; browsers that can't
+    // read a response body as a stream get the whole answer from /api/chat.
     async function sendMessageToBackend(message, category) {
         // Check if sendButton exists before trying to access its 'disabled' property
         if (!sendButton) {
@@ -185,10 +219,40 @@ document.addEventListener('DOMContentLoaded', () => {
         addTypingIndicator();
         sendButton.disabled = true;
 
+        const streaming = typeof ReadableStream !== 'undefined' && typeof TextDecoder !== 'undefined';
+        let aiMessage = null; // Message bubble of the answer, created with its first text
+        let answerText = null; // Text node the streamed tokens are appended to
+        let sources = null;
+
+        // Shows answer text: appended to the answer so far, or replacing it
+        function showAnswerText(text, replace) {
+            if (!aiMessage) {
+                removeTypingIndicator();
+                aiMessage = document.createElement('div');
+                aiMessage.classList.add('chat-message', 'ai-message');
+                answerText = document.createTextNode(''); // textContent-style: AI text is never parsed as HTML
+                aiMessage.appendChild(answerText);
+                chatBox.appendChild(aiMessage);
+            }
+            answerText.data = replace ? text : answerText.data + text;
+            chatBox.scrollTop = chatBox.scrollHeight;
+        }
+
+        // Handles one Server-Sent Event of the stream
+        function handleEvent(event, data) {
+            if (event === 'sources') {
+                sources = data.sources; // Shown under the answer once it has started
+            } else if (event === 'token' || event === 'reply') {
+                showAnswerText(data.text, event === 'reply');
+            } else if (event === 'done') {
+                console.log(`Answer ${data.outcome}${data.cached ? ' (cached)' : ''}, timings:`, data.timings);
+            }
+        }
+
         try {
             // *** IMPORTANT: Ensure this URL matches your running Flask backend ***
             // Flask development server typically runs on http://localhost:5000
-            const response = await fetch('http://localhost:5000/api/chat', {
+            const response = await fetch(`http://localhost:5000/api/chat${streaming ? '/stream' : ''}`, {
                 method: 'POST', // Use POST method as defined in Flask route
                 headers: {
                     'Content-Type': 'application/json', // Specify that the request body is JSON
@@ -197,48 +261,70 @@ document.addEventListener('DOMContentLoaded', () => {
                 body: JSON.stringify({ message: message, category: category }),
             });
 
-            // Remove typing indicator after the fetch call completes (whether success or error)
-            removeTypingIndicator();
-
             // Check if the HTTP response status indicates success (2xx range)
             if (!response.ok) {
                 // Handle HTTP errors (e.g., 400 Bad Request, 500 Internal Server Error)
-                let errorMsg = `Sorry, there was an issue communicating with the server (Status: ${response.status}). Please try again later.`;
-                console.error(`Error from backend: ${response.status} ${response.statusText}`);
-                try {
-                    // Attempt to read a more specific error message from the backend response if it's JSON
-                    const errorData = await response.json();
-                    if (errorData && errorData.error) {
-                        errorMsg = `Error: ${errorData.error}`; // Use the error message provided by the backend
-                    }
-                } catch (e) {
-                    // If parsing the error response fails (e.g., backend didn't return JSON error),
-                    // just use the generic error message.
-                    console.error("Failed to parse backend error response as JSON:", e);
-                }
+                const errorMsg = await readErrorMessage(response);
+                removeTypingIndicator();
                 // Add the error message to the chat box (formatted like an AI message)
                 addMessageToChat("AI", errorMsg);
                 return; // Stop processing here after handling the error
             }
 
-            // If the response was OK (status 2xx), parse the JSON response body
-            const data = await response.json();
+            if (!streaming) {
+                // If the response was OK (status 2xx), parse the JSON response body
+                const data = await response.json();
+                removeTypingIndicator();
+                // Check if the expected 'reply' key is in the JSON data
+                if (data && data.reply) {
+                    // Add the AI's actual reply to the chat box
+                    addMessageToChat("AI", data.reply);
+                } else {
+                    // Handle cases where the backend returned OK but the expected data structure is missing
+                    console.error("Backend returned OK but missing 'reply' key in JSON:", data);
+                    addMessageToChat("AI", "Sorry, I received an unexpected response format from the server.");
+                }
+                return;
+            }
+
+            // Read the event stream: events are separated by a blank line, each with an
+            // "event: <name>" line and a "data: <json>" line
+            const reader = response.body.getReader();
+            const decoder = new TextDecoder();
+            let buffer = '';
+            while (true) {
+                const { value, done } = await reader.read();
+                if (done) break;
+                buffer += decoder.decode(value, { stream: true });
+                let boundary;
+                while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                    const block = buffer.slice(0, boundary);
+                    buffer = buffer.slice(boundary + 2);
+                    let event = 'message';
+                    const dataLines = [];
+                    block.split('\n').forEach(line => {
+                        if (line.startsWith('event:')) event = line.slice(6).trim();
+                        else if (line.startsWith('data:')) dataLines.push(line.slice(5).trim());
+                    });
+                    if (dataLines.length) handleEvent(event, JSON.parse(dataLines.join('\n')));
+                }
+            }
 
-            // Check if the expected 'reply' key is in the JSON data
-            if (data && data.reply) {
-                // Add the AI's actual reply to the chat box
-                addMessageToChat("AI", data.reply);
-            } else {
-                // Handle cases where the backend returned OK but the expected data structure is missing
-                console.error("Backend returned OK but missing 'reply' key in JSON:", data);
+            removeTypingIndicator();
+            if (!aiMessage) {
+                // The stream ended without any answer text
+                console.error("Backend stream ended without an answer.");
                 addMessageToChat("AI", "Sorry, I received an unexpected response format from the server.");
+            } else {
+                addSourcesToMessage(aiMessage, sources);
+                chatBox.scrollTop = chatBox.scrollHeight;
             }
 
         } catch (error) { // Catch network errors or other issues with the fetch operation itself
             // Ensure typing indicator is removed on network errors
             removeTypingIndicator();
             console.error("Error sending message to backend:", error);
-            // Display a user-friendly error message for network issues
+            // Display a user-friendly error message for network issues (after any partial answer)
             addMessageToChat("AI", "Sorry, I couldn't connect to the server. Please ensure it's running and check your network connection.");
         } finally {
             // This block always runs after try/catch, regardless of success or failure